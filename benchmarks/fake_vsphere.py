@@ -0,0 +1,938 @@
+# benchmarks/fake_vsphere.py
+# In-process stand-in for vCenter/ESXi. A synthetic inventory is served through a pyVmomi stub adapter, so
+# VMwareClient, the controllers, Inventory, InventoryCache and TaskWaiter run unchanged on top of it. Every
+# call can be delayed by a fixed round-trip latency, tasks take task_duration seconds (optionally queued
+# behind task_concurrency running tasks), and requests/responses go through pyVmomi's SOAP serializer so
+# byte counts and client-side encoding costs are close to a real endpoint. A fault_rate share of calls is
+# answered with HTTP 503 (what an overloaded vCenter's proxy returns) to exercise client-side retries.
+#
+# Only the API surface the framework uses is implemented; anything else raises vmodl.fault.NotImplemented.
+
+import datetime
+import heapq
+import http.client
+import io
+import itertools
+import random
+import threading
+import time
+import uuid
+
+from pyVmomi import vim, vmodl, SoapAdapter
+from pyVmomi.VmomiSupport import GetVmodlType, ManagedObject, Object, newestVersions
+from core.vmware_client import SessionPool, SessionStub, DEFAULT_KEEPALIVE_INTERVAL
+
+_ROOT_FOLDER = 'group-d1'
+HOST_CPU_MHZ = 2400
+HOST_CPU_CORES = 32
+HOST_MEMORY_BYTES = 1 << 40
+# CPU demand of one busy vCPU of a powered-on VM
+VM_CPU_USAGE_MHZ = 600
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _typed(value):
+    # property values travel as xsd:anyType, which needs typed arrays rather than plain lists
+    if not isinstance(value, list) or hasattr(type(value), 'Item'):
+        return value
+    if not value:
+        return None
+    if all(isinstance(item, ManagedObject) for item in value):
+        return GetVmodlType('vmodl.ManagedObject[]')(value)
+    return type(value[0]).Array(value)
+
+
+class _LenientSerializer(SoapAdapter.SoapSerializer):
+    # the synthetic inventory leaves most mandatory fields unset; skip them instead of refusing to serialize
+    def _Serialize(self, val, info, defNS):
+        if val is None or (isinstance(val, list) and not val):
+            # an empty array has no elements on the wire either
+            return
+        super()._Serialize(val, info, defNS)
+
+
+class _FakeResponse:
+    def __init__(self, body):
+        self.status = 200
+        self._body = io.BytesIO(body)
+
+    def read(self, *args):
+        return self._body.read(*args)
+
+    def getheader(self, name, default=None):
+        return default
+
+
+class _FakeConnection:
+    def __init__(self):
+        self._body = b''
+
+    def request(self, method, url, body=None, headers=None):
+        pass
+
+    def respond(self, body):
+        self._body = body
+
+    def getresponse(self):
+        return _FakeResponse(self._body)
+
+    def close(self):
+        pass
+
+
+class FakeStub(SoapAdapter.SoapStubAdapterBase):
+    def __init__(self, vsphere, latency=0.0, serialize=True, fault_rate=0.0):
+        super().__init__(version=newestVersions.GetName('vim'))
+        self.vsphere = vsphere
+        self.latency = latency
+        self.serialize = serialize
+        self.fault_rate = fault_rate
+        self._random = random.Random(0)
+        self.requestContext = {}
+        self._local = threading.local()
+
+    def GetConnection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _FakeConnection()
+        return conn
+
+    def DropConnections(self):
+        self._local = threading.local()
+
+    def InvokeMethod(self, mo, info, args, outerStub=None):
+        request = self.SerializeRequest(mo, info, args) if self.serialize else b''
+        conn = self.GetConnection()
+        conn.request('POST', '/sdk', request)
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            if self.fault_rate and info.wsdlName != 'RetrieveServiceContent' \
+                    and self._random.random() < self.fault_rate:
+                # raised the way pyVmomi's SoapStubAdapter reports a non-SOAP HTTP error
+                raise http.client.HTTPException("503 Service Unavailable")
+            result = self.vsphere.invoke(mo, info.wsdlName, args)
+        except vmodl.MethodFault as fault:
+            conn.respond(self._serialize(fault, 'fault', type(fault)))
+            conn.getresponse().read()
+            # like SoapStubAdapter: an outer (session) stub gets the status and fault back, not raised
+            if outerStub is not None and outerStub is not self:
+                return 500, fault
+            raise
+        conn.respond(self._serialize(result, 'returnval', info.result))
+        conn.getresponse().read()
+        if outerStub is not None and outerStub is not self:
+            return 200, result
+        return result
+
+    def _serialize(self, val, name, val_type):
+        if not self.serialize or val is None:
+            return b''
+        writer = io.StringIO()
+        info = Object(name=name, type=val_type, version=self.version, flags=0)
+        _LenientSerializer(writer, self.version, {}).Serialize(val, info)
+        return writer.getvalue().encode('utf-8')
+
+
+class _Filter:
+    def __init__(self, mo, spec):
+        self.mo = mo
+        self.spec = spec
+        self.reported = None
+        self.explicit = set()
+        self.views = []
+        for obj_spec in spec.objectSet:
+            traverses_view = any(getattr(select, 'path', None) == 'view' for select in obj_spec.selectSet or [])
+            if traverses_view:
+                self.views.append(obj_spec.obj._moId)
+            elif obj_spec.selectSet:
+                raise vmodl.fault.NotImplemented()
+            if not obj_spec.skip:
+                self.explicit.add(obj_spec.obj._moId)
+
+
+class _Collector:
+    def __init__(self, mo):
+        self.mo = mo
+        self.filters = {}
+        self.version = 0
+        self.seen_seq = 0
+        self.cancelled = False
+
+
+class FakeVSphere:
+    def __init__(self, datacenters=1, vm_folders=1, hosts=4, vms=100, templates=1, datastores=2, networks=1,
+                 latency=0.0, task_duration=0.0, task_concurrency=None, serialize=True, fault_rate=0.0,
+                 instance_uuid=None, powered_on=0.0):
+        # a fixed instance_uuid lets two processes share an on-disk inventory snapshot; powered_on is the
+        # share of VMs that start running and so count towards their host's quickStats
+        self.instance_uuid = instance_uuid or str(uuid.uuid4())
+        self.powered_on = powered_on
+        self.task_duration = task_duration
+        self.task_concurrency = task_concurrency
+        # every object is bound to the session stub VMwareClient logs in with, so calls take the production
+        # path: hooks on the inner FakeStub, faults handed back to SessionStub as (status, fault)
+        self.soap_stub = FakeStub(self, latency, serialize, fault_rate)
+        self.stub = SessionStub(self.soap_stub, lambda soap_stub: None)
+        self._cond = threading.Condition(threading.RLock())
+        self._objects = {}
+        self._parents = {}
+        self._by_type = {}
+        self._changes = []
+        self._removed = {}
+        self._views = {}
+        self._collectors = {}
+        self._results = {}
+        self._events = []
+        self._event_collectors = {}
+        self._ids = itertools.count(1)
+        self._task_queue = []
+        self._running_tasks = 0
+        self._scheduled = []
+        self._scheduler = None
+        with self._cond:
+            self._build(datacenters, vm_folders, hosts, vms, templates, datastores, networks)
+
+    # ---- public helpers ----
+
+    def service_instance(self):
+        return vim.ServiceInstance('ServiceInstance', self.stub)
+
+    def vm_names(self, include_templates=False):
+        with self._cond:
+            return [props['name'] for moId, props in self._objects.items()
+                    if isinstance(self._mo(moId), vim.VirtualMachine)
+                    and (include_templates or not props['config'].template)]
+
+    def host_names(self):
+        with self._cond:
+            return [self._objects[moId]['name'] for moId in self._by_type.get(vim.HostSystem, ())]
+
+    def datastore_names(self):
+        with self._cond:
+            return [self._objects[moId]['name'] for moId in self._by_type.get(vim.Datastore, ())]
+
+    def template_names(self):
+        return [name for name in self.vm_names(include_templates=True) if name.startswith('template-')]
+
+    def invoke(self, mo, method, args):
+        handler = getattr(self, '_' + method, None)
+        if handler is None:
+            raise vmodl.fault.NotImplemented()
+        if method == 'WaitForUpdatesEx':
+            return handler(mo, *args)
+        with self._cond:
+            return handler(mo, *args)
+
+    # ---- inventory ----
+
+    def _new(self, cls, prefix, parent=None, **props):
+        mo = cls(f"{prefix}-{next(self._ids)}", self.stub)
+        self._add(mo, parent, props)
+        return mo
+
+    def _add(self, mo, parent, props):
+        if parent is not None:
+            props.setdefault('parent', parent)
+        self._objects[mo._moId] = props
+        props['_mo'] = mo
+        self._parents[mo._moId] = parent._moId if parent is not None else None
+        self._by_type.setdefault(type(mo), {})[mo._moId] = None
+        self._touch(mo._moId)
+
+    def _remove(self, mo):
+        props = self._objects.pop(mo._moId, None)
+        if props is None:
+            return
+        self._parents.pop(mo._moId, None)
+        self._by_type.get(type(mo), {}).pop(mo._moId, None)
+        parent = props.get('parent')
+        if parent is not None and 'childEntity' in self._objects.get(parent._moId, {}):
+            siblings = self._objects[parent._moId]['childEntity']
+            self._objects[parent._moId]['childEntity'] = [child for child in siblings if child._moId != mo._moId]
+        self._removed[mo._moId] = mo
+        self._touch(mo._moId)
+
+    def _touch(self, moId):
+        # change log position doubles as the update sequence number seen by collectors
+        self._changes.append(moId)
+        self._cond.notify_all()
+
+    def _mo(self, moId):
+        return self._objects[moId]['_mo']
+
+    def _build(self, datacenters, vm_folders, hosts, vms, templates, datastores, networks):
+        self.root_folder = vim.Folder(_ROOT_FOLDER, self.stub)
+        self._add(self.root_folder, None, {'name': 'Datacenters', 'childEntity': []})
+        self.content = vim.ServiceInstanceContent(
+            rootFolder=self.root_folder,
+            propertyCollector=vmodl.query.PropertyCollector('propertyCollector', self.stub),
+            viewManager=vim.view.ViewManager('ViewManager', self.stub),
+            sessionManager=vim.SessionManager('SessionManager', self.stub),
+            perfManager=vim.PerformanceManager('PerfMgr', self.stub),
+            eventManager=vim.event.EventManager('EventManager', self.stub),
+            about=vim.AboutInfo(name='Fake vSphere', apiVersion='8.0.3.0', instanceUuid=self.instance_uuid))
+        self._objects['ServiceInstance'] = {'content': self.content, '_mo': vim.ServiceInstance('ServiceInstance',
+                                                                                                 self.stub)}
+        self._collectors['propertyCollector'] = _Collector(self.content.propertyCollector)
+
+        for dc_index in range(datacenters):
+            dc = self._new(vim.Datacenter, 'datacenter', self.root_folder, name=f"dc{dc_index}")
+            self._objects[_ROOT_FOLDER]['childEntity'].append(dc)
+            folders = {}
+            for kind in ('vm', 'host', 'datastore', 'network'):
+                folders[kind] = self._new(vim.Folder, 'group', dc, name=kind, childEntity=[])
+                self._objects[dc._moId][f"{kind}Folder"] = folders[kind]
+
+            network_objs = [self._new(vim.Network, 'network', folders['network'],
+                                      name='VM Network' if index == 0 else f"VM Network {index}")
+                            for index in range(networks)]
+            datastore_objs = [self._new(vim.Datastore, 'datastore', folders['datastore'],
+                                        name=f"datastore{dc_index}-{index}",
+                                        summary=vim.Datastore.Summary(
+                                            name=f"datastore{dc_index}-{index}", type='VMFS',
+                                            capacity=4 << 40, freeSpace=(2 << 40) - index * (100 << 30),
+                                            accessible=True, maintenanceMode='normal'))
+                              for index in range(datastores)]
+            for kind in ('network', 'datastore'):
+                self._objects[folders[kind]._moId]['childEntity'] = network_objs if kind == 'network' else datastore_objs
+            self._objects[dc._moId]['datastore'] = list(datastore_objs)
+
+            cluster = self._new(vim.ClusterComputeResource, 'domain-c', folders['host'], name=f"cluster{dc_index}")
+            pool = self._new(vim.ResourcePool, 'resgroup', cluster, name='Resources')
+            self._objects[folders['host']._moId]['childEntity'] = [cluster]
+            self._objects[cluster._moId]['resourcePool'] = pool
+            host_objs = []
+            for index in range(hosts):
+                network_system = self._new(vim.host.NetworkSystem, 'networkSystem',
+                                           networkInfo=vim.host.NetworkInfo(vswitch=[
+                                               vim.host.VirtualSwitch(
+                                                   name='vSwitch0', numPorts=128,
+                                                   spec=vim.host.VirtualSwitch.Specification(numPorts=128))],
+                                               portgroup=[vim.host.PortGroup(
+                                                   key='key-vim.host.PortGroup-VM Network',
+                                                   spec=vim.host.PortGroup.Specification(
+                                                       name='VM Network', vlanId=0, vswitchName='vSwitch0',
+                                                       policy=vim.host.NetworkPolicy()))]))
+                datastore_system = self._new(vim.host.DatastoreSystem, 'datastoreSystem')
+                host = self._new(vim.HostSystem, 'host', cluster, name=f"esxi{dc_index}-{index}.bench.local",
+                                 datastore=list(datastore_objs), network=list(network_objs),
+                                 configManager=vim.host.ConfigManager(networkSystem=network_system,
+                                                                          datastoreSystem=datastore_system),
+                                 summary=vim.host.Summary(hardware=vim.host.Summary.HardwareSummary(
+                                     cpuMhz=HOST_CPU_MHZ, numCpuCores=HOST_CPU_CORES, memorySize=HOST_MEMORY_BYTES)),
+                                 runtime=vim.host.RuntimeInfo(connectionState='connected', inMaintenanceMode=False))
+                self._objects[datastore_system._moId]['datastore'] = list(datastore_objs)
+                host_objs.append(host)
+            self._objects[cluster._moId]['host'] = host_objs
+
+            vm_folder_objs = [folders['vm']]
+            if vm_folders > 1:
+                vm_folder_objs = [self._new(vim.Folder, 'group', folders['vm'], name=f"folder{index}", childEntity=[])
+                                  for index in range(vm_folders)]
+                self._objects[folders['vm']._moId]['childEntity'] = list(vm_folder_objs)
+            count = vms // datacenters + (1 if dc_index < vms % datacenters else 0)
+            for index in range(count + templates):
+                is_template = index >= count
+                name = f"template-{dc_index}-{index - count}" if is_template else f"vm-{dc_index}-{index:05d}"
+                running = not is_template and index % 100 < self.powered_on * 100
+                self._create_vm(name, vm_folder_objs[index % len(vm_folder_objs)], pool,
+                                host_objs[index % len(host_objs)] if host_objs else None,
+                                datastore_objs[:1], network_objs[:1], template=is_template,
+                                devices=[self._nic(network_objs[0])] if is_template and network_objs else None,
+                                power_state='poweredOn' if running else 'poweredOff')
+
+    def _nic(self, network):
+        return vim.vm.device.VirtualVmxnet3(
+            key=4000, backing=vim.vm.device.VirtualEthernetCard.NetworkBackingInfo(
+                network=network, deviceName=self._objects[network._moId]['name']))
+
+    def _create_vm(self, name, folder, pool, host, datastores, networks, cpu=1, memory=1024, template=False,
+                   guest_id='otherGuest64', devices=None, power_state='poweredOff'):
+        config = vim.vm.ConfigInfo(name=name, template=template, guestId=guest_id, instanceUuid=str(uuid.uuid4()),
+                                   hardware=vim.vm.VirtualHardware(numCPU=cpu, memoryMB=memory,
+                                                                   device=devices or []))
+        vm = self._new(vim.VirtualMachine, 'vm', folder, name=name, config=config, resourcePool=pool,
+                       runtime=vim.vm.RuntimeInfo(host=host, powerState=power_state),
+                       datastore=list(datastores), network=list(networks))
+        self._objects[folder._moId]['childEntity'].append(vm)
+        return vm
+
+    def _find_by_name(self, obj_type, name):
+        for moId in self._by_type.get(obj_type, ()):
+            if self._objects[moId].get('name') == name:
+                return self._mo(moId)
+        return None
+
+    def _resolve(self, moId, path):
+        if path == 'view' and moId in self._views:
+            return self._view_members(moId)
+        if path == 'vm' and moId in self._by_type.get(vim.Datastore, ()):
+            return self._datastore_vms(moId)
+        if path.startswith('summary.quickStats.'):
+            return getattr(self._quick_stats(moId), path.rsplit('.', 1)[1], None)
+        parts = path.split('.')
+        value = self._objects.get(moId, {}).get(parts[0])
+        for part in parts[1:]:
+            if value is None:
+                return None
+            value = getattr(value, part, None)
+        return value
+
+    def _datastore_vms(self, datastore_moId):
+        # derived on read instead of kept in sync by every VM create/relocate/destroy
+        return [self._mo(moId) for moId in self._by_type.get(vim.VirtualMachine, ())
+                if any(datastore._moId == datastore_moId for datastore in self._objects[moId].get('datastore', ()))]
+
+    def _quick_stats(self, moId):
+        # derived from the powered-on VMs, so host load follows every migration and power operation
+        props = self._objects.get(moId)
+        if props is None:
+            return None
+        if isinstance(props['_mo'], vim.VirtualMachine):
+            hardware = props['config'].hardware
+            running = props['runtime'].powerState == 'poweredOn'
+            return vim.vm.Summary.QuickStats(overallCpuUsage=hardware.numCPU * VM_CPU_USAGE_MHZ if running else 0,
+                                             guestMemoryUsage=hardware.memoryMB // 2 if running else 0)
+        if isinstance(props['_mo'], vim.HostSystem):
+            cpu = memory = 0
+            for vm_props in self._running_vms(moId):
+                cpu += vm_props['config'].hardware.numCPU * VM_CPU_USAGE_MHZ
+                memory += vm_props['config'].hardware.memoryMB
+            return vim.host.Summary.QuickStats(overallCpuUsage=cpu, overallMemoryUsage=memory)
+        return None
+
+    def _running_vms(self, host_moId):
+        vms = (self._objects[moId] for moId in self._by_type.get(vim.VirtualMachine, ()))
+        return [props for props in vms if props['runtime'].powerState == 'poweredOn'
+                and props['runtime'].host is not None and props['runtime'].host._moId == host_moId]
+
+    def _is_under(self, moId, container_moId, recursive):
+        parent = self._parents.get(moId)
+        while parent is not None:
+            if parent == container_moId:
+                return True
+            if not recursive:
+                return False
+            parent = self._parents.get(parent)
+        return False
+
+    def _view_members(self, view_moId):
+        container, types, recursive = self._views[view_moId]
+        members = []
+        for cls, moIds in self._by_type.items():
+            if any(issubclass(cls, wanted) for wanted in types):
+                members.extend(self._mo(moId) for moId in moIds if self._is_under(moId, container, recursive))
+        return members
+
+    def _in_view(self, moId, view_moId):
+        if moId not in self._objects or view_moId not in self._views:
+            return False
+        container, types, recursive = self._views[view_moId]
+        return (isinstance(self._mo(moId), tuple(types)) and self._is_under(moId, container, recursive))
+
+    # ---- ServiceInstance / SessionManager ----
+
+    def _RetrieveServiceContent(self, mo):
+        return self.content
+
+    def _CurrentTime(self, mo):
+        return _now()
+
+    def _Fetch(self, mo, prop):
+        return self._resolve(mo._moId, prop)
+
+    def _Logout(self, mo):
+        return None
+
+    def _AcquireCloneTicket(self, mo):
+        return f"cst-{uuid.uuid4()}"
+
+    def _CloneSession(self, mo, cloneTicket):
+        return None
+
+    # ---- views ----
+
+    def _CreateContainerView(self, mo, container, obj_types, recursive):
+        view = vim.view.ContainerView(f"session[fake]view-{next(self._ids)}", self.stub)
+        self._views[view._moId] = (container._moId, list(obj_types or []), recursive)
+        self._objects[view._moId] = {'_mo': view, 'container': container, 'recursive': recursive}
+        return view
+
+    def _DestroyView(self, mo):
+        self._views.pop(mo._moId, None)
+        self._objects.pop(mo._moId, None)
+
+    # ---- PropertyCollector ----
+
+    def _filter_members(self, task_filter):
+        members = {moId for moId in task_filter.explicit if moId in self._objects}
+        for view_moId in task_filter.views:
+            if view_moId in self._views:
+                members.update(mo._moId for mo in self._view_members(view_moId))
+        return members
+
+    def _filter_contains(self, task_filter, moId):
+        if moId not in self._objects:
+            return False
+        return moId in task_filter.explicit or any(self._in_view(moId, view) for view in task_filter.views)
+
+    def _filter_values(self, task_filter, moId):
+        mo = self._mo(moId)
+        for prop_spec in task_filter.spec.propSet:
+            if isinstance(mo, prop_spec.type):
+                if prop_spec.all:
+                    raise vmodl.fault.NotImplemented()
+                return {path: _typed(self._resolve(moId, path)) for path in prop_spec.pathSet or []}
+        return {}
+
+    def _object_contents(self, spec_set):
+        contents = []
+        for spec in spec_set:
+            task_filter = _Filter(None, spec)
+            for moId in sorted(self._filter_members(task_filter)):
+                values = self._filter_values(task_filter, moId)
+                contents.append(vmodl.query.PropertyCollector.ObjectContent(
+                    obj=self._mo(moId),
+                    propSet=[vmodl.DynamicProperty(name=path, val=val) for path, val in values.items()
+                             if val is not None]))
+        return contents
+
+    def _page(self, contents, max_objects):
+        token = None
+        if max_objects and len(contents) > max_objects:
+            token = f"token-{next(self._ids)}"
+            self._results[token] = (contents[max_objects:], max_objects)
+            contents = contents[:max_objects]
+        return vmodl.query.PropertyCollector.RetrieveResult(token=token, objects=contents)
+
+    def _RetrievePropertiesEx(self, mo, specSet, options):
+        contents = self._object_contents(specSet)
+        return self._page(contents, options.maxObjects if options else None) if contents else None
+
+    def _ContinueRetrievePropertiesEx(self, mo, token):
+        if token not in self._results:
+            raise vmodl.fault.InvalidArgument(invalidProperty='token')
+        contents, max_objects = self._results.pop(token)
+        return self._page(contents, max_objects)
+
+    def _CancelRetrievePropertiesEx(self, mo, token):
+        self._results.pop(token, None)
+
+    def _CreatePropertyCollector(self, mo):
+        collector = vmodl.query.PropertyCollector(f"session[fake]collector-{next(self._ids)}", self.stub)
+        self._collectors[collector._moId] = _Collector(collector)
+        self._collectors[collector._moId].seen_seq = len(self._changes)
+        self._objects[collector._moId] = {'_mo': collector}
+        return collector
+
+    def _DestroyPropertyCollector(self, mo):
+        self._collectors.pop(mo._moId, None)
+        self._objects.pop(mo._moId, None)
+
+    def _CreateFilter(self, mo, spec, partialUpdates):
+        task_filter = vmodl.query.PropertyCollector.Filter(f"session[fake]filter-{next(self._ids)}", self.stub)
+        self._collectors[mo._moId].filters[task_filter._moId] = _Filter(task_filter, spec)
+        self._objects[task_filter._moId] = {'_mo': task_filter, 'collector': mo._moId}
+        self._cond.notify_all()
+        return task_filter
+
+    def _DestroyPropertyFilter(self, mo):
+        props = self._objects.pop(mo._moId, None)
+        if props and props['collector'] in self._collectors:
+            self._collectors[props['collector']].filters.pop(mo._moId, None)
+
+    def _CancelWaitForUpdates(self, mo):
+        collector = self._collectors.get(mo._moId)
+        if collector:
+            collector.cancelled = True
+            self._cond.notify_all()
+
+    def _WaitForUpdatesEx(self, mo, version, options):
+        max_wait = options.maxWaitSeconds if options else None
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        with self._cond:
+            collector = self._collectors.get(mo._moId)
+            if collector is None:
+                raise vmodl.fault.ManagedObjectNotFound(obj=mo)
+            if version and version != str(collector.version):
+                raise vmodl.query.InvalidCollectorVersion()
+            while True:
+                if collector.cancelled:
+                    collector.cancelled = False
+                    raise vmodl.fault.RequestCanceled()
+                filter_updates = self._collect_updates(collector)
+                if filter_updates:
+                    collector.version += 1
+                    return vmodl.query.PropertyCollector.UpdateSet(
+                        version=str(collector.version), filterSet=filter_updates, truncated=False)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _collect_updates(self, collector):
+        since, collector.seen_seq = collector.seen_seq, len(self._changes)
+        dirty = list(dict.fromkeys(self._changes[since:]))
+        filter_updates = []
+        for task_filter in collector.filters.values():
+            if task_filter.reported is None:
+                task_filter.reported = {}
+                candidates = self._filter_members(task_filter)
+            else:
+                candidates = dirty
+            object_updates = []
+            for moId in candidates:
+                update = self._object_update(task_filter, moId)
+                if update is not None:
+                    object_updates.append(update)
+            if object_updates:
+                filter_updates.append(vmodl.query.PropertyCollector.FilterUpdate(
+                    filter=task_filter.mo, objectSet=object_updates))
+        return filter_updates
+
+    def _object_update(self, task_filter, moId):
+        previous = task_filter.reported.get(moId)
+        if not self._filter_contains(task_filter, moId):
+            if previous is None:
+                return None
+            del task_filter.reported[moId]
+            return vmodl.query.PropertyCollector.ObjectUpdate(kind='leave', obj=self._removed.get(moId), changeSet=[])
+        values = self._filter_values(task_filter, moId)
+        if previous is None:
+            kind = 'enter'
+            changes = {path: val for path, val in values.items() if val is not None}
+        else:
+            kind = 'modify'
+            changes = {path: val for path, val in values.items() if previous.get(path) is not val}
+            if not changes:
+                return None
+        task_filter.reported[moId] = values
+        return vmodl.query.PropertyCollector.ObjectUpdate(
+            kind=kind, obj=self._mo(moId),
+            changeSet=[vmodl.query.PropertyCollector.Change(name=path, op='assign', val=val)
+                       for path, val in changes.items()])
+
+    # ---- events ----
+
+    def _event(self, event_type, task_info, **fields):
+        event = event_type(key=next(self._ids), chainId=task_info.eventChainId, createdTime=_now(),
+                           userName='bench', **fields)
+        self._events.append(event)
+
+    def _CreateCollectorForEvents(self, mo, filter):
+        begin = filter.time.beginTime if filter and filter.time else None
+        end = filter.time.endTime if filter and filter.time else None
+        collector = vim.event.EventHistoryCollector(f"session[fake]events-{next(self._ids)}", self.stub)
+        matching = [event for event in self._events
+                    if (begin is None or event.createdTime >= begin) and (end is None or event.createdTime <= end)]
+        # like vCenter, a new collector is positioned after its latest event
+        self._event_collectors[collector._moId] = [matching, len(matching)]
+        return collector
+
+    def _RewindCollector(self, mo):
+        self._event_collectors[mo._moId][1] = 0
+
+    def _ReadNextEvents(self, mo, maxCount):
+        state = self._event_collectors[mo._moId]
+        page = state[0][state[1]:state[1] + maxCount]
+        state[1] += len(page)
+        return page
+
+    def _DestroyCollector(self, mo):
+        self._event_collectors.pop(mo._moId, None)
+
+    # ---- tasks ----
+
+    def _submit_task(self, name, entity, apply):
+        task = vim.Task(f"task-{next(self._ids)}", self.stub)
+        info = vim.TaskInfo(key=task._moId, task=task, descriptionId=name, entity=entity,
+                            entityName=self._objects.get(entity._moId, {}).get('name') if entity else None,
+                            state=vim.TaskInfo.State.queued, queueTime=_now(), cancelled=False, cancelable=False,
+                            eventChainId=next(self._ids))
+        self._add(task, None, {'info': info})
+        self._event(vim.event.TaskEvent, info, info=info, fullFormattedMessage=f"Task: {name}")
+        self._task_queue.append((task, apply))
+        self._start_tasks()
+        return task
+
+    def _start_tasks(self):
+        while self._task_queue and (self.task_concurrency is None or self._running_tasks < self.task_concurrency):
+            task, apply = self._task_queue.pop(0)
+            self._running_tasks += 1
+            self._update_task(task, state=vim.TaskInfo.State.running, startTime=_now(), progress=0)
+            if self.task_duration:
+                self._schedule(time.monotonic() + self.task_duration, task, apply)
+            else:
+                self._finish_task(task, apply)
+
+    def _finish_task(self, task, apply):
+        try:
+            result = apply()
+        except vmodl.MethodFault as fault:
+            self._update_task(task, state=vim.TaskInfo.State.error, error=fault, completeTime=_now())
+            info = self._objects[task._moId]['info']
+            reason = getattr(fault, 'msg', None) or type(fault).__name__
+            self._event(vim.event.EventEx, info, eventTypeId=f"{info.descriptionId}.failed", severity='error',
+                        fullFormattedMessage=f"{info.descriptionId} of {info.entityName} failed: {reason}")
+        else:
+            self._update_task(task, state=vim.TaskInfo.State.success, result=result, progress=100,
+                              completeTime=_now())
+            info = self._objects[task._moId]['info']
+            self._event(vim.event.EventEx, info, eventTypeId=f"{info.descriptionId}.completed",
+                        fullFormattedMessage=f"{info.descriptionId} of {info.entityName} completed")
+        self._running_tasks -= 1
+        self._start_tasks()
+
+    def _update_task(self, task, **fields):
+        # a fresh TaskInfo per change so collectors comparing by identity notice every update
+        old = self._objects[task._moId]['info']
+        info = vim.TaskInfo(**{name: getattr(old, name) for name in (
+            'key', 'task', 'descriptionId', 'entity', 'entityName', 'state', 'queueTime', 'startTime',
+            'completeTime', 'cancelled', 'cancelable', 'eventChainId', 'progress', 'error', 'result')})
+        for name, value in fields.items():
+            setattr(info, name, value)
+        self._objects[task._moId]['info'] = info
+        self._touch(task._moId)
+
+    def _schedule(self, due, task, apply):
+        heapq.heappush(self._scheduled, (due, task._moId, task, apply))
+        if self._scheduler is None or not self._scheduler.is_alive():
+            self._scheduler = threading.Thread(target=self._run_scheduler, name='fake-vsphere-tasks', daemon=True)
+            self._scheduler.start()
+        self._cond.notify_all()
+
+    def _run_scheduler(self):
+        with self._cond:
+            while True:
+                if not self._scheduled:
+                    if not self._cond.wait(5) and not self._scheduled:
+                        self._scheduler = None
+                        return
+                    continue
+                due, _, task, apply = self._scheduled[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._scheduled)
+                self._finish_task(task, apply)
+
+    # ---- virtual machines ----
+
+    def _CreateVM_Task(self, folder, config, pool=None, host=None):
+        def apply():
+            if self._find_by_name(vim.VirtualMachine, config.name):
+                raise vim.fault.DuplicateName(name=config.name, object=folder)
+            networks = [change.device.backing.network for change in config.deviceChange or []
+                        if getattr(change.device.backing, 'network', None) is not None]
+            datastore_name = (config.files.vmPathName or '').strip('[] ') if config.files else ''
+            datastore = self._find_by_name(vim.Datastore, datastore_name)
+            return self._create_vm(config.name, folder, pool, host, [datastore] if datastore else [], networks,
+                                   cpu=config.numCPUs or 1, memory=config.memoryMB or 1024,
+                                   guest_id=config.guestId or 'otherGuest64')
+        return self._submit_task('Folder.createVm', folder, apply)
+
+    def _ReconfigVM_Task(self, vm, spec):
+        def apply():
+            self._replace_config(vm, numCPU=spec.numCPUs, memoryMB=spec.memoryMB)
+        return self._submit_task('VirtualMachine.reconfigure', self._existing(vm), apply)
+
+    def _replace_config(self, vm, template=None, **hardware_changes):
+        config = self._objects[vm._moId]['config']
+        hardware = config.hardware
+        self._objects[vm._moId]['config'] = vim.vm.ConfigInfo(
+            name=config.name, template=config.template if template is None else template, guestId=config.guestId,
+            instanceUuid=config.instanceUuid, hardware=vim.vm.VirtualHardware(
+                numCPU=hardware_changes.get('numCPU') or hardware.numCPU,
+                memoryMB=hardware_changes.get('memoryMB') or hardware.memoryMB, device=hardware.device))
+        self._touch(vm._moId)
+
+    def _CloneVM_Task(self, vm, folder, name, spec):
+        def apply():
+            if self._find_by_name(vim.VirtualMachine, name):
+                raise vim.fault.DuplicateName(name=name, object=folder)
+            source = self._objects[self._existing(vm)._moId]
+            if spec.location.diskMoveType == 'createNewChildDiskBacking' and spec.snapshot is None:
+                raise vmodl.fault.InvalidArgument(invalidProperty='snapshot')
+            config = spec.config or vim.vm.ConfigSpec()
+            return self._create_vm(
+                name, folder, spec.location.pool or source['resourcePool'], spec.location.host
+                or source['runtime'].host, [spec.location.datastore] if spec.location.datastore
+                else source['datastore'], self._cloned_networks(source, config.deviceChange),
+                cpu=config.numCPUs or source['config'].hardware.numCPU,
+                memory=config.memoryMB or source['config'].hardware.memoryMB, template=bool(spec.template),
+                guest_id=source['config'].guestId, devices=source['config'].hardware.device,
+                power_state='poweredOn' if spec.powerOn else 'poweredOff')
+        return self._submit_task('VirtualMachine.clone', self._existing(vm), apply)
+
+    def _InstantClone_Task(self, vm, spec):
+        def apply():
+            source = self._objects[self._existing(vm)._moId]
+            if source['runtime'].powerState != 'poweredOn':
+                raise vim.fault.InvalidPowerState(requestedState='poweredOn',
+                                                  existingState=source['runtime'].powerState)
+            location = spec.location
+            return self._create_vm(
+                spec.name, location.folder or source['parent'], location.pool or source['resourcePool'],
+                source['runtime'].host, [location.datastore] if location.datastore else source['datastore'],
+                self._cloned_networks(source, location.deviceChange), cpu=source['config'].hardware.numCPU,
+                memory=source['config'].hardware.memoryMB, guest_id=source['config'].guestId,
+                devices=source['config'].hardware.device, power_state='poweredOn')
+        return self._submit_task('VirtualMachine.instantClone', self._existing(vm), apply)
+
+    def _cloned_networks(self, source, device_changes):
+        networks = [change.device.backing.network for change in device_changes or []
+                    if getattr(change.device.backing, 'network', None) is not None]
+        return networks or source['network']
+
+    def _CreateSnapshot_Task(self, vm, name, description=None, memory=False, quiesce=False):
+        def apply():
+            props = self._objects[self._existing(vm)._moId]
+            if props['config'].template:
+                raise vim.fault.NotSupported()
+            snapshot = vim.vm.Snapshot(f"snapshot-{next(self._ids)}", self.stub)
+            self._add(snapshot, None, {'vm': vm})
+            tree = vim.vm.SnapshotTree(snapshot=snapshot, vm=vm, name=name, description=description or '',
+                                       createTime=_now(), state=props['runtime'].powerState, quiesced=quiesce)
+            previous = props.get('snapshot')
+            props['snapshot'] = vim.vm.SnapshotInfo(
+                currentSnapshot=snapshot, rootSnapshotList=(list(previous.rootSnapshotList) if previous else [])
+                + [tree])
+            self._touch(vm._moId)
+            return snapshot
+        return self._submit_task('VirtualMachine.createSnapshot', self._existing(vm), apply)
+
+    def _MarkAsVirtualMachine(self, vm, pool, host=None):
+        if not self._objects[self._existing(vm)._moId]['config'].template:
+            raise vim.fault.NotSupported()
+        self._replace_config(vm, template=False)
+
+    def _MarkAsTemplate(self, vm):
+        self._replace_config(self._existing(vm), template=True)
+
+    def _Destroy_Task(self, vm):
+        def apply():
+            self._remove(self._existing(vm))
+        return self._submit_task('VirtualMachine.destroy', self._existing(vm), apply)
+
+    def _MigrateVM_Task(self, vm, pool=None, host=None, priority=None, state=None):
+        return self._relocate(vm, 'VirtualMachine.migrate', host, pool)
+
+    def _RelocateVM_Task(self, vm, spec, priority=None):
+        return self._relocate(vm, 'VirtualMachine.relocate', spec.host, spec.pool)
+
+    def _relocate(self, vm, name, host, pool):
+        def apply():
+            props = self._objects[self._existing(vm)._moId]
+            runtime = props['runtime']
+            props['runtime'] = vim.vm.RuntimeInfo(host=host or runtime.host, powerState=runtime.powerState)
+            if pool is not None:
+                props['resourcePool'] = pool
+            self._touch(vm._moId)
+        return self._submit_task(name, self._existing(vm), apply)
+
+    def _existing(self, mo):
+        if mo._moId not in self._objects:
+            raise vmodl.fault.ManagedObjectNotFound(obj=mo)
+        return mo
+
+    # ---- host configuration ----
+
+    def _EnterMaintenanceMode_Task(self, host, timeout, evacuatePoweredOffVms=None, maintenanceSpec=None):
+        # without DRS nothing moves the running VMs away; like vCenter, refuse while any are left
+        def apply():
+            props = self._objects[self._existing(host)._moId]
+            running = self._running_vms(host._moId)
+            if running:
+                raise vim.fault.InvalidState(msg=f"{len(running)} powered-on VMs left on {props['name']}")
+            props['runtime'] = vim.host.RuntimeInfo(connectionState=props['runtime'].connectionState,
+                                                    inMaintenanceMode=True)
+            self._touch(host._moId)
+        return self._submit_task('HostSystem.enterMaintenanceMode', self._existing(host), apply)
+
+    def _ExitMaintenanceMode_Task(self, host, timeout):
+        def apply():
+            props = self._objects[self._existing(host)._moId]
+            props['runtime'] = vim.host.RuntimeInfo(connectionState=props['runtime'].connectionState,
+                                                    inMaintenanceMode=False)
+            self._touch(host._moId)
+        return self._submit_task('HostSystem.exitMaintenanceMode', self._existing(host), apply)
+
+    def _AddVirtualSwitch(self, network_system, vswitchName, spec=None):
+        self._UpdateNetworkConfig(network_system, vim.host.NetworkConfig(vswitch=[vim.host.VirtualSwitch.Config(
+            changeOperation='add', name=vswitchName,
+            spec=spec or vim.host.VirtualSwitch.Specification(numPorts=128))]), 'modify')
+
+    def _UpdateVirtualSwitch(self, network_system, vswitchName, spec):
+        self._UpdateNetworkConfig(network_system, vim.host.NetworkConfig(vswitch=[vim.host.VirtualSwitch.Config(
+            changeOperation='edit', name=vswitchName, spec=spec)]), 'modify')
+
+    def _RemoveVirtualSwitch(self, network_system, vswitchName):
+        self._UpdateNetworkConfig(network_system, vim.host.NetworkConfig(vswitch=[vim.host.VirtualSwitch.Config(
+            changeOperation='remove', name=vswitchName)]), 'modify')
+
+    def _UpdateNetworkConfig(self, network_system, config, changeMode):
+        # all-or-nothing like the real call: the new NetworkInfo is only stored once every change applied
+        info = self._objects[network_system._moId]['networkInfo']
+        vswitches = {vswitch.name: vswitch for vswitch in info.vswitch}
+        portgroups = {portgroup.spec.name: portgroup for portgroup in info.portgroup}
+        for change in config.vswitch:
+            exists = change.name in vswitches
+            if change.changeOperation == 'add' and exists:
+                raise vim.fault.AlreadyExists(name=change.name)
+            if change.changeOperation in ('edit', 'remove') and not exists:
+                raise vim.fault.NotFound()
+            if change.changeOperation != 'remove':
+                vswitches[change.name] = vim.host.VirtualSwitch(name=change.name, numPorts=change.spec.numPorts,
+                                                                mtu=change.spec.mtu, spec=change.spec)
+        for change in config.portgroup:
+            name = change.spec.name
+            exists = name in portgroups
+            if change.changeOperation == 'add' and exists:
+                raise vim.fault.AlreadyExists(name=name)
+            if change.changeOperation in ('edit', 'remove') and not exists:
+                raise vim.fault.NotFound()
+            if change.changeOperation == 'remove':
+                del portgroups[name]
+            elif change.spec.vswitchName not in vswitches:
+                raise vim.fault.NotFound()
+            else:
+                portgroups[name] = vim.host.PortGroup(key=f"key-vim.host.PortGroup-{name}", spec=change.spec)
+        for change in config.vswitch:
+            if change.changeOperation == 'remove':
+                if any(portgroup.spec.vswitchName == change.name for portgroup in portgroups.values()):
+                    raise vim.fault.ResourceInUse(name=change.name)
+                del vswitches[change.name]
+        self._objects[network_system._moId]['networkInfo'] = vim.host.NetworkInfo(
+            vswitch=list(vswitches.values()), portgroup=list(portgroups.values()), pnic=info.pnic)
+        self._touch(network_system._moId)
+        return vim.host.NetworkConfig.Result()
+
+    def _RemoveDatastore(self, datastore_system, datastore):
+        self._remove(self._existing(datastore))
+
+
+class FakeSessionPool(SessionPool):
+    # hands out sessions on a FakeVSphere instead of logging in; install() makes it the pool every
+    # VMwareClient uses by default, including the per-host clients of HostFanOut
+    def __init__(self, vsphere, keepalive_interval=DEFAULT_KEEPALIVE_INTERVAL):
+        super().__init__(keepalive_interval)
+        self.vsphere = vsphere
+
+    def install(self):
+        with SessionPool._default_lock:
+            SessionPool._default = self
+        return self
+
+    def clone_session(self, session):
+        return self.vsphere.service_instance()
+
+    def _clone_login(self, host, port, ticket, disable_ssl_cert_verify):
+        return self.vsphere.service_instance()
+
+    def _login(self, host, user, pwd, port, disable_ssl_cert_verify):
+        return self.vsphere.service_instance()
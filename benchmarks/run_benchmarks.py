@@ -0,0 +1,333 @@
+# benchmarks/run_benchmarks.py
+# Throughput, latency and SOAP round trips per operation for the VM, vSwitch and datastore controllers,
+# measured against FakeVSphere at several inventory sizes. No vCenter needed:
+#
+#   python -m benchmarks.run_benchmarks --sizes 10 1000 10000 --latency-ms 1 --output results.json
+#   python -m benchmarks.run_benchmarks --baseline results.json    # exits 1 on a regression
+#
+# Size 0 rows time importing and constructing each model in a fresh interpreter (startup cost).
+# With --processes N, sharded_get_vm_details runs N times the get_vm_details workload through
+# core/shard_runner.py, each worker process on its own copy of the fake inventory.
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from benchmarks.fake_vsphere import FakeVSphere, FakeSessionPool
+from controller.vm_controller import VMController
+from controller.migration_controller import MigrationController
+from controller.vswitch_controller import VSwitchController
+from controller.vdatastore_controller import DatastoreController
+from core import instrumentation, task_analytics, throttle
+from core.shard_runner import ShardRunner, operation
+from core.config import CONFIG_ENV_VAR
+from core.logger import configure_logging
+from core.stats import summarize_latencies
+from view.vm_view import OutputFormat
+
+DEFAULT_SIZES = [10, 1000, 10000]
+DEFAULT_OPS = 100
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# cold-start cost a short-lived command or fresh worker pays: import the model and build it, no connection
+IMPORT_SCENARIOS = {
+    'import_vm_model': "from models.vm_model import VMModel; VMModel()",
+    'import_vswitch_model': "from models.vswitch_model import VSwitchModel; VSwitchModel()",
+    'import_datastore_model': "from models.vdatastore_model import DatastoreModel; DatastoreModel()",
+}
+IMPORT_TIMER = "import time; started = time.perf_counter(); {}; print(time.perf_counter() - started)"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline controller benchmarks against a fake vSphere")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES, help="VM counts to benchmark at")
+    parser.add_argument("--ops", type=int, default=DEFAULT_OPS, help="operations per scenario")
+    parser.add_argument("--list-ops", type=int, default=3, help="get_vm_list calls per size")
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--datastores", type=int, default=4)
+    parser.add_argument("--folders", type=int, default=None, help="VM folders (default: one per 1000 VMs)")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="injected round-trip latency per call")
+    parser.add_argument("--task-ms", type=float, default=50.0, help="duration of every vSphere task")
+    parser.add_argument("--task-concurrency", type=int, default=None, help="tasks running at once before queueing")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="VMController bulk window")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="share of calls failing with HTTP 503")
+    parser.add_argument("--calls-per-second", type=float, default=None, help="client-side API call rate limit")
+    parser.add_argument("--tasks-per-second", type=float, default=None, help="client-side task submission limit")
+    parser.add_argument("--no-serialize", action='store_true', help="skip SOAP encoding of requests/responses")
+    parser.add_argument("--import-runs", type=int, default=5,
+                        help="fresh interpreters per import scenario (0 skips them)")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="worker processes for the sharded scenario (0 skips it)")
+    parser.add_argument("--log-level", default='WARNING')
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown vs the baseline")
+    return parser.parse_args(argv)
+
+
+def write_config(directory, args):
+    config = {
+        'vmware': {
+            'vcenter': {'host': 'vcenter.bench.local', 'user': 'bench', 'password': 'bench', 'port': 443,
+                        'disableSslCertValidation': True},
+            'esxi': {'host': 'esxi.bench.local', 'user': 'root', 'password': 'bench', 'port': 443,
+                     'disableSslCertValidation': True},
+        },
+        'scale_operations': {'max_in_flight': args.max_in_flight or 8},
+        'throttle': {'calls_per_second': args.calls_per_second, 'tasks_per_second': args.tasks_per_second,
+                     'base_delay': 0.01},
+    }
+    path = os.path.join(directory, 'benchmark_config.yaml')
+    with open(path, 'w') as file:
+        yaml.safe_dump(config, file)
+    return path
+
+
+def measure(size, scenario, operation, calls, items=None):
+    # calls: zero-argument callables returning controller results; items: operations done per call (bulk)
+    instrumentation.reset()
+    latencies, failed = [], 0
+    started = time.perf_counter()
+    for call in calls:
+        call_started = time.perf_counter()
+        result = call()
+        if items:
+            stats = result["data"]["stats"]
+            latencies.extend(item["latency"] for item in result["data"]["results"])
+            failed += stats["failed"]
+        else:
+            latencies.append(time.perf_counter() - call_started)
+            failed += 0 if result.get("status") else 1
+    elapsed = time.perf_counter() - started
+    ops = len(latencies)
+    stats = instrumentation.get_stats().get(operation, {})
+    summary = summarize_latencies(latencies)
+    return {
+        "size": size,
+        "scenario": scenario,
+        "ops": ops,
+        "failed": failed,
+        "elapsed": elapsed,
+        "ops_per_sec": ops / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": (summary["p50"] or 0) * 1000,
+        "p99_ms": (summary["p99"] or 0) * 1000,
+        "soap_calls_per_op": stats.get("soap_calls", 0) / ops if ops else 0.0,
+        "bytes_per_op": (stats.get("bytes_sent", 0) + stats.get("bytes_received", 0)) / ops if ops else 0.0,
+    }
+
+
+def measure_imports(runs):
+    # each run is a new interpreter so nothing is already in sys.modules; reported with size 0
+    results = []
+    for scenario, statement in IMPORT_SCENARIOS.items():
+        latencies = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', IMPORT_TIMER.format(statement)], cwd=REPO_ROOT,
+                                    capture_output=True, text=True, check=True).stdout
+            latencies.append(float(output.split()[-1]))
+        summary = summarize_latencies(latencies)
+        elapsed = sum(latencies)
+        results.append({
+            "size": 0,
+            "scenario": scenario,
+            "ops": runs,
+            "failed": 0,
+            "elapsed": elapsed,
+            "ops_per_sec": runs / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": summary["p50"] * 1000,
+            "p99_ms": summary["p99"] * 1000,
+            "soap_calls_per_op": 0.0,
+            "bytes_per_op": 0.0,
+        })
+    return results
+
+
+def fake_vsphere_options(size, args):
+    return {"vms": size, "hosts": args.hosts, "datastores": args.datastores,
+            "vm_folders": args.folders or max(1, size // 1000), "latency": args.latency_ms / 1000.0,
+            "task_duration": args.task_ms / 1000.0, "task_concurrency": args.task_concurrency,
+            "serialize": not args.no_serialize, "fault_rate": args.fault_rate}
+
+
+def install_fake_vsphere(options):
+    # ShardRunner worker initializer: every worker process serves its own identical fake inventory
+    FakeSessionPool(FakeVSphere(**options)).install()
+
+
+def measure_sharded(size, args, names):
+    runner = ShardRunner(max_processes=args.processes, shards_per_target=args.processes,
+                         initializer=install_fake_vsphere, initargs=(fake_vsphere_options(size, args),))
+    result = runner.run([operation('vm', 'get_vm_details', name) for name in names])
+    stats = result["data"]["stats"]
+    return {
+        "size": size,
+        "scenario": 'sharded_get_vm_details',
+        "ops": stats["total"],
+        "failed": stats["failed"],
+        "elapsed": stats["elapsed"],
+        "ops_per_sec": stats["throughput"],
+        "p50_ms": (stats["latency"]["p50"] or 0) * 1000,
+        "p99_ms": (stats["latency"]["p99"] or 0) * 1000,
+        # the calls are made in the workers, out of this process's instrumentation
+        "soap_calls_per_op": 0.0,
+        "bytes_per_op": 0.0,
+    }
+
+
+def run_size(size, args):
+    vsphere = FakeVSphere(**fake_vsphere_options(size, args))
+    pool = FakeSessionPool(vsphere).install()
+    ops = args.ops
+    rng = random.Random(size)
+    results = []
+    controllers = {}
+    try:
+        @instrumentation.traced('startup')
+        def start_controllers():
+            controllers['vm'] = VMController()
+            controllers['vswitch'] = VSwitchController('esxi')
+            controllers['datastore'] = DatastoreController('vcenter')
+            # controllers connect lazily; time the login and cache sync they would do on first use
+            for controller in controllers.values():
+                controller.connect()
+            return {"status": True}
+
+        results.append(measure(size, 'startup', 'startup', [start_controllers]))
+        vm_controller = controllers['vm']
+
+        existing = vsphere.vm_names()
+        sample = [rng.choice(existing) for _ in range(ops)]
+        template = vsphere.template_names()[0]
+        datastore = vsphere.datastore_names()[0]
+        hosts = vsphere.host_names()
+
+        results.append(measure(size, 'get_vm_details', 'VMController.get_vm_details',
+                               [lambda name=name: vm_controller.get_vm_details(name) for name in sample]))
+        results.append(measure(size, 'get_vm_list', 'VMController.get_vm_list',
+                               [vm_controller.get_vm_list] * args.list_ops))
+        results.append(measure(size, 'edit_vm', 'VMController.edit_vm',
+                               [lambda name=name: vm_controller.edit_vm(name, cpu=2)
+                                for name in sample[:ops // 4 or 1]]))
+
+        new_names = [f"bench-{size}-{index}" for index in range(ops)]
+        specs = [{"name": name, "template_name": template, "datastore_name": datastore, "cpu": 1, "memory": 512,
+                  "network": "VM Network"} for name in new_names]
+        results.append(measure(size, 'create_vms', 'VMController.create_vms',
+                               [lambda: vm_controller.create_vms(specs)], items=True))
+        results.append(measure(size, 'edit_vms', 'VMController.edit_vms',
+                               [lambda: vm_controller.edit_vms([{"vm_name": name, "memory": 1024}
+                                                                for name in new_names])], items=True))
+        results.append(measure(size, 'migrate_vms', 'VMController.migrate_vms',
+                               [lambda: vm_controller.migrate_vms([{"vm_name": name, "host_name": rng.choice(hosts)}
+                                                                   for name in new_names])], items=True))
+        results.append(measure(size, 'delete_vms', 'VMController.delete_vms',
+                               [lambda: vm_controller.delete_vms(new_names)], items=True))
+
+        linked_specs = [dict(spec, name=f"{spec['name']}-linked", provisioning='linked') for spec in specs]
+        results.append(measure(size, 'create_vms_linked', 'VMController.create_vms',
+                               [lambda: vm_controller.create_vms(linked_specs)], items=True))
+        vm_controller.delete_vms([spec["name"] for spec in linked_specs])
+
+        vswitch_controller = controllers['vswitch']
+        vswitches = [f"vSwitchBench{index}" for index in range(max(1, ops // 10))]
+        results.append(measure(size, 'create_vswitch', 'VSwitchController.create_vswitch',
+                               [lambda name=name: vswitch_controller.create_vswitch(name, 64, None)
+                                for name in vswitches]))
+        results.append(measure(size, 'update_vswitch', 'VSwitchController.update_vswitch',
+                               [lambda name=name: vswitch_controller.update_vswitch(name, 128) for name in vswitches]))
+        results.append(measure(size, 'delete_vswitch', 'VSwitchController.delete_vswitch',
+                               [lambda name=name: vswitch_controller.delete_vswitch(name) for name in vswitches]))
+
+        datastore_controller = controllers['datastore']
+        results.append(measure(size, 'list_datastores', 'DatastoreController.list_datastores',
+                               [datastore_controller.list_datastores] * max(1, ops // 10)))
+
+        # drain the first host; the planner's read and the limited-parallel RelocateVM_Task run as one operation
+        migration_controller = MigrationController(vm_controller)
+        results.append(measure(size, 'evacuate_host', 'MigrationController.evacuate_host',
+                               [lambda: migration_controller.evacuate_host(hosts[0])]))
+
+        # where the task time went, from TaskInfo and the fake's event history
+        analytics = OutputFormat.format_task_analytics(vm_controller.get_task_analytics())
+        task_analytics.reset()
+
+        if args.processes:
+            results.append(measure_sharded(size, args, [rng.choice(existing) for _ in range(ops * args.processes)]))
+    finally:
+        for controller in controllers.values():
+            controller.close()
+        pool.close_all()
+    return results, analytics
+
+
+def compare(results, baseline, tolerance):
+    previous = {(entry["size"], entry["scenario"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry["size"], entry["scenario"]))
+        if before is None:
+            continue
+        if entry["ops_per_sec"] < before["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{entry['scenario']}@{entry['size']}: {before['ops_per_sec']:.1f} -> "
+                               f"{entry['ops_per_sec']:.1f} ops/s")
+        if entry["soap_calls_per_op"] > before["soap_calls_per_op"] * (1 + tolerance) + 0.5:
+            regressions.append(f"{entry['scenario']}@{entry['size']}: {before['soap_calls_per_op']:.1f} -> "
+                               f"{entry['soap_calls_per_op']:.1f} SOAP calls/op")
+    return regressions
+
+
+def format_table(results):
+    header = f"{'size':>7} {'scenario':<22} {'ops':>6} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'soap/op':>8} " \
+             f"{'KB/op':>8} {'failed':>6}"
+    lines = [header, '-' * len(header)]
+    for entry in results:
+        lines.append(f"{entry['size']:>7} {entry['scenario']:<22} {entry['ops']:>6} {entry['ops_per_sec']:>9.1f} "
+                     f"{entry['p50_ms']:>9.2f} {entry['p99_ms']:>9.2f} {entry['soap_calls_per_op']:>8.1f} "
+                     f"{entry['bytes_per_op'] / 1024:>8.1f} {entry['failed']:>6}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(level=args.log_level)
+    instrumentation.enable()
+    task_analytics.enable()
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ[CONFIG_ENV_VAR] = write_config(directory, args)
+        results = []
+        if args.import_runs:
+            results.extend(measure_imports(args.import_runs))
+            print(format_table(results), flush=True)
+            print()
+        for size in args.sizes:
+            size_results, analytics = run_size(size, args)
+            results.extend(size_results)
+            print(format_table(size_results), flush=True)
+            print(analytics)
+            print()
+        for endpoint, stats in throttle.get_stats().items():
+            print(f"{endpoint}: {stats['calls']} calls, {stats['throttled']} throttled "
+                  f"({stats['throttled_seconds']:.1f}s), {stats['retries']} retries, {stats['give_ups']} give-ups")
+
+    params = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({"params": params, "results": results}, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
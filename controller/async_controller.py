@@ -0,0 +1,258 @@
+# controllers/async_controller.py
+# asyncio facades over the synchronous controllers. Blocking pyVmomi calls run on one bounded, shared
+# executor; VM tasks are submitted there but awaited through AsyncTaskWaiter, which parks a single
+# executor thread in TaskWaiter.wait_any for all outstanding tasks, so thousands of operations can be
+# in flight from one event loop without one blocked thread each.
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from controller.vm_controller import VMController
+from controller.vswitch_controller import VSwitchController
+from controller.vdatastore_controller import DatastoreController
+from core.task_waiter import TaskError, TaskResult, TaskTimeout
+from core.logger import logger
+
+DEFAULT_MAX_WORKERS = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers or DEFAULT_MAX_WORKERS,
+                                           thread_name_prefix='async-controller')
+        return _executor
+
+
+class AsyncTaskWaiter:
+    def __init__(self, task_waiter, executor=None, poll_seconds=1):
+        self.task_waiter = task_waiter
+        self.executor = executor or get_executor()
+        self.poll_seconds = poll_seconds
+        self._pending = {}
+        self._pump = None
+
+    async def wait(self, task, timeout=None):
+        loop = asyncio.get_running_loop()
+        # register the filter right away; the pump picks the task up on its next wait_any round
+        await loop.run_in_executor(self.executor, self.task_waiter.watch, [task])
+        future = loop.create_future()
+        _, futures = self._pending.setdefault(task._moId, (task, []))
+        futures.append(future)
+        if self._pump is None or self._pump.done():
+            self._pump = loop.create_task(self._run_pump())
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise TaskTimeout([TaskResult(task)]) from None
+        finally:
+            if not future.done():
+                self._discard(task, future)
+        if not result.succeeded:
+            raise TaskError(result)
+        return result
+
+    def _discard(self, task, future):
+        entry = self._pending.get(task._moId)
+        if entry and future in entry[1]:
+            entry[1].remove(future)
+            if not entry[1]:
+                del self._pending[task._moId]
+                # DestroyPropertyFilter is a round trip: off the loop, and nobody waits for it
+                asyncio.get_running_loop().run_in_executor(self.executor, self._unwatch, task)
+
+    def _unwatch(self, task):
+        try:
+            self.task_waiter.unwatch([task])
+        except Exception as e:
+            logger.error("Failed to stop watching task %s: %s", task._moId, e)
+
+    async def _run_pump(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            tasks = [task for task, _ in self._pending.values()]
+            try:
+                finished = await loop.run_in_executor(
+                    self.executor, functools.partial(self.task_waiter.wait_any, tasks, self.poll_seconds))
+            except Exception as e:
+                logger.error("Async task pump failed: %s", e)
+                for _, futures in self._pending.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                self._pending.clear()
+                return
+            for result in finished:
+                _, futures = self._pending.pop(result.key, (None, []))
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+
+
+class _AsyncController:
+    controller_class = None
+
+    def __init__(self, controller, executor=None):
+        self.controller = controller
+        self.executor = executor or get_executor()
+
+    @classmethod
+    async def create(cls, *args, executor=None, **kwargs):
+        # logging in and syncing the inventory cache block, so both run off the event loop
+        executor = executor or get_executor()
+        loop = asyncio.get_running_loop()
+        controller = await loop.run_in_executor(executor, functools.partial(cls.controller_class, *args, **kwargs))
+        await loop.run_in_executor(executor, controller.connect)
+        return cls(controller, executor)
+
+    async def close(self):
+        await self._call(self.controller.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _call(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+
+class AsyncVMController(_AsyncController):
+    controller_class = VMController
+
+    def __init__(self, controller, executor=None):
+        super().__init__(controller, executor)
+        self.tasks = AsyncTaskWaiter(controller.task_waiter, self.executor)
+
+    async def create_vm(self, name, template_name, datastore_name, cpu, memory, network, provisioning=None):
+        return await self._run_task(
+            f"create VM {name}", f"VM {name} created",
+            self.controller._submit_create_vm, name, template_name, datastore_name, cpu, memory, network,
+            provisioning)
+
+    async def edit_vm(self, vm_name, cpu=None, memory=None):
+        return await self._run_task(f"edit VM {vm_name}", f"VM {vm_name} edited",
+                                    self.controller._submit_edit_vm, vm_name, cpu, memory)
+
+    async def delete_vm(self, vm_name):
+        return await self._run_task(f"delete VM {vm_name}", f"VM {vm_name} deleted",
+                                    self.controller._submit_delete_vm, vm_name)
+
+    async def migrate_vm(self, vm_name, host_name):
+        return await self._run_task(f"migrate VM {vm_name}", f"VM {vm_name} migrated to host {host_name}",
+                                    self.controller._submit_migrate_vm, vm_name, host_name)
+
+    async def create_vms(self, vm_specs, max_in_flight=None):
+        return await self._call(self.controller.create_vms, vm_specs, max_in_flight)
+
+    async def edit_vms(self, vm_edits, max_in_flight=None):
+        return await self._call(self.controller.edit_vms, vm_edits, max_in_flight)
+
+    async def delete_vms(self, vm_names, max_in_flight=None):
+        return await self._call(self.controller.delete_vms, vm_names, max_in_flight)
+
+    async def migrate_vms(self, migrations, max_in_flight=None, per_host_limit=None, per_cluster_limit=None):
+        return await self._call(self.controller.migrate_vms, migrations, max_in_flight, per_host_limit,
+                                per_cluster_limit)
+
+    async def get_vm_list(self, properties=None, predicate=None, page_size=None):
+        return await self._call(self.controller.get_vm_list, properties, predicate, page_size)
+
+    async def get_task_analytics(self, include_events=True):
+        return await self._call(self.controller.get_task_analytics, include_events)
+
+    async def get_vm_details(self, vm_name):
+        return await self._call(self.controller.get_vm_details, vm_name)
+
+    async def wait_for_task(self, task, timeout=None):
+        return await self.tasks.wait(task, timeout or self.controller.task_timeout)
+
+    async def _run_task(self, description, success_message, submit, *args):
+        try:
+            task = await self._call(submit, *args)
+            await self.wait_for_task(task)
+            logger.info(success_message)
+            return {"status": True, "message": success_message}
+        except LookupError as e:
+            logger.error(str(e))
+            return {"status": False, "message": str(e)}
+        except Exception as e:
+            logger.error("Failed to %s: %s", description, e)
+            return {"status": False, "message": str(e)}
+
+
+class AsyncVSwitchController(_AsyncController):
+    controller_class = VSwitchController
+
+    async def create_vswitch(self, vswitch_name, num_ports, uplink_portgroup):
+        return await self._call(self.controller.create_vswitch, vswitch_name, num_ports, uplink_portgroup)
+
+    async def update_vswitch(self, vswitch_name, num_ports=None, uplink_portgroup=None):
+        return await self._call(self.controller.update_vswitch, vswitch_name, num_ports, uplink_portgroup)
+
+    async def apply_network_config(self, desired, prune=False, dry_run=False):
+        return await self._call(self.controller.apply_network_config, desired, prune, dry_run)
+
+    async def delete_vswitch(self, vswitch_name):
+        return await self._call(self.controller.delete_vswitch, vswitch_name)
+
+    async def create_vswitch_on_hosts(self, vswitch_name, num_ports=128, uplink_portgroup=None, hosts=None):
+        return await self._call(self.controller.create_vswitch_on_hosts, vswitch_name, num_ports,
+                                uplink_portgroup, hosts)
+
+    async def update_vswitch_on_hosts(self, vswitch_name, num_ports=None, uplink_portgroup=None, hosts=None):
+        return await self._call(self.controller.update_vswitch_on_hosts, vswitch_name, num_ports,
+                                uplink_portgroup, hosts)
+
+    async def apply_network_config_on_hosts(self, desired, prune=False, dry_run=False, hosts=None):
+        return await self._call(self.controller.apply_network_config_on_hosts, desired, prune, dry_run, hosts)
+
+    async def delete_vswitch_on_hosts(self, vswitch_name, hosts=None):
+        return await self._call(self.controller.delete_vswitch_on_hosts, vswitch_name, hosts)
+
+
+class AsyncDatastoreController(_AsyncController):
+    controller_class = DatastoreController
+
+    async def create_datastore(self, datastore_name, capacity_gb, disk_path):
+        return await self._call(self.controller.create_datastore, datastore_name, capacity_gb, disk_path)
+
+    async def delete_datastore(self, datastore_name):
+        return await self._call(self.controller.delete_datastore, datastore_name)
+
+    async def list_datastores(self):
+        return await self._call(self.controller.list_datastores)
+
+    async def get_datastore_snapshot(self, refresh=False):
+        return await self._call(self.controller.get_datastore_snapshot, refresh)
+
+    async def pick_datastore(self, required_gb=0, datastore_type=None, refresh=False):
+        return await self._call(self.controller.pick_datastore, required_gb, datastore_type, refresh)
+
+    async def upload_files(self, transfers, verify=None, max_parallel=None):
+        return await self._call(self.controller.upload_files, transfers, verify, max_parallel)
+
+    async def download_files(self, transfers, max_parallel=None):
+        return await self._call(self.controller.download_files, transfers, max_parallel)
+
+    async def distribute_files(self, local_paths, datastore_names, remote_dir='', verify=None, max_parallel=None):
+        return await self._call(self.controller.distribute_files, local_paths, datastore_names, remote_dir, verify,
+                                max_parallel)
+
+    async def create_datastore_on_hosts(self, datastore_name, capacity_gb, disk_path, hosts=None):
+        return await self._call(self.controller.create_datastore_on_hosts, datastore_name, capacity_gb,
+                                disk_path, hosts)
+
+    async def delete_datastore_on_hosts(self, datastore_name, hosts=None):
+        return await self._call(self.controller.delete_datastore_on_hosts, datastore_name, hosts)
+
+    async def list_datastores_on_hosts(self, hosts=None):
+        return await self._call(self.controller.list_datastores_on_hosts, hosts)
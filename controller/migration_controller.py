@@ -0,0 +1,224 @@
+# controllers/migration_controller.py
+
+from pyVmomi import vim
+from controller.vm_controller import VMController
+from core.vmware_client import VMwareClient
+from core import migration_planner
+from core.migration_planner import HostLoad, vm_demand
+from core.instrumentation import traced
+from core.logger import logger
+
+# vSphere itself allows 8 concurrent vMotions per host on 10GbE; leave headroom for DRS and other users
+DEFAULT_PER_HOST_LIMIT = 4
+DEFAULT_PER_CLUSTER_LIMIT = 16
+HOST_PROPERTIES = ['name', 'parent', 'runtime.connectionState', 'runtime.inMaintenanceMode',
+                   'summary.hardware.cpuMhz', 'summary.hardware.numCpuCores', 'summary.hardware.memorySize',
+                   'summary.quickStats.overallCpuUsage', 'summary.quickStats.overallMemoryUsage']
+VM_PROPERTIES = ['name', 'runtime.host', 'runtime.powerState', 'config.template', 'config.hardware.memoryMB',
+                 'summary.quickStats.overallCpuUsage']
+
+
+class MigrationController:
+    # Evacuates a host or rebalances a cluster: a plan is computed from one batched read of every host's
+    # capacity and usage and every VM's size (core/migration_planner.py), then run as parallel
+    # RelocateVM_Task migrations within per-host and per-cluster limits. Each result sets the planner's
+    # duration estimate next to the measured one. Needs vCenter: placement spans the hosts of a cluster.
+    def __init__(self, vm_controller=None, per_host_limit=None, per_cluster_limit=None, max_utilization=None,
+                 client=None, connection_type='vcenter'):
+        self.vm_controller = vm_controller or VMController(client=client or VMwareClient(connection_type))
+        config = self.vm_controller.client.config
+        self.per_host_limit = per_host_limit or config.get('migration.per_host_limit') or DEFAULT_PER_HOST_LIMIT
+        self.per_cluster_limit = (per_cluster_limit or config.get('migration.per_cluster_limit')
+                                  or DEFAULT_PER_CLUSTER_LIMIT)
+        self.max_utilization = (max_utilization or config.get('migration.max_utilization')
+                                or migration_planner.DEFAULT_MAX_UTILIZATION)
+        self.rebalance_tolerance = (config.get('migration.rebalance_tolerance')
+                                    or migration_planner.DEFAULT_REBALANCE_TOLERANCE)
+        self.max_moves = config.get('migration.max_moves') or migration_planner.DEFAULT_MAX_MOVES
+        self.estimate = {
+            "mb_per_second": (config.get('migration.vmotion_mb_per_second')
+                              or migration_planner.DEFAULT_VMOTION_MB_PER_SECOND),
+            "overhead_seconds": (config.get('migration.vmotion_overhead_seconds')
+                                 or migration_planner.DEFAULT_VMOTION_OVERHEAD_SECONDS),
+        }
+
+    def close(self):
+        self.vm_controller.close()
+
+    @traced()
+    def get_host_load(self, cluster_name=None):
+        try:
+            hosts, _ = self._read_load()
+            loads = [load.as_dict() for load in hosts.values() if cluster_name is None or load.cluster == cluster_name]
+            logger.info("Read the load of %d hosts", len(loads))
+            return {"status": True, "data": loads}
+        except Exception as e:
+            logger.error("Failed to read host load: %s", e)
+            return {"status": False, "message": str(e)}
+
+    @traced()
+    def plan_evacuation(self, host_name, max_utilization=None):
+        # status is False when some VMs fit nowhere in the cluster; the plan then lists them as unplaced
+        try:
+            hosts, vms = self._read_load()
+            if host_name not in hosts:
+                raise LookupError(f"Host {host_name} not found")
+            cluster = hosts[host_name].cluster
+            before = self._utilization(hosts, cluster, exclude=host_name)
+            moves, unplaced = migration_planner.plan_evacuation(hosts, vms, host_name,
+                                                                max_utilization or self.max_utilization,
+                                                                **self.estimate)
+            plan = self._plan("evacuate", cluster, moves, unplaced, before,
+                              self._utilization(hosts, cluster, exclude=host_name))
+            message = f"Evacuating {host_name}: {len(moves)} migrations, ~{plan['estimate']['seconds']:.0f}s"
+            if unplaced:
+                message += f", {len(unplaced)} VMs fit nowhere"
+            logger.info(message)
+            return {"status": not unplaced, "message": message, "data": plan}
+
+        except LookupError as e:
+            logger.error(str(e))
+            return {"status": False, "message": str(e)}
+        except Exception as e:
+            logger.error("Failed to plan evacuation of %s: %s", host_name, e)
+            return {"status": False, "message": str(e)}
+
+    @traced()
+    def plan_rebalance(self, cluster_name, tolerance=None, max_moves=None):
+        try:
+            hosts, vms = self._read_load()
+            if not any(load.cluster == cluster_name for load in hosts.values()):
+                raise LookupError(f"Cluster {cluster_name} not found")
+            before = self._utilization(hosts, cluster_name)
+            moves = migration_planner.plan_rebalance(hosts, vms, cluster_name, tolerance or self.rebalance_tolerance,
+                                                     max_moves or self.max_moves, self.max_utilization,
+                                                     **self.estimate)
+            plan = self._plan("rebalance", cluster_name, moves, [], before, self._utilization(hosts, cluster_name))
+            message = (f"Rebalancing {cluster_name}: {len(moves)} migrations, spread "
+                       f"{plan['spread_before']:.2f} -> {plan['spread_after']:.2f}")
+            logger.info(message)
+            return {"status": True, "message": message, "data": plan}
+
+        except LookupError as e:
+            logger.error(str(e))
+            return {"status": False, "message": str(e)}
+        except Exception as e:
+            logger.error("Failed to plan rebalance of %s: %s", cluster_name, e)
+            return {"status": False, "message": str(e)}
+
+    @traced()
+    def execute_plan(self, plan, max_in_flight=None):
+        # runs the plan's moves through VMController.migrate_vms and reports estimated vs actual durations
+        moves = plan["moves"]
+        batch = self.vm_controller.migrate_vms(moves, max_in_flight or len(moves) or None, self.per_host_limit,
+                                               self.per_cluster_limit)
+        outcomes = {item["name"]: item for item in batch["data"]["results"]}
+        results = []
+        for move in moves:
+            outcome = outcomes.get(move["vm_name"], {})
+            results.append(dict(move, status=outcome.get("status", False), message=outcome.get("message"),
+                                actual_seconds=outcome.get("latency")))
+        stats = batch["data"]["stats"]
+        estimated = plan["estimate"]["seconds"]
+        report = {"estimated_seconds": estimated, "actual_seconds": stats["elapsed"],
+                  "actual_to_estimate": stats["elapsed"] / estimated if estimated else None,
+                  "serial_estimate_seconds": plan["estimate"]["serial_seconds"]}
+        message = (f"{stats['succeeded']}/{len(moves)} migrations succeeded in {stats['elapsed']:.1f}s "
+                   f"(planned {estimated:.1f}s)")
+        logger.info(message)
+        return {"status": batch["status"], "message": message,
+                "data": {"kind": plan["kind"], "cluster": plan["cluster"], "results": results, "duration": report,
+                         "stats": stats}}
+
+    @traced()
+    def evacuate_host(self, host_name, enter_maintenance=False, max_utilization=None, max_in_flight=None):
+        # moves every VM off host_name; with enter_maintenance the host then enters maintenance mode, which
+        # is skipped when any VM could not be placed or moved
+        planned = self.plan_evacuation(host_name, max_utilization)
+        if "data" not in planned:
+            return planned
+        result = self.execute_plan(planned["data"], max_in_flight)
+        unplaced = planned["data"]["unplaced"]
+        result["data"]["unplaced"] = unplaced
+        result["status"] = result["status"] and not unplaced
+        if unplaced:
+            result["message"] += f"; {len(unplaced)} VMs left on {host_name}, no room in the cluster"
+        if enter_maintenance:
+            if not result["status"]:
+                result["message"] += "; not entering maintenance mode"
+            else:
+                try:
+                    host = self.vm_controller._get_host_by_name(host_name)
+                    self.vm_controller._wait_for_task(host.EnterMaintenanceMode_Task(timeout=0))
+                    result["message"] += f"; {host_name} in maintenance mode"
+                    logger.info("Host %s entered maintenance mode", host_name)
+                except Exception as e:
+                    logger.error("Failed to put %s into maintenance mode: %s", host_name, e)
+                    result["status"] = False
+                    result["message"] += f"; entering maintenance mode failed: {e}"
+        return result
+
+    @traced()
+    def rebalance_cluster(self, cluster_name, tolerance=None, max_moves=None, max_in_flight=None):
+        planned = self.plan_rebalance(cluster_name, tolerance, max_moves)
+        if "data" not in planned:
+            return planned
+        return self.execute_plan(planned["data"], max_in_flight)
+
+    def _read_load(self):
+        # ({host name: HostLoad}, [vm_demand record, ...]) from a single paged retrieval over all hosts,
+        # VMs and compute resources; templates and VMs without a host are left out
+        hosts, vms, clusters, host_names = [], [], {}, {}
+        for obj, props in self.vm_controller.inventory.iter_many({vim.HostSystem: HOST_PROPERTIES,
+                                                                  vim.VirtualMachine: VM_PROPERTIES,
+                                                                  vim.ComputeResource: ['name']}):
+            if isinstance(obj, vim.HostSystem):
+                hosts.append(props)
+                host_names[obj._moId] = props.get('name')
+            elif isinstance(obj, vim.VirtualMachine):
+                vms.append(props)
+            else:
+                clusters[obj._moId] = props.get('name')
+
+        loads = {}
+        for props in hosts:
+            parent = props.get('parent')
+            loads[props['name']] = HostLoad(
+                props['name'], clusters.get(parent._moId) if parent is not None else None,
+                (props.get('summary.hardware.cpuMhz') or 0) * (props.get('summary.hardware.numCpuCores') or 0),
+                (props.get('summary.hardware.memorySize') or 0) // (1024 * 1024),
+                props.get('summary.quickStats.overallCpuUsage') or 0,
+                props.get('summary.quickStats.overallMemoryUsage') or 0,
+                available=(props.get('runtime.connectionState') == 'connected'
+                           and not props.get('runtime.inMaintenanceMode')))
+        records = []
+        for props in vms:
+            host = props.get('runtime.host')
+            if props.get('config.template') or host is None or host._moId not in host_names:
+                continue
+            records.append(vm_demand(props['name'], host_names[host._moId],
+                                     props.get('summary.quickStats.overallCpuUsage') or 0,
+                                     props.get('config.hardware.memoryMB') or 0,
+                                     props.get('runtime.powerState') == vim.VirtualMachinePowerState.poweredOn))
+        return loads, records
+
+    def _utilization(self, hosts, cluster, exclude=None):
+        # the available hosts of cluster; an evacuated host would only skew the spread
+        return {load.name: round(load.utilization, 4) for load in hosts.values()
+                if load.cluster == cluster and load.available and load.name != exclude}
+
+    def _plan(self, kind, cluster, moves, unplaced, before, after):
+        return {
+            "kind": kind,
+            "cluster": cluster,
+            "moves": moves,
+            "unplaced": unplaced,
+            "utilization_before": before,
+            "utilization_after": after,
+            "spread_before": max(before.values()) - min(before.values()) if before else 0.0,
+            "spread_after": max(after.values()) - min(after.values()) if after else 0.0,
+            "estimate": {
+                "seconds": migration_planner.schedule(moves, self.per_host_limit, self.per_cluster_limit),
+                "serial_seconds": sum(move["estimated_seconds"] for move in moves),
+            },
+        }
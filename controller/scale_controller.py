@@ -0,0 +1,110 @@
+# controllers/scale_controller.py
+
+import time
+
+from controller.vm_controller import VMController
+from core.adaptive_window import AdaptiveWindow, DEFAULT_QUEUE_THRESHOLD
+from core.stats import summarize_latencies
+from core.instrumentation import traced
+from core.logger import logger
+
+DEFAULT_RAMP_STEPS = 5
+DEFAULT_MAX_WINDOW = 64
+
+
+class ScaleController:
+    # Ramps a pool of VMs from scale_operations.min_vms to max_vms and back down, one step at a time, with
+    # the bulk window adapted to vCenter's task queueing (see core/adaptive_window.py). Every step records
+    # throughput, latency and the queue/run split, so the curve shows where vCenter or storage saturates.
+    def __init__(self, vm_controller=None, min_vms=None, max_vms=None, step=None, initial_window=None,
+                 max_window=None, queue_threshold=None):
+        self.vm_controller = vm_controller or VMController()
+        config = self.vm_controller.client.config
+        self.min_vms = min_vms if min_vms is not None else config.get('scale_operations.min_vms') or 0
+        self.max_vms = max_vms if max_vms is not None else config.get('scale_operations.max_vms') or self.min_vms
+        if self.max_vms < self.min_vms:
+            raise ValueError(f"max_vms ({self.max_vms}) is below min_vms ({self.min_vms})")
+        self.step = (step or config.get('scale_operations.ramp_step')
+                     or max(1, (self.max_vms - self.min_vms) // DEFAULT_RAMP_STEPS))
+        self.initial_window = initial_window or self.vm_controller.max_in_flight
+        self.max_window = max_window or config.get('scale_operations.max_window') or DEFAULT_MAX_WINDOW
+        self.queue_threshold = (queue_threshold or config.get('scale_operations.queue_threshold')
+                                or DEFAULT_QUEUE_THRESHOLD)
+
+    def close(self):
+        self.vm_controller.close()
+
+    def plan(self):
+        # VM counts after each step: min, up to max, back down to min
+        up = list(range(self.min_vms, self.max_vms, self.step)) + [self.max_vms]
+        down = list(range(self.max_vms - self.step, self.min_vms, -self.step)) + [self.min_vms]
+        return up + (down if self.max_vms > self.min_vms else [])
+
+    @traced()
+    def ramp(self, vm_spec, name_prefix='scale-vm', cleanup=True):
+        # vm_spec holds the create_vm arguments except name (template_name, datastore_name, cpu, memory,
+        # network, optionally provisioning); VMs are named <name_prefix>-00000 upwards and removed newest first
+        window = AdaptiveWindow(self.initial_window, maximum=self.max_window, queue_threshold=self.queue_threshold)
+        created, steps = [], []
+        next_index = 0
+        try:
+            for target in self.plan():
+                if target > len(created):
+                    names = [f"{name_prefix}-{index:05d}" for index in range(next_index, next_index + target
+                                                                             - len(created))]
+                    next_index += len(names)
+                    step = self._run_step("up", target, window, lambda: self.vm_controller.create_vms(
+                        [dict(vm_spec, name=name) for name in names], window))
+                    created.extend(item["name"] for item in step.pop("_results") if item["status"])
+                elif target < len(created):
+                    names = created[target:][::-1]
+                    step = self._run_step("down", target, window,
+                                          lambda: self.vm_controller.delete_vms(names, window))
+                    deleted = {item["name"] for item in step.pop("_results") if item["status"]}
+                    created = [name for name in created if name not in deleted]
+                else:
+                    continue
+                step["vms"] = len(created)
+                steps.append(step)
+                logger.info("Scale step %s to %d VMs: %.2f ops/s, window %d -> %d", step["direction"], target,
+                            step["throughput"], step["window_start"], step["window_end"])
+        except Exception as e:
+            logger.error("Scale ramp failed: %s", e)
+            return {"status": False, "message": str(e), "data": {"steps": steps, "window": window.history}}
+        finally:
+            if cleanup and created:
+                self.vm_controller.delete_vms(created[::-1], window)
+
+        failed = sum(step["failed"] for step in steps)
+        peak = max(steps, key=lambda step: step["throughput"]) if steps else None
+        message = f"Ramp {self.min_vms}->{self.max_vms}->{self.min_vms} VMs in {len(steps)} steps, {failed} failures"
+        if peak:
+            message += f"; peak {peak['throughput']:.2f} ops/s at window {peak['window_end']}"
+        logger.info(message)
+        return {"status": failed == 0, "message": message,
+                "data": {"steps": steps, "peak": peak, "window": window.history}}
+
+    def _run_step(self, direction, target, window, run):
+        window_start = window.limit
+        started = time.monotonic()
+        result = run()
+        elapsed = time.monotonic() - started
+        results = result["data"]["results"]
+        stats = result["data"]["stats"]
+        return {
+            "direction": direction,
+            "target": target,
+            "operations": stats["total"],
+            "succeeded": stats["succeeded"],
+            "failed": stats["failed"],
+            "elapsed": elapsed,
+            "throughput": stats["total"] / elapsed if elapsed > 0 else 0.0,
+            "latency": stats["latency"],
+            "queue_time": summarize_latencies([item["queue_time"] for item in results
+                                               if item.get("queue_time") is not None]),
+            "run_time": summarize_latencies([item["run_time"] for item in results
+                                             if item.get("run_time") is not None]),
+            "window_start": window_start,
+            "window_end": window.limit,
+            "_results": results,
+        }
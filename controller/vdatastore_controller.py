@@ -1,64 +1,309 @@
 # datastore_controller.py
 
+import os
+import threading
+import time
+
 from pyVmomi import vim
 from core.vmware_client import VMwareClient
+from core.inventory import Inventory
+from core.inventory_cache import InventoryCache
+from core.host_fanout import HostFanOut
+from core.datastore_transfer import DatastoreTransfer, ESXI_DATACENTER, DEFAULT_MAX_PARALLEL, session_cookie
+from core.instrumentation import traced
 from core.logger import logger
 
+DEFAULT_SNAPSHOT_TTL = 30
+GB = 1024 ** 3
+MB = 1024 ** 2
+# everything placement needs, for every datastore, in one RetrievePropertiesEx
+SNAPSHOT_PROPERTIES = ['summary.name', 'summary.type', 'summary.capacity', 'summary.freeSpace',
+                       'summary.uncommitted', 'summary.accessible', 'summary.maintenanceMode', 'vm']
+
+
+def _snapshot_record(props):
+    capacity = props.get('summary.capacity') or 0
+    free = props.get('summary.freeSpace') or 0
+    return {
+        "name": props.get('summary.name'),
+        "type": props.get('summary.type'),
+        "capacity_gb": capacity / GB,
+        "free_gb": free / GB,
+        "uncommitted_gb": (props.get('summary.uncommitted') or 0) / GB,
+        "accessible": bool(props.get('summary.accessible')),
+        "maintenance_mode": props.get('summary.maintenanceMode') or 'normal',
+        "vm_count": len(props.get('vm') or []),
+    }
+
+
 class DatastoreController:
-    def __init__(self, connection_type='vcenter'):
-        self.client = VMwareClient(connection_type)
+    def __init__(self, connection_type='vcenter', client=None, snapshot_ttl=None):
+        # connects on first use, see inventory and inventory_cache
+        self.client = client or VMwareClient(connection_type)
+        self._inventory = None
+        self._inventory_cache = None
+        self._fan_out = None
+        ttl = snapshot_ttl if snapshot_ttl is not None else self.client.config.get('datastores.snapshot_ttl')
+        self.snapshot_ttl = ttl if ttl is not None else DEFAULT_SNAPSHOT_TTL
+        self._snapshot = None
+        self._snapshot_taken = 0.0
+        self._snapshot_lock = threading.Lock()
+        self._datacenters = None
+        self._transfer = None
+        self._transfer_lock = threading.Lock()
+
+    @property
+    def inventory(self):
+        if self._inventory is None:
+            self._inventory = Inventory(self.client.si)
+        return self._inventory
+
+    @property
+    def inventory_cache(self):
+        if self._inventory_cache is None:
+            self._inventory_cache = InventoryCache.for_client(self.client)
+        return self._inventory_cache
+
+    def connect(self):
         self.client.connect()
+        return self.inventory_cache
+
+    def close(self):
+        if self._fan_out:
+            self._fan_out.close()
+        with self._transfer_lock:
+            transfer, self._transfer = self._transfer, None
+        if transfer is not None:
+            transfer.close()
+        self.client.disconnect()
 
+    @traced()
     def create_datastore(self, datastore_name, capacity_gb, disk_path):
-        host = self.client._get_host_system()
+        host = self._get_host_system()
         try:
             datastore_spec = vim.host.DatastoreSystem.DatastoreSpec()
             datastore_spec.name = datastore_name
             datastore_spec.capacityKB = capacity_gb * 1024 * 1024  # Convert GB to KB
             datastore_spec.backing = vim.host.DatastoreSystem.LocalDatastoreBackingInfo(diskPath=disk_path)
             host.configManager.datastoreSystem.CreateDatastore(datastore_spec)
-            logger.info(f"Created datastore {datastore_name} with capacity {capacity_gb} GB at {disk_path}")
+            self.invalidate_snapshot()
+            logger.info("Created datastore %s with capacity %s GB at %s", datastore_name, capacity_gb, disk_path)
             return {"status": True, "message": f"Datastore {datastore_name} created with capacity {capacity_gb} GB at {disk_path}"}
         except Exception as e:
-            logger.error(f"Failed to create datastore {datastore_name}: {str(e)}")
+            logger.error("Failed to create datastore %s: %s", datastore_name, e)
             return {"status": False, "message": str(e)}
         # finally:
         #     self.client.disconnect()
 
+    @traced()
     def delete_datastore(self, datastore_name):
-        host = self.client._get_host_system()
+        host = self._get_host_system()
         try:
-            datastore = self._get_datastore_by_name(datastore_name)
+            # only a datastore this host mounts: another host may have one of the same name
+            datastore = next((datastore for datastore, name in self._host_datastores(host)
+                              if name == datastore_name), None)
             if datastore:
                 host.configManager.datastoreSystem.RemoveDatastore(datastore)
-                logger.info(f"Deleted datastore {datastore_name}")
+                self.invalidate_snapshot()
+                logger.info("Deleted datastore %s", datastore_name)
                 return {"status": True, "message": f"Datastore {datastore_name} deleted"}
             else:
-                logger.error(f"Datastore {datastore_name} not found")
+                logger.error("Datastore %s not found", datastore_name)
                 return {"status": False, "message": f"Datastore {datastore_name} not found"}
         except Exception as e:
-            logger.error(f"Failed to delete datastore {datastore_name}: {str(e)}")
+            logger.error("Failed to delete datastore %s: %s", datastore_name, e)
             return {"status": False, "message": str(e)}
         # finally:
         #     self.client.disconnect()
 
+    @traced()
     def list_datastores(self):
-        host = self.client._get_host_system()
+        # the datastores of the endpoint's first host, named from the snapshot rather than one Fetch each
         try:
-            datastores = host.datastore
-            datastore_list = [datastore.name for datastore in datastores]
-            logger.info(f"Datastores: {datastore_list}")
+            datastore_list = [name for _, name in self._host_datastores(self._get_host_system())]
+            logger.info("Datastores: %s", datastore_list)
             return {"status": True, "datastores": datastore_list}
         except Exception as e:
-            logger.error(f"Failed to list datastores: {str(e)}")
+            logger.error("Failed to list datastores: %s", e)
             return {"status": False, "message": str(e)}
         # finally:
         #     self.client.disconnect()
 
+    @traced()
+    def get_datastore_snapshot(self, refresh=False):
+        # capacity, free space, type, accessibility and VM count of every datastore; served from memory for
+        # snapshot_ttl seconds (datastores.snapshot_ttl) unless refresh is set or a create/delete invalidated it
+        try:
+            snapshot = self._get_snapshot(refresh)
+            logger.info("Datastore snapshot with %d datastores", len(snapshot))
+            return {"status": True, "data": snapshot}
+        except Exception as e:
+            logger.error("Failed to get datastore snapshot: %s", e)
+            return {"status": False, "message": str(e)}
+
+    @traced()
+    def pick_datastore(self, required_gb=0, datastore_type=None, refresh=False):
+        # the accessible, non-maintenance datastore with the most free space that still fits required_gb
+        try:
+            candidates = [record for record in self._get_snapshot(refresh)
+                          if record["accessible"] and record["maintenance_mode"] == 'normal'
+                          and record["free_gb"] >= required_gb
+                          and (datastore_type is None or record["type"] == datastore_type)]
+            if not candidates:
+                message = f"No datastore with {required_gb} GB free"
+                logger.error(message)
+                return {"status": False, "message": message}
+            best = max(candidates, key=lambda record: record["free_gb"])
+            logger.info("Picked datastore %s with %.1f GB free for %s GB", best["name"], best["free_gb"],
+                        required_gb)
+            return {"status": True, "data": best}
+        except Exception as e:
+            logger.error("Failed to pick a datastore: %s", e)
+            return {"status": False, "message": str(e)}
+
+    @traced()
+    def upload_files(self, transfers, verify=None, max_parallel=None):
+        # transfers: dicts with local_path, datastore and remote_path (relative to the datastore root);
+        # verify streams every upload back and compares SHA-256, defaulting to transfer.verify
+        verify = self._transfer_setting('verify', True) if verify is None else verify
+        return self._run_transfers(
+            "Upload", transfers, max_parallel,
+            lambda engine, item: engine.upload(item["local_path"], self._datacenter_for(item["datastore"]),
+                                               item["datastore"], item["remote_path"], verify))
+
+    @traced()
+    def download_files(self, transfers, max_parallel=None):
+        # transfers: dicts with datastore, remote_path, local_path and optionally the expected sha256
+        return self._run_transfers(
+            "Download", transfers, max_parallel,
+            lambda engine, item: engine.download(item["local_path"], self._datacenter_for(item["datastore"]),
+                                                 item["datastore"], item["remote_path"], item.get("sha256")))
+
+    @traced()
+    def distribute_files(self, local_paths, datastore_names, remote_dir='', verify=None, max_parallel=None):
+        # every local file to <remote_dir>/<basename> on every named datastore, e.g. staging an ISO or
+        # template set everywhere a test may place a VM
+        transfers = [{"local_path": path, "datastore": datastore,
+                      "remote_path": '/'.join(part for part in (remote_dir.strip('/'), os.path.basename(path)) if part)}
+                     for datastore in datastore_names for path in local_paths]
+        return self.upload_files(transfers, verify, max_parallel)
+
+    def invalidate_snapshot(self):
+        with self._snapshot_lock:
+            self._snapshot = None
+
+    @traced()
+    def create_datastore_on_hosts(self, datastore_name, capacity_gb, disk_path, hosts=None, max_workers=None):
+        return self._get_fan_out().run(
+            f"Create datastore {datastore_name}", hosts,
+            lambda controller: controller.create_datastore(datastore_name, capacity_gb, disk_path), max_workers)
+
+    @traced()
+    def delete_datastore_on_hosts(self, datastore_name, hosts=None, max_workers=None):
+        return self._get_fan_out().run(
+            f"Delete datastore {datastore_name}", hosts,
+            lambda controller: controller.delete_datastore(datastore_name), max_workers)
+
+    @traced()
+    def list_datastores_on_hosts(self, hosts=None, max_workers=None):
+        return self._get_fan_out().run("List datastores", hosts,
+                                       lambda controller: controller.list_datastores(), max_workers)
+
+    def _get_fan_out(self):
+        if self._fan_out is None:
+            self._fan_out = HostFanOut(self.client.config, lambda client: DatastoreController(
+                client=client, snapshot_ttl=self.snapshot_ttl))
+        return self._fan_out
+
+    def _get_snapshot(self, refresh=False):
+        # copies of the records, so callers cannot edit what later calls are served from
+        with self._snapshot_lock:
+            expired = time.monotonic() - self._snapshot_taken > self.snapshot_ttl
+            if self._snapshot is None or refresh or expired:
+                self._snapshot = {datastore._moId: _snapshot_record(props) for datastore, props in
+                                  self.inventory.iter_objects(vim.Datastore, SNAPSHOT_PROPERTIES)}
+                self._snapshot_taken = time.monotonic()
+            return [dict(record) for record in self._snapshot.values()]
+
+    def _host_datastores(self, host):
+        # [(datastore, name), ...] for what host mounts, named from the snapshot rather than one Fetch each
+        datastores = self.inventory.get_properties(host, ['datastore']).get('datastore') or []
+        self._get_snapshot()
+        with self._snapshot_lock:
+            known = dict(self._snapshot or {})
+        return [(datastore, known[datastore._moId]["name"] if datastore._moId in known else datastore.name)
+                for datastore in datastores]
+
+    def _run_transfers(self, operation, transfers, max_parallel, transfer):
+        max_parallel = max_parallel or self._transfer_setting('max_parallel', DEFAULT_MAX_PARALLEL)
+        engine = self._get_transfer(max_parallel)
+
+        def run(item):
+            describe = f"{item['datastore']}/{item['remote_path']}"
+            try:
+                outcome = transfer(engine, item)
+            except Exception as e:
+                logger.error("%s of %s failed: %s", operation, describe, e)
+                return {"name": describe, "status": False, "message": str(e), "bytes": 0}
+            logger.info("%s of %s: %d bytes in %.2fs", operation, describe, outcome["bytes"], outcome["elapsed"])
+            return dict(outcome, name=describe, status=True, message=f"{operation} of {describe} succeeded")
+
+        batch_start = time.monotonic()
+        results = engine.run([lambda item=item: run(item) for item in transfers], max_parallel)
+        elapsed = time.monotonic() - batch_start
+        succeeded = sum(1 for result in results if result["status"])
+        transferred = sum(result["bytes"] for result in results)
+        stats = {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "bytes": transferred,
+            "elapsed": elapsed,
+            "throughput_mb_per_second": transferred / MB / elapsed if elapsed > 0 else 0.0,
+        }
+        message = (f"{operation}: {succeeded}/{len(results)} files, {transferred / MB:.1f} MB "
+                   f"at {stats['throughput_mb_per_second']:.1f} MB/s")
+        logger.info(message)
+        return {"status": stats["failed"] == 0, "message": message, "data": {"results": results, "stats": stats}}
+
+    def _get_transfer(self, max_parallel):
+        # one engine per controller, so its workers' keep-alive connections serve every batch; replaced
+        # only when a batch asks for more parallelism than it has workers
+        with self._transfer_lock:
+            if self._transfer is not None and self._transfer.max_parallel < max_parallel:
+                self._transfer.close()
+                self._transfer = None
+            if self._transfer is None:
+                self._transfer = DatastoreTransfer.for_client(
+                    self.client,
+                    chunk_size=int(self._transfer_setting('chunk_size_mb', 4) * MB),
+                    part_size=int(self._transfer_setting('part_size_mb', 256) * MB),
+                    max_parallel=max_parallel)
+            else:
+                self._transfer.set_cookie(session_cookie(self.client))
+            return self._transfer
+
+    def _transfer_setting(self, key, default):
+        value = self.client.config.get(f'transfer.{key}')
+        return default if value is None else value
+
+    def _datacenter_for(self, datastore_name):
+        # the dcPath /folder wants; a standalone host only has ha-datacenter
+        if self.client.si.content.about.apiType == 'HostAgent':
+            return ESXI_DATACENTER
+        with self._snapshot_lock:
+            if self._datacenters is None:
+                self._datacenters = {datastore._moId: props.get('name')
+                                     for _, props in self.inventory.iter_objects(vim.Datacenter, ['name', 'datastore'])
+                                     for datastore in props.get('datastore') or []}
+        datastore = self._get_datastore_by_name(datastore_name)
+        if datastore is None or datastore._moId not in self._datacenters:
+            raise ValueError(f"Datastore {datastore_name} not found")
+        return self._datacenters[datastore._moId]
+
     def _get_datastore_by_name(self, datastore_name):
-        host = self.client._get_host_system()
-        datastores = host.datastore
-        for datastore in datastores:
-            if datastore.name == datastore_name:
-                return datastore
-        return None
+        return self.inventory_cache.get_datastore(datastore_name)
+
+    def _get_host_system(self):
+        hosts = self.inventory_cache.get_hosts()
+        return hosts[0] if hosts else self.client._get_host_system()
@@ -1,130 +1,472 @@
 # controllers/vm_controller.py
 
+import copy
+import functools
+import threading
+import time
+
 from pyVmomi import vim
 from core.vmware_client import VMwareClient
-from models.vm_model import VM
+from core import task_analytics
+from core.migration_planner import migration_limits
+from core.inventory import Inventory
+from core.inventory_cache import InventoryCache
+from core.task_waiter import TaskWaiter, DEFAULT_TASK_TIMEOUT
+from core.stats import summarize_latencies
+from core.instrumentation import traced, annotate
 from core.logger import logger
 
+DEFAULT_MAX_IN_FLIGHT = 8
+_BATCH_END = object()
+
+# full: CreateVM_Task with an empty disk layout; linked: CloneVM_Task on a delta disk over the template's
+# base snapshot; instant: InstantClone_Task from a running source VM, falling back to linked when not possible
+PROVISIONING_FULL = 'full'
+PROVISIONING_LINKED = 'linked'
+PROVISIONING_INSTANT = 'instant'
+BASE_SNAPSHOT_NAME = 'pyvmomi-linked-clone-base'
+INSTANT_CLONE_MIN_API_VERSION = (6, 7)
+CLONE_SOURCE_PROPERTIES = ['config.template', 'config.hardware.numCPU', 'config.hardware.memoryMB',
+                           'config.hardware.device', 'runtime.powerState', 'runtime.host', 'parent',
+                           'snapshot.currentSnapshot']
+# fields iter_vms/get_vm_list can return, mapped to their VirtualMachine property paths
+VM_LIST_PROPERTIES = {
+    'name': 'name',
+    'power_state': 'runtime.powerState',
+    'host': 'runtime.host',
+    'datastore': 'datastore',
+    'template': 'config.template',
+    'cpu': 'config.hardware.numCPU',
+    'memory': 'config.hardware.memoryMB',
+}
+VM_DETAIL_PROPERTIES = ['name', 'config.hardware.numCPU', 'config.hardware.memoryMB', 'datastore', 'network']
+
+
+def _batch_item(name, status, message, latency, task_result=None):
+    item = {"name": name, "status": status, "message": message, "latency": latency}
+    if task_result is not None:
+        # vCenter-side split of the latency: waiting in its task queue vs actually running
+        item["queue_time"] = task_result.queued_seconds
+        item["run_time"] = task_result.run_seconds
+    return item
+
 
 class VMController:
-    def __init__(self):
-        self.client = VMwareClient()
+    def __init__(self, max_in_flight=None, task_timeout=DEFAULT_TASK_TIMEOUT, provisioning=None, client=None):
+        # nothing talks to vCenter until the first operation: the session, inventory cache and task
+        # waiter are created on first use (or by connect())
+        self.client = client or VMwareClient()
+        self._inventory = None
+        self._inventory_cache = None
+        self._task_waiter = None
+        self.max_in_flight = (max_in_flight or self.client.config.get('scale_operations.max_in_flight')
+                              or DEFAULT_MAX_IN_FLIGHT)
+        self.task_timeout = task_timeout
+        self.provisioning = (provisioning or self.client.config.get('scale_operations.provisioning')
+                             or PROVISIONING_FULL)
+        self._clone_sources = {}
+        self._clone_sources_lock = threading.Lock()
+
+    @property
+    def inventory(self):
+        if self._inventory is None:
+            self._inventory = Inventory(self.client.si)
+        return self._inventory
+
+    @property
+    def inventory_cache(self):
+        if self._inventory_cache is None:
+            self._inventory_cache = InventoryCache.for_client(self.client)
+        return self._inventory_cache
+
+    @property
+    def task_waiter(self):
+        if self._task_waiter is None:
+            self._task_waiter = TaskWaiter.for_client(self.client)
+        return self._task_waiter
+
+    def connect(self):
+        # log in and sync the shared caches now rather than on the first operation
         self.client.connect()
+        return self.inventory_cache, self.task_waiter
 
-    def create_vm(self, name, template_name, datastore_name, cpu, memory, network):
-        try:
-            content = self.client.si.RetrieveContent()
-            template = self._get_template_by_name(content, template_name)
-            datastore = self._get_datastore_by_name(content, datastore_name)
-            if not template or not datastore:
-                message = "Template or datastore not found"
-                logger.error(message)
-                return {"status": False, "message": message}
+    def close(self):
+        self.client.disconnect()
 
-            vm_spec = vim.vm.ConfigSpec(
-                name=name,
-                memoryMB=memory,
-                numCPUs=cpu,
-                guestId=template.config.guestId,
-                files=vim.vm.FileInfo(vmPathName=f"[{datastore_name}]")
-            )
-
-            network_spec = self._get_network_spec(network)
-            if network_spec:
-                vm_spec.deviceChange = [network_spec]
-
-            resource_pool = self._get_resource_pool(content)
-            if resource_pool:
-                task = resource_pool.CreateVM_Task(config=vm_spec, pool=resource_pool, host=template.runtime.host)
-                self._wait_for_task(task)
-                logger.info(f"Created VM {name}")
-                return {"status": True, "message": f"VM {name} created"}
-            else:
-                message = "Resource pool not found"
-                logger.error(message)
-                return {"status": False, "message": message}
+    @traced()
+    def create_vm(self, name, template_name, datastore_name, cpu, memory, network, provisioning=None):
+        try:
+            task = self._submit_create_vm(name, template_name, datastore_name, cpu, memory, network, provisioning)
+            self._wait_for_task(task)
+            logger.info("Created VM %s", name)
+            return {"status": True, "message": f"VM {name} created"}
 
+        except LookupError as e:
+            logger.error(str(e))
+            return {"status": False, "message": str(e)}
         except Exception as e:
-            logger.error(f"Failed to create VM {name}: {str(e)}")
+            logger.error("Failed to create VM %s: %s", name, e)
             return {"status": False, "message": str(e)}
 
+    @traced()
     def edit_vm(self, vm_name, cpu=None, memory=None):
         try:
-            vm = self._get_vm_by_name(vm_name)
-            if not vm:
-                message = f"VM {vm_name} not found"
-                logger.error(message)
-                return {"status": False, "message": message}
-
-            config_spec = vim.vm.ConfigSpec()
-            if cpu:
-                config_spec.numCPUs = cpu
-            if memory:
-                config_spec.memoryMB = memory
-
-            task = vm.Reconfigure(config_spec)
+            task = self._submit_edit_vm(vm_name, cpu, memory)
             self._wait_for_task(task)
-            logger.info(f"Edited VM {vm_name}")
+            logger.info("Edited VM %s", vm_name)
             return {"status": True, "message": f"VM {vm_name} edited"}
 
+        except LookupError as e:
+            logger.error(str(e))
+            return {"status": False, "message": str(e)}
         except Exception as e:
-            logger.error(f"Failed to edit VM {vm_name}: {str(e)}")
+            logger.error("Failed to edit VM %s: %s", vm_name, e)
             return {"status": False, "message": str(e)}
 
+    @traced()
     def delete_vm(self, vm_name):
         try:
-            vm = self._get_vm_by_name(vm_name)
-            if not vm:
-                message = f"VM {vm_name} not found"
-                logger.error(message)
-                return {"status": False, "message": message}
-
-            task = vm.Destroy_Task()
+            task = self._submit_delete_vm(vm_name)
             self._wait_for_task(task)
-            logger.info(f"Deleted VM {vm_name}")
+            logger.info("Deleted VM %s", vm_name)
             return {"status": True, "message": f"VM {vm_name} deleted"}
 
+        except LookupError as e:
+            logger.error(str(e))
+            return {"status": False, "message": str(e)}
         except Exception as e:
-            logger.error(f"Failed to delete VM {vm_name}: {str(e)}")
+            logger.error("Failed to delete VM %s: %s", vm_name, e)
             return {"status": False, "message": str(e)}
 
+    @traced()
     def migrate_vm(self, vm_name, host_name):
         try:
-            vm = self._get_vm_by_name(vm_name)
-            if not vm:
-                message = f"VM {vm_name} not found"
-                logger.error(message)
-                return {"status": False, "message": message}
-
-            host = self._get_host_by_name(host_name)
-            if not host:
-                message = f"Host {host_name} not found"
-                logger.error(message)
-                return {"status": False, "message": message}
-
-            task = vm.Migrate(host=host, priority=vim.vm.MigratePriority.defaultPriority)
+            task = self._submit_migrate_vm(vm_name, host_name)
             self._wait_for_task(task)
-            logger.info(f"Migrated VM {vm_name} to host {host_name}")
+            logger.info("Migrated VM %s to host %s", vm_name, host_name)
             return {"status": True, "message": f"VM {vm_name} migrated to host {host_name}"}
 
+        except LookupError as e:
+            logger.error(str(e))
+            return {"status": False, "message": str(e)}
         except Exception as e:
-            logger.error(f"Failed to migrate VM {vm_name}: {str(e)}")
+            logger.error("Failed to migrate VM %s: %s", vm_name, e)
             return {"status": False, "message": str(e)}
 
-    def get_vm_list(self):
+    @traced()
+    def create_vms(self, vm_specs, max_in_flight=None):
+        # each spec holds the create_vm arguments: name, template_name, datastore_name, cpu, memory, network
+        # and optionally provisioning
+        return self._run_batch("create", vm_specs, lambda spec: spec["name"],
+                               lambda spec: self._submit_create_vm(**spec), max_in_flight)
+
+    @traced()
+    def edit_vms(self, vm_edits, max_in_flight=None):
+        # each edit holds the edit_vm arguments: vm_name and optionally cpu, memory
+        return self._run_batch("edit", vm_edits, lambda edit: edit["vm_name"],
+                               lambda edit: self._submit_edit_vm(**edit), max_in_flight)
+
+    @traced()
+    def delete_vms(self, vm_names, max_in_flight=None):
+        return self._run_batch("delete", vm_names, lambda vm_name: vm_name,
+                               self._submit_delete_vm, max_in_flight)
+
+    @traced()
+    def migrate_vms(self, migrations, max_in_flight=None, per_host_limit=None, per_cluster_limit=None):
+        # each migration holds the migrate_vm arguments vm_name, host_name and optionally source_host and
+        # cluster (other keys are ignored, so migration plans pass straight through); per_host_limit caps the
+        # migrations running to or from one host, per_cluster_limit those within one cluster
+        limits = (functools.partial(migration_limits, per_host_limit=per_host_limit,
+                                    per_cluster_limit=per_cluster_limit)
+                  if per_host_limit or per_cluster_limit else None)
+        pools = {}
+        return self._run_batch("migrate", migrations, lambda migration: migration["vm_name"],
+                               lambda migration: self._submit_migrate_vm(migration["vm_name"], migration["host_name"],
+                                                                         pools), max_in_flight, limits)
+
+    def _submit_create_vm(self, name, template_name, datastore_name, cpu, memory, network, provisioning=None):
+        mode = provisioning or self.provisioning
+        if mode in (PROVISIONING_LINKED, PROVISIONING_INSTANT):
+            return self._submit_clone_vm(name, template_name, datastore_name, cpu, memory, network, mode)
+        if mode != PROVISIONING_FULL:
+            raise ValueError(f"Unknown provisioning mode {mode}")
+
+        template, template_props = self._get_template_by_name(template_name,
+                                                              ['config.guestId', 'runtime.host', 'parent'])
+        datastore = self._get_datastore_by_name(datastore_name)
+        if not template or not datastore:
+            raise LookupError("Template or datastore not found")
+
+        vm_spec = vim.vm.ConfigSpec(
+            name=name,
+            memoryMB=memory,
+            numCPUs=cpu,
+            guestId=template_props.get('config.guestId'),
+            files=vim.vm.FileInfo(vmPathName=f"[{datastore_name}]")
+        )
+
+        network_spec = self._get_network_spec(network)
+        if network_spec:
+            vm_spec.deviceChange = [network_spec]
+
+        template_host = template_props.get('runtime.host')
+        resource_pool = self._get_resource_pool(template_host)
+        if not resource_pool:
+            raise LookupError("Resource pool not found")
+        # CreateVM_Task lives on Folder; the new VM goes into the template's folder
+        return template_props['parent'].CreateVM_Task(config=vm_spec, pool=resource_pool, host=template_host)
+
+    def _submit_clone_vm(self, name, template_name, datastore_name, cpu, memory, network, mode):
+        source, source_props = self._get_clone_source(template_name)
+        datastore = self._get_datastore_by_name(datastore_name)
+        if not source or not datastore:
+            raise LookupError("Template or datastore not found")
+
+        nic_spec = self._get_clone_network_spec(source_props.get('config.hardware.device') or [], network)
+        if mode == PROVISIONING_INSTANT:
+            reason = self._instant_clone_blocker(source_props, cpu, memory)
+            if reason is None:
+                # instant clones inherit CPU and memory from the running source; only placement and NICs change
+                location = vim.vm.RelocateSpec(folder=source_props.get('parent'), datastore=datastore,
+                                               deviceChange=[nic_spec] if nic_spec else None)
+                return source.InstantClone_Task(vim.vm.InstantCloneSpec(name=name, location=location))
+            logger.info("Instant clone of %s not possible (%s), using a linked clone", template_name, reason)
+
+        snapshot = self._ensure_base_snapshot(source, source_props)
+        resource_pool = self._get_resource_pool(source_props.get('runtime.host'))
+        if not resource_pool:
+            raise LookupError("Resource pool not found")
+        location = vim.vm.RelocateSpec(pool=resource_pool, datastore=datastore,
+                                       diskMoveType='createNewChildDiskBacking')
+        # customization rides along in the clone spec instead of a reconfigure after the clone
+        config = vim.vm.ConfigSpec(numCPUs=cpu, memoryMB=memory, deviceChange=[nic_spec] if nic_spec else None)
+        clone_spec = vim.vm.CloneSpec(location=location, snapshot=snapshot, template=False, powerOn=False,
+                                      config=config)
+        return source.CloneVM_Task(folder=source_props.get('parent'), name=name, spec=clone_spec)
+
+    def _get_clone_source(self, template_name):
+        # source properties are read once per controller and shared by every clone of a batch
+        source = self._get_template_by_name(template_name)[0] or self._get_vm_by_name(template_name)
+        if source is None:
+            return None, {}
+        with self._clone_sources_lock:
+            props = self._clone_sources.get(source._moId)
+            if props is None:
+                props = self._clone_sources[source._moId] = self.inventory.get_properties(
+                    source, CLONE_SOURCE_PROPERTIES)
+        return source, props
+
+    def _ensure_base_snapshot(self, source, source_props):
+        with self._clone_sources_lock:
+            snapshot = source_props.get('snapshot.currentSnapshot')
+            if snapshot is not None:
+                return snapshot
+            # templates cannot be snapshotted; flip to a VM for the snapshot and back
+            is_template = source_props.get('config.template')
+            if is_template:
+                host = source_props.get('runtime.host')
+                source.MarkAsVirtualMachine(pool=self._get_resource_pool(host), host=host)
+            try:
+                task = source.CreateSnapshot_Task(name=BASE_SNAPSHOT_NAME, description="Base for linked clones",
+                                                  memory=False, quiesce=False)
+                snapshot = self._wait_for_task(task).result
+            finally:
+                if is_template:
+                    source.MarkAsTemplate()
+            source_props['snapshot.currentSnapshot'] = snapshot
+            logger.info("Created base snapshot %s for linked clones", BASE_SNAPSHOT_NAME)
+            return snapshot
+
+    def _instant_clone_blocker(self, source_props, cpu, memory):
+        api_version = tuple(int(part) for part in self.inventory.content.about.apiVersion.split('.')[:2])
+        if api_version < INSTANT_CLONE_MIN_API_VERSION:
+            return f"API version {self.inventory.content.about.apiVersion}"
+        if source_props.get('config.template'):
+            return "source is a template"
+        if source_props.get('runtime.powerState') != vim.VirtualMachinePowerState.poweredOn:
+            return "source is not powered on"
+        if (cpu and cpu != source_props.get('config.hardware.numCPU')) or \
+                (memory and memory != source_props.get('config.hardware.memoryMB')):
+            return "CPU or memory differs from the source"
+        return None
+
+    def _get_clone_network_spec(self, source_devices, network_name):
+        # repoint the source's first NIC rather than adding a second one
+        nic = next((device for device in source_devices if isinstance(device, vim.vm.device.VirtualEthernetCard)),
+                   None)
+        if nic is None:
+            return self._get_network_spec(network_name)
+        network = self._get_network_by_name(network_name)
+        if not network:
+            return None
+        nic = copy.copy(nic)
+        nic.backing = vim.vm.device.VirtualEthernetCard.NetworkBackingInfo(network=network, deviceName=network_name)
+        return vim.vm.device.VirtualDeviceSpec(operation=vim.vm.device.VirtualDeviceSpec.Operation.edit, device=nic)
+
+    def _submit_edit_vm(self, vm_name, cpu=None, memory=None):
+        vm = self._get_vm_by_name(vm_name)
+        if not vm:
+            raise LookupError(f"VM {vm_name} not found")
+
+        config_spec = vim.vm.ConfigSpec()
+        if cpu:
+            config_spec.numCPUs = cpu
+        if memory:
+            config_spec.memoryMB = memory
+        return vm.Reconfigure(config_spec)
+
+    def _submit_delete_vm(self, vm_name):
+        vm = self._get_vm_by_name(vm_name)
+        if not vm:
+            raise LookupError(f"VM {vm_name} not found")
+        return vm.Destroy_Task()
+
+    def _submit_migrate_vm(self, vm_name, host_name, pools=None):
+        # RelocateVM_Task rather than the deprecated MigrateVM_Task, into the target's resource pool;
+        # pools caches that pool per target host across a batch
+        vm = self._get_vm_by_name(vm_name)
+        if not vm:
+            raise LookupError(f"VM {vm_name} not found")
+
+        host = self._get_host_by_name(host_name)
+        if not host:
+            raise LookupError(f"Host {host_name} not found")
+        pool = pools.get(host_name) if pools is not None else None
+        if pool is None:
+            pool = self._get_resource_pool(host)
+            if pools is not None:
+                pools[host_name] = pool
+        spec = vim.vm.RelocateSpec(host=host, pool=pool)
+        return vm.RelocateVM_Task(spec=spec, priority=vim.VirtualMachine.MovePriority.defaultPriority)
+
+    def _run_batch(self, operation, items, describe, submit, max_in_flight=None, limits=None):
+        # keeps up to max_in_flight tasks running and tops the window up as tasks finish;
+        # a failed submission or task is recorded and the rest of the batch carries on.
+        # max_in_flight may also be an AdaptiveWindow, whose limit follows vCenter's task queueing.
+        # limits, when given, maps an item to (key, limit) pairs, e.g. (('host', name), 4): an item is only
+        # submitted while every one of its keys has fewer than limit tasks running, later items may overtake it
+        window = max_in_flight if hasattr(max_in_flight, 'observe') else None
+        limit = window.limit if window else max_in_flight or self.max_in_flight
+        batch_start = time.monotonic()
+        results, in_flight = [], {}
+        pending = iter(items)
+        held, in_use, acquired = [], {}, {}
+        exhausted = False
+        while True:
+            if window:
+                limit = window.limit
+            while not exhausted and len(in_flight) < limit:
+                item = self._next_batch_item(pending, held, in_use, limits)
+                if item is _BATCH_END:
+                    exhausted = not held
+                    break
+                submitted_at = time.monotonic()
+                try:
+                    task = submit(item)
+                except Exception as e:
+                    logger.error("Failed to submit %s for %s: %s", operation, describe(item), e)
+                    results.append(_batch_item(describe(item), False, str(e), time.monotonic() - submitted_at))
+                    continue
+                self.task_waiter.watch([task])
+                in_flight[task._moId] = (item, task, submitted_at)
+                if limits:
+                    keys = acquired[task._moId] = [key for key, _ in limits(item)]
+                    for key in keys:
+                        in_use[key] = in_use.get(key, 0) + 1
+            if not in_flight:
+                break
+
+            finished = self.task_waiter.wait_any([task for _, task, _ in in_flight.values()], self.task_timeout)
+            for key in [task_result.key for task_result in finished] if finished else list(in_flight):
+                for resource in acquired.pop(key, ()):
+                    in_use[resource] -= 1
+            if not finished:
+                timed_out = list(in_flight.values())
+                in_flight.clear()
+                self.task_waiter.unwatch([task for _, task, _ in timed_out])
+                for item, task, submitted_at in timed_out:
+                    logger.error("Timed out waiting for %s of %s", operation, describe(item))
+                    results.append(_batch_item(describe(item), False, f"Timed out waiting for task {task._moId}",
+                                               time.monotonic() - submitted_at))
+                continue
+            for task_result in finished:
+                item, _, submitted_at = in_flight.pop(task_result.key)
+                latency = task_result.completed_at - submitted_at
+                if window:
+                    window.observe(task_result)
+                if task_result.succeeded:
+                    results.append(_batch_item(describe(item), True, f"{operation} of {describe(item)} succeeded",
+                                               latency, task_result))
+                else:
+                    message = getattr(task_result.error, 'msg', None) or str(task_result.error)
+                    logger.error("Failed to %s %s: %s", operation, describe(item), message)
+                    results.append(_batch_item(describe(item), False, message, latency, task_result))
+
+        elapsed = time.monotonic() - batch_start
+        succeeded = sum(1 for result in results if result["status"])
+        stats = {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "elapsed": elapsed,
+            "throughput": len(results) / elapsed if elapsed > 0 else 0.0,
+            "latency": summarize_latencies([result["latency"] for result in results]),
+            "max_in_flight": limit,
+        }
+        message = f"{succeeded}/{len(results)} {operation} operations succeeded in {elapsed:.1f}s"
+        logger.info(message)
+        return {"status": succeeded == len(results), "message": message, "data": {"results": results, "stats": stats}}
+
+    def _next_batch_item(self, pending, held, in_use, limits):
+        # without limits simply the next item; with them the first held, then new, item with free slots
+        if limits is None:
+            return next(pending, _BATCH_END)
+
+        def admissible(item):
+            return all(in_use.get(key, 0) < max(1, key_limit) for key, key_limit in limits(item))
+
+        for index, item in enumerate(held):
+            if admissible(item):
+                return held.pop(index)
+        for item in pending:
+            if admissible(item):
+                return item
+            held.append(item)
+        return _BATCH_END
+
+    def iter_vms(self, properties=('name',), predicate=None, page_size=None):
+        # streams one record per VM (nested folders and vApps included) from paged RetrievePropertiesEx
+        # results, so memory stays bounded by the page size; properties are VM_LIST_PROPERTIES keys and
+        # predicate, when given, is called with each record to decide whether it is yielded
+        fields = ['name'] + [field for field in properties if field != 'name']
+        unknown = [field for field in fields if field not in VM_LIST_PROPERTIES]
+        if unknown:
+            raise ValueError(f"Unknown VM list properties: {', '.join(unknown)}")
+        paths = [VM_LIST_PROPERTIES[field] for field in fields]
+        for vm, props in self.inventory.iter_objects(vim.VirtualMachine, paths, page_size=page_size):
+            record = {"moid": vm._moId}
+            for field, path in zip(fields, paths):
+                record[field] = self._list_value(props.get(path))
+            if predicate is None or predicate(record):
+                yield record
+
+    @traced()
+    def get_vm_list(self, properties=None, predicate=None, page_size=None):
+        # plain list of names by default; with properties, the iter_vms records
         try:
-            content = self.client.si.RetrieveContent()
-            vm_list = []
-            for datacenter in content.rootFolder.childEntity:
-                for vm in datacenter.vmFolder.childEntity:
-                    vm_list.append(vm.name)
-            logger.info("Retrieved VM list")
+            records = self.iter_vms(properties or ('name',), predicate, page_size)
+            if properties is None:
+                vm_list = [record["name"] for record in records]
+            else:
+                vm_list = list(records)
+            logger.info("Retrieved VM list (%d VMs)", len(vm_list))
             return {"status": True, "data": vm_list}
 
         except Exception as e:
-            logger.error(f"Failed to get VM list: {str(e)}")
+            logger.error("Failed to get VM list: %s", e)
             return {"status": False, "message": str(e)}
 
+    @traced()
     def get_vm_details(self, vm_name):
         try:
             vm = self._get_vm_by_name(vm_name)
@@ -133,60 +475,77 @@ class VMController:
                 logger.error(message)
                 return {"status": False, "message": message}
 
+            # one retrieval; datastore and network references are named from the inventory cache
+            props = self.inventory.get_properties(vm, VM_DETAIL_PROPERTIES)
+            datastores = self._list_value(props.get('datastore')) or []
             details = {
-                "name": vm.name,
-                "cpu": vm.config.hardware.numCPU,
-                "memory": vm.config.hardware.memoryMB,
-                "datastore": vm.datastore[0].name if vm.datastore else None,
-                "network": [net.name for net in vm.network]
+                "name": props.get('name'),
+                "cpu": props.get('config.hardware.numCPU'),
+                "memory": props.get('config.hardware.memoryMB'),
+                "datastore": datastores[0] if datastores else None,
+                "network": self._list_value(props.get('network')) or []
             }
-            logger.info(f"Retrieved details for VM {vm_name}")
+            logger.info("Retrieved details for VM %s", vm_name)
             return {"status": True, "data": details}
 
         except Exception as e:
-            logger.error(f"Failed to get VM details: {str(e)}")
+            logger.error("Failed to get VM details: %s", e)
             return {"status": False, "message": str(e)}
 
-    def _get_template_by_name(self, content, template_name):
-        for datacenter in content.rootFolder.childEntity:
-            for vm in datacenter.vmFolder.childEntity:
-                if vm.name == template_name and vm.config.template:
-                    return vm
-        return None
+    @traced()
+    def get_task_analytics(self, include_events=True):
+        # client overhead / vCenter queueing / execution split of the tasks submitted so far, per *_Task
+        # method (task_analytics.enabled must be on); include_events adds related event types per operation
+        if not task_analytics.is_enabled():
+            return {"status": False, "message": "Task analytics is disabled, set task_analytics.enabled"}
+        try:
+            summary = task_analytics.summarize(self.client.si if include_events else None)
+            logger.info("Task analytics for %d operation types", len(summary["operations"]))
+            return {"status": True, "data": summary}
+        except Exception as e:
+            logger.error("Failed to get task analytics: %s", e)
+            return {"status": False, "message": str(e)}
 
-    def _get_datastore_by_name(self, content, datastore_name):
-        for datacenter in content.rootFolder.childEntity:
-            for datastore in datacenter.datastoreFolder.childEntity:
-                if datastore.name == datastore_name:
-                    return datastore
+    def _get_template_by_name(self, template_name, properties=()):
+        template = self.inventory_cache.get_template(template_name)
+        if template is None or not properties:
+            return template, {}
+        return template, self.inventory.get_properties(template, properties)
+
+    def _get_datastore_by_name(self, datastore_name):
+        return self.inventory_cache.get_datastore(datastore_name)
+
+    def _get_resource_pool(self, host=None):
+        # prefer the pool of the compute resource owning the given host, else the first one found
+        if host is not None:
+            compute_resource = self.inventory.get_properties(host, ['parent']).get('parent')
+            if compute_resource is not None:
+                pool = self.inventory.get_properties(compute_resource, ['resourcePool']).get('resourcePool')
+                if pool is not None:
+                    return pool
+        for _, props in self.inventory.iter_objects(vim.ComputeResource, ['resourcePool']):
+            if props.get('resourcePool') is not None:
+                return props['resourcePool']
         return None
 
-    def _get_resource_pool(self, content):
-        for datacenter in content.rootFolder.childEntity:
-            for cluster in datacenter.hostFolder.childEntity:
-                return cluster.resourcePool
-        return None
+    def _list_value(self, value):
+        # MoRefs become names from the inventory cache (no round trip), enums plain strings
+        if isinstance(value, vim.ManagedEntity):
+            return self.inventory_cache.get_name(value) or value._moId
+        if isinstance(value, list):
+            return [self._list_value(item) for item in value]
+        if isinstance(value, str):
+            return str(value)
+        return value
 
     def _get_vm_by_name(self, vm_name):
-        content = self.client.si.RetrieveContent()
-        for datacenter in content.rootFolder.childEntity:
-            for vm in datacenter.vmFolder.childEntity:
-                if vm.name == vm_name:
-                    return vm
-        return None
+        return self.inventory_cache.get_vm(vm_name)
 
     def _get_host_by_name(self, host_name):
-        content = self.client.si.RetrieveContent()
-        for datacenter in content.rootFolder.childEntity:
-            for cluster in datacenter.hostFolder.childEntity:
-                for host in cluster.host:
-                    if host.name == host_name:
-                        return host
-        return None
+        return self.inventory_cache.get_host(host_name)
 
     def _get_network_spec(self, network_name):
-        content = self.client.si.RetrieveContent()
-        network = self._get_network_by_name(content, network_name)
+        network = self._get_network_by_name(network_name)
         if not network:
             return None
 
@@ -197,20 +556,17 @@ class VMController:
         nic_spec.device.deviceInfo = vim.Description()
         nic_spec.device.backing = vim.vm.device.VirtualEthernetCard.NetworkBackingInfo()
         nic_spec.device.backing.network = network
-        nic_spec.device.backing.deviceName = network.name
+        nic_spec.device.backing.deviceName = network_name
         nic_spec.device.connectable = vim.vm.device.VirtualDevice.ConnectInfo()
         nic_spec.device.connectable.connected = True
         nic_spec.device.connectable.startConnected = True
 
         return nic_spec
 
-    def _get_network_by_name(self, content, network_name):
-        for datacenter in content.rootFolder.childEntity:
-            for network in datacenter.network:
-                if network.name == network_name:
-                    return network
-        return None
+    def _get_network_by_name(self, network_name):
+        return self.inventory_cache.get_network(network_name)
 
-    def _wait_for_task(self, task):
-        while task.info.state not in [vim.TaskInfo.State.success, vim.TaskInfo.State.error]:
-            continue
+    def _wait_for_task(self, task, on_progress=None):
+        # raises TaskError/TaskTimeout, which the calling operation reports as a failed result
+        annotate(task=task._moId)
+        return self.task_waiter.wait_one(task, self.task_timeout, on_progress)
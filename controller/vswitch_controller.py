@@ -1,73 +1,255 @@
 # controllers/vswitch_controller.py
 
+import copy
+
 from pyVmomi import vim
 from core.vmware_client import VMwareClient
+from core.inventory_cache import InventoryCache
+from core.host_fanout import HostFanOut
+from core.instrumentation import traced
 from core.logger import logger
 
+DEFAULT_NUM_PORTS = 128
+# standard switches and port groups an apply with prune=True never removes
+PROTECTED_VSWITCHES = ('vSwitch0',)
+PROTECTED_PORTGROUPS = ('Management Network',)
+
+
+def _change(kind, operation, name, fields=None):
+    return {"type": kind, "operation": operation, "name": name, "fields": fields or {}}
+
+
+def _uplinks(spec):
+    bridge = spec.bridge if spec else None
+    return sorted(bridge.nicDevice) if isinstance(bridge, vim.host.VirtualSwitch.BondBridge) else []
+
 
 class VSwitchController:
-    def __init__(self, connection_type='esxi'):
-        self.client = VMwareClient(connection_type)
+    def __init__(self, connection_type='esxi', client=None):
+        # connects on first use, see inventory_cache
+        self.client = client or VMwareClient(connection_type)
+        self._inventory_cache = None
+        self._fan_out = None
+
+    @property
+    def inventory_cache(self):
+        if self._inventory_cache is None:
+            self._inventory_cache = InventoryCache.for_client(self.client)
+        return self._inventory_cache
+
+    def connect(self):
         self.client.connect()
+        return self.inventory_cache
 
+    def close(self):
+        if self._fan_out:
+            self._fan_out.close()
+        self.client.disconnect()
+
+    @traced()
     def create_vswitch(self, vswitch_name, num_ports, uplink_portgroup):
-        host = self.client._get_host_system()
+        # the switch and its uplink port group, when given, are added in one UpdateNetworkConfig call
+        host = self._get_host_system()
         try:
-            vss = vim.host.VirtualSwitch.Specification()
-            vss.numPorts = num_ports
-            host.configManager.networkSystem.AddVirtualSwitch(vswitch_name, vss)
-            logger.info(f"Created virtual switch {vswitch_name} with {num_ports} ports")
+            config = vim.host.NetworkConfig(vswitch=[vim.host.VirtualSwitch.Config(
+                changeOperation='add', name=vswitch_name,
+                spec=vim.host.VirtualSwitch.Specification(numPorts=num_ports))])
+            if uplink_portgroup:
+                config.portgroup = [vim.host.PortGroup.Config(changeOperation='add', spec=self._portgroup_spec(
+                    None, {"name": uplink_portgroup, "vswitch": vswitch_name}))]
+            host.configManager.networkSystem.UpdateNetworkConfig(config, 'modify')
+            logger.info("Created virtual switch %s with %s ports", vswitch_name, num_ports)
             return {"status": True, "message": f"Virtual switch {vswitch_name} created with {num_ports} ports"}
         except Exception as e:
-            logger.error(f"Failed to create virtual switch {vswitch_name}: {str(e)}")
+            logger.error("Failed to create virtual switch %s: %s", vswitch_name, e)
             return {"status": False, "message": str(e)}
         # finally:
         #     self.client.disconnect()
 
+    @traced()
     def delete_vswitch(self, vswitch_name):
         try:
-            host = self.client._get_host_system()
+            host = self._get_host_system()
             if host:
                 network_system = host.configManager.networkSystem
                 vswitch = self._get_vswitch_by_name(network_system, vswitch_name)
                 if vswitch:
                     network_system.RemoveVirtualSwitch(vswitch_name)
-                    logger.info(f"Deleted vSwitch {vswitch_name} on host {host.name}")
+                    logger.info("Deleted vSwitch %s on host %s", vswitch_name, host.name)
                     return {"status": True, "message": f"vSwitch {vswitch_name} deleted"}
                 else:
-                    logger.error(f"vSwitch {vswitch_name} not found")
+                    logger.error("vSwitch %s not found", vswitch_name)
                     return {"status": False, "message": "vSwitch not found"}
             else:
-                logger.error(f"Host {host.name} not found")
+                logger.error("Host %s not found", host.name)
                 return {"status": False, "message": "Host not found"}
         except Exception as e:
-            logger.error(f"Failed to delete vSwitch {vswitch_name}: {str(e)}")
+            logger.error("Failed to delete vSwitch %s: %s", vswitch_name, e)
             return {"status": False, "message": str(e)}
 
-    def update_vswitch(self, vswitch_name, num_ports):
+    @traced()
+    def update_vswitch(self, vswitch_name, num_ports=None, uplink_portgroup=None):
         try:
-            host = self.client._get_host_system()
+            host = self._get_host_system()
             if host:
                 network_system = host.configManager.networkSystem
-                vswitch = self._get_vswitch_by_name(network_system, vswitch_name)
-                if vswitch:
-                    vswitch_spec = vim.host.VirtualSwitch.Specification()
-                    vswitch_spec.numPorts = num_ports
-                    network_system.UpdateVirtualSwitch(vswitch_name, vswitch_spec)
-                    logger.info(f"Updated vSwitch {vswitch_name} on host {host.name}")
-                    return {"status": True, "message": f"vSwitch {vswitch_name} updated"}
-                else:
-                    logger.error(f"vSwitch {vswitch_name} not found")
+                network_info = network_system.networkInfo
+                if not any(vswitch.name == vswitch_name for vswitch in network_info.vswitch):
+                    logger.error("vSwitch %s not found", vswitch_name)
                     return {"status": False, "message": "vSwitch not found"}
+                desired = {"vswitches": [{"name": vswitch_name, "num_ports": num_ports}], "portgroups": []}
+                if uplink_portgroup:
+                    desired["portgroups"].append({"name": uplink_portgroup, "vswitch": vswitch_name})
+                config, _ = self._plan_network_config(network_info, desired, prune=False)
+                if config.vswitch or config.portgroup:
+                    network_system.UpdateNetworkConfig(config, 'modify')
+                logger.info("Updated vSwitch %s on host %s", vswitch_name, host.name)
+                return {"status": True, "message": f"vSwitch {vswitch_name} updated"}
             else:
-                logger.error(f"Host {host.name} not found")
+                logger.error("Host %s not found", host.name)
                 return {"status": False, "message": "Host not found"}
         except Exception as e:
-            logger.error(f"Failed to update vSwitch {vswitch_name}: {str(e)}")
+            logger.error("Failed to update vSwitch %s: %s", vswitch_name, e)
             return {"status": False, "message": str(e)}
 
+    @traced()
+    def apply_network_config(self, desired, prune=False, dry_run=False):
+        # desired state for the host's standard networking:
+        #   {"vswitches": [{"name", "num_ports", "mtu", "uplinks": ["vmnic1", ...]}],
+        #    "portgroups": [{"name", "vswitch", "vlan"}]}
+        # Omitted fields keep their current value. It is diffed against a single networkInfo read and every
+        # change goes out in one UpdateNetworkConfig(modify) transaction; prune=True also removes switches and
+        # port groups missing from desired (except PROTECTED_*). dry_run returns the diff without applying it.
+        try:
+            host = self._get_host_system()
+            network_system = host.configManager.networkSystem
+            config, changes = self._plan_network_config(network_system.networkInfo, desired, prune)
+            if not changes:
+                message = f"Network configuration of {host.name} already up to date"
+            elif dry_run:
+                message = f"{len(changes)} network changes pending on {host.name} (dry run)"
+            else:
+                network_system.UpdateNetworkConfig(config, 'modify')
+                message = f"Applied {len(changes)} network changes on {host.name}"
+            logger.info(message)
+            return {"status": True, "message": message, "data": {"changes": changes, "dry_run": dry_run}}
+        except Exception as e:
+            logger.error("Failed to apply network configuration: %s", e)
+            return {"status": False, "message": str(e)}
+
+    @traced()
+    def create_vswitch_on_hosts(self, vswitch_name, num_ports=128, uplink_portgroup=None, hosts=None,
+                                max_workers=None):
+        return self._get_fan_out().run(
+            f"Create vSwitch {vswitch_name}", hosts,
+            lambda controller: controller.create_vswitch(vswitch_name, num_ports, uplink_portgroup), max_workers)
+
+    @traced()
+    def update_vswitch_on_hosts(self, vswitch_name, num_ports=None, uplink_portgroup=None, hosts=None,
+                                max_workers=None):
+        return self._get_fan_out().run(
+            f"Update vSwitch {vswitch_name}", hosts,
+            lambda controller: controller.update_vswitch(vswitch_name, num_ports, uplink_portgroup), max_workers)
+
+    @traced()
+    def apply_network_config_on_hosts(self, desired, prune=False, dry_run=False, hosts=None, max_workers=None):
+        return self._get_fan_out().run(
+            "Apply network configuration", hosts,
+            lambda controller: controller.apply_network_config(desired, prune, dry_run), max_workers)
+
+    @traced()
+    def delete_vswitch_on_hosts(self, vswitch_name, hosts=None, max_workers=None):
+        return self._get_fan_out().run(
+            f"Delete vSwitch {vswitch_name}", hosts,
+            lambda controller: controller.delete_vswitch(vswitch_name), max_workers)
+
+    def _get_fan_out(self):
+        if self._fan_out is None:
+            self._fan_out = HostFanOut(self.client.config, lambda client: VSwitchController(client=client))
+        return self._fan_out
+
+    def _get_host_system(self):
+        hosts = self.inventory_cache.get_hosts()
+        return hosts[0] if hosts else self.client._get_host_system()
+
     def _get_vswitch_by_name(self, network_system, vswitch_name):
         for vswitch in network_system.networkInfo.vswitch:
             if vswitch.name == vswitch_name:
                 return vswitch
         return None
+
+    def _plan_network_config(self, network_info, desired, prune):
+        # returns the NetworkConfig turning network_info into desired, and the list of changes it makes
+        config = vim.host.NetworkConfig(vswitch=[], portgroup=[])
+        changes = []
+        current_vswitches = {vswitch.name: vswitch for vswitch in network_info.vswitch or []}
+        current_portgroups = {portgroup.spec.name: portgroup for portgroup in network_info.portgroup or []}
+        wanted_vswitches = {entry["name"]: entry for entry in desired.get("vswitches", [])}
+        wanted_portgroups = {entry["name"]: entry for entry in desired.get("portgroups", [])}
+
+        for name, entry in wanted_vswitches.items():
+            current = current_vswitches.get(name)
+            spec = self._vswitch_spec(current, entry)
+            if current is None:
+                fields = {field: [None, value] for field, value in (
+                    ("num_ports", spec.numPorts), ("mtu", spec.mtu), ("uplinks", _uplinks(spec) or None)) if value}
+                operation = 'add'
+            else:
+                fields = {field: [before, after] for field, before, after in (
+                    ("num_ports", current.spec.numPorts, spec.numPorts),
+                    ("mtu", current.spec.mtu, spec.mtu),
+                    ("uplinks", _uplinks(current.spec), _uplinks(spec))) if before != after}
+                if not fields:
+                    continue
+                operation = 'edit'
+            config.vswitch.append(vim.host.VirtualSwitch.Config(changeOperation=operation, name=name, spec=spec))
+            changes.append(_change("vswitch", operation, name, fields))
+
+        for name, entry in wanted_portgroups.items():
+            current = current_portgroups.get(name)
+            spec = self._portgroup_spec(current, entry)
+            if current is None:
+                fields = {"vswitch": [None, spec.vswitchName], "vlan": [None, spec.vlanId]}
+                operation = 'add'
+            else:
+                fields = {field: [before, after] for field, before, after in (
+                    ("vswitch", current.spec.vswitchName, spec.vswitchName),
+                    ("vlan", current.spec.vlanId, spec.vlanId)) if before != after}
+                if not fields:
+                    continue
+                operation = 'edit'
+            config.portgroup.append(vim.host.PortGroup.Config(changeOperation=operation, spec=spec))
+            changes.append(_change("portgroup", operation, name, fields))
+
+        if prune:
+            for name, current in current_portgroups.items():
+                if name not in wanted_portgroups and name not in PROTECTED_PORTGROUPS:
+                    config.portgroup.append(vim.host.PortGroup.Config(changeOperation='remove', spec=current.spec))
+                    changes.append(_change("portgroup", 'remove', name))
+            for name in current_vswitches:
+                if name not in wanted_vswitches and name not in PROTECTED_VSWITCHES:
+                    config.vswitch.append(vim.host.VirtualSwitch.Config(changeOperation='remove', name=name))
+                    changes.append(_change("vswitch", 'remove', name))
+        return config, changes
+
+    def _vswitch_spec(self, current, entry):
+        # starts from the current spec so settings the desired state does not mention (policy, beacon) survive
+        spec = copy.copy(current.spec) if current else vim.host.VirtualSwitch.Specification(
+            numPorts=DEFAULT_NUM_PORTS)
+        if entry.get("num_ports") is not None:
+            spec.numPorts = entry["num_ports"]
+        if entry.get("mtu") is not None:
+            spec.mtu = entry["mtu"]
+        if entry.get("uplinks") is not None:
+            spec.bridge = vim.host.VirtualSwitch.BondBridge(nicDevice=list(entry["uplinks"])) \
+                if entry["uplinks"] else None
+        return spec
+
+    def _portgroup_spec(self, current, entry):
+        spec = copy.copy(current.spec) if current else vim.host.PortGroup.Specification(
+            name=entry["name"], vlanId=0, policy=vim.host.NetworkPolicy())
+        if entry.get("vswitch") is not None:
+            spec.vswitchName = entry["vswitch"]
+        if entry.get("vlan") is not None:
+            spec.vlanId = entry["vlan"]
+        return spec
@@ -0,0 +1,59 @@
+# core/adaptive_window.py
+# AIMD concurrency window for bulk task submission. Finished tasks report how long vCenter queued them
+# (TaskInfo.startTime - queueTime) against how long they ran (completeTime - startTime). Once a full
+# window of tasks has finished, a queue/run ratio above the threshold halves the window (vCenter or
+# storage is saturated) and a ratio well below it grows the window by one (capacity is left unused).
+# Tasks submitted before a decrease are ignored afterwards, so one congestion episode halves it once.
+
+import threading
+import time
+
+DEFAULT_QUEUE_THRESHOLD = 0.1
+
+
+class AdaptiveWindow:
+    def __init__(self, initial=4, minimum=1, maximum=64, queue_threshold=DEFAULT_QUEUE_THRESHOLD,
+                 increase=1, decrease=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.queue_threshold = queue_threshold
+        self.increase = increase
+        self.decrease = decrease
+        self.history = []
+        self._limit = max(minimum, min(maximum, initial))
+        self._queued = 0.0
+        self._run = 0.0
+        self._samples = 0
+        self._decreased_at = float('-inf')
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    def observe(self, task_result):
+        # task_result: a finished TaskResult; tasks that never started carry no timing and are skipped
+        queued, run = task_result.queued_seconds, task_result.run_seconds
+        if queued is None or run is None:
+            return
+        with self._lock:
+            if task_result.submitted_at < self._decreased_at:
+                return
+            self._queued += max(queued, 0.0)
+            self._run += max(run, 0.0)
+            self._samples += 1
+            if self._samples >= self._limit:
+                self._adjust()
+
+    def _adjust(self):
+        ratio = self._queued / self._run if self._run > 0 else (float('inf') if self._queued > 0 else 0.0)
+        previous = self._limit
+        if ratio > self.queue_threshold:
+            self._limit = max(self.minimum, int(self._limit * self.decrease))
+            self._decreased_at = time.monotonic()
+        elif ratio < self.queue_threshold / 2:
+            self._limit = min(self.maximum, self._limit + self.increase)
+        self.history.append({"time": time.time(), "ratio": ratio, "samples": self._samples,
+                             "limit_before": previous, "limit": self._limit})
+        self._queued = self._run = 0.0
+        self._samples = 0
@@ -1,51 +1,125 @@
 # this file will have methods/ functions for parsing testbed, saving and updating configurations of the different
 # vmware related objects like ESXi hosts, VMs, Templates, vSwitches etc.
-import os
-
-import yaml
 import argparse
+import functools
 import os
+import threading
+
+CONFIG_ENV_VAR = 'PYVMOMI_FRAMEWORK_CONFIG'
+_MISSING = object()
+_configs = {}
+_configs_lock = threading.Lock()
+# (environment variable value, Config) of the last get_config() without a path, so the hot path neither
+# re-parses sys.argv nor takes the lock
+_default = None
 
 
 def parse_args():
-    parser = argparse.ArgumentParser(description="PyVmomi Framework")
+    parser = argparse.ArgumentParser(description="PyVmomi Framework", add_help=False)
     parser.add_argument(
         "--config",
         type=str,
-        required=True,
+        default=None,
         help="Path to the configuration file (config.yaml)"
     )
-    return parser.parse_args()
+    # tolerate foreign arguments (pytest, worker pools) instead of exiting
+    args, _ = parser.parse_known_args()
+    return args
+
+
+def resolve_config_path(config_file=None):
+    # explicit path, then the environment variable, then --config on the command line
+    if config_file is None:
+        config_file = os.environ.get(CONFIG_ENV_VAR)
+    if config_file is None:
+        config_file = parse_args().config
+    if config_file is None:
+        raise FileNotFoundError(f"No configuration file given: pass --config or set {CONFIG_ENV_VAR}")
+    return os.path.join(os.getcwd(), config_file)
+
+
+@functools.lru_cache(maxsize=None)
+def _split_key(key):
+    return tuple(key.split('.'))
+
+
+def get_config(config_file=None, reload=False):
+    # process-wide Config per file, parsed once; reload=True re-reads the file only if its mtime changed
+    global _default
+    if config_file is None:
+        env_value = os.environ.get(CONFIG_ENV_VAR)
+        default = _default
+        if default is not None and default[0] == env_value:
+            if reload:
+                with _configs_lock:
+                    default[1].reload_if_changed()
+            return default[1]
+    path = resolve_config_path(config_file)
+    with _configs_lock:
+        config = _configs.get(path)
+        if config is None:
+            config = _configs[path] = Config(path)
+        elif reload:
+            config.reload_if_changed()
+        if config_file is None:
+            _default = (env_value, config)
+    return config
+
+
+def set_config(config):
+    # installs an already loaded (e.g. unpickled) Config as the process-wide instance for its file
+    global _default
+    with _configs_lock:
+        _configs[config.path] = config
+        _default = None
+    os.environ.setdefault(CONFIG_ENV_VAR, config.path)
 
 
 class Config:
     def __init__(self, config_file=None):
-        # config_file = os.path.join(os.getcwd(), config_file)
-        # with open(config_file, 'r') as file:
-        #     self.config = yaml.safe_load(file)
-        if config_file is None:
-            args = parse_args()
-            config_file = args.config
+        self.path = resolve_config_path(config_file)
+        if not os.path.isfile(self.path):
+            raise FileNotFoundError(f"Configuration file not found: {self.path}")
+        self._load()
 
-        config_file = os.path.join(os.getcwd(), config_file)
-        if not os.path.isfile(config_file):
-            raise FileNotFoundError(f"Configuration file not found: {config_file}")
+    def _load(self):
+        # yaml is only needed once a file is parsed, keep it off the import path
+        import yaml
 
-        with open(config_file, 'r') as file:
-            self.config = yaml.safe_load(file)
+        self.mtime = os.path.getmtime(self.path)
+        with open(self.path, 'r') as file:
+            self.config = yaml.safe_load(file) or {}
+        self._build_indexes()
+
+    def _build_indexes(self):
+        self._values = {}
+        self._esxi_hosts = {host['name']: host for host in self.config.get('esxi_hosts') or []}
+
+    def reload_if_changed(self):
+        if os.path.getmtime(self.path) == self.mtime:
+            return False
+        self._load()
+        return True
 
     def get(self, key):
-        keys = key.split('.')
+        value = self._values.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
         value = self.config
-        for k in keys:
-            value = value.get(k, None)
+        for k in _split_key(key):
+            value = value.get(k, None) if isinstance(value, dict) else None
             if value is None:
                 break
+        self._values[key] = value
         return value
 
     def get_esxi_host(self, name):
-        hosts = self.config.get('esxi_hosts', [])
-        for host in hosts:
-            if host['name'] == name:
-                return host
-        return None
+        return self._esxi_hosts.get(name)
+
+    def __getstate__(self):
+        # only the parsed document travels to worker processes; caches are rebuilt on arrival
+        return {'path': self.path, 'mtime': self.mtime, 'config': self.config}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_indexes()
@@ -0,0 +1,254 @@
+# core/datastore_transfer.py
+# Bulk file transfer to and from datastores through the host/vCenter /folder HTTP endpoint, riding on the
+# SOAP session cookie of VMwareClient.si. Sources are memory-mapped and sent in chunks straight from the
+# page cache. The worker threads live as long as the engine and each keeps one keep-alive connection, so
+# later batches reuse them. Files, and byte ranges of large downloads, run in parallel. SHA-256 is computed
+# while streaming; uploads are checked by streaming the file back. /folder does not accept ranged PUTs, so
+# an upload of one file is a single request.
+
+import hashlib
+import http.client
+import mmap
+import os
+import ssl
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core.logger import logger
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_PART_SIZE = 256 * 1024 * 1024
+DEFAULT_MAX_PARALLEL = 4
+ESXI_DATACENTER = 'ha-datacenter'
+
+
+class TransferError(Exception):
+    pass
+
+
+def file_sha256(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    size = os.path.getsize(path)
+    if size:
+        with open(path, 'rb') as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, chunk_size):
+                    digest.update(view[offset:offset + chunk_size])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+class DatastoreTransfer:
+    def __init__(self, host, port, cookie, ssl_context=None, secure=True, chunk_size=DEFAULT_CHUNK_SIZE,
+                 part_size=DEFAULT_PART_SIZE, max_parallel=DEFAULT_MAX_PARALLEL, timeout=300):
+        # cookie: the session's Set-Cookie value (SoapStubAdapter.cookie); only name=value is sent back
+        self.host = host
+        self.port = port
+        self.set_cookie(cookie)
+        self.ssl_context = ssl_context
+        self.secure = secure
+        self.chunk_size = chunk_size
+        self.part_size = part_size
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # file jobs and the byte ranges they fan out into get separate workers, so a job never waits on
+        # ranges queued behind other jobs
+        self._executors = {}
+
+    @classmethod
+    def for_client(cls, client, **kwargs):
+        ssl_context = ssl._create_unverified_context() if client.disable_ssl_cert_verify else None
+        return cls(client.host, client.port or 443, session_cookie(client), ssl_context, **kwargs)
+
+    def set_cookie(self, cookie):
+        # a re-login gives the session a new cookie; the engine outlives it
+        self.cookie = cookie.split(';')[0].strip()
+
+    def close(self):
+        with self._connections_lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=True)
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    def run(self, jobs, max_parallel=None):
+        # jobs: zero-argument callables returning a result dict; results come back in job order, with at
+        # most max_parallel (never more than the engine's own max_parallel) running at once
+        limit = min(max_parallel or self.max_parallel, self.max_parallel)
+        executor = self._executor('datastore-transfer')
+        futures, running = [], set()
+        for job in jobs:
+            if len(running) >= limit:
+                _, running = wait(running, return_when=FIRST_COMPLETED)
+            futures.append(executor.submit(job))
+            running.add(futures[-1])
+        return [future.result() for future in futures]
+
+    def upload(self, local_path, datacenter, datastore, remote_path, verify=True):
+        started = time.monotonic()
+        size = os.path.getsize(local_path)
+        digest = hashlib.sha256()
+        with open(local_path, 'rb') as source:
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            try:
+                view = memoryview(mapped) if mapped else memoryview(b'')
+                try:
+                    self._request('PUT', datacenter, datastore, remote_path, body=view, digest=digest)
+                finally:
+                    view.release()
+            finally:
+                if mapped:
+                    mapped.close()
+        checksum = digest.hexdigest()
+        if verify:
+            remote_checksum = self.download(None, datacenter, datastore, remote_path)["sha256"]
+            if remote_checksum != checksum:
+                raise TransferError(f"Checksum mismatch after uploading {remote_path} to {datastore}: "
+                                    f"{checksum} != {remote_checksum}")
+        return {"bytes": size, "sha256": checksum, "elapsed": time.monotonic() - started, "verified": verify}
+
+    def download(self, local_path, datacenter, datastore, remote_path, expected_sha256=None):
+        # local_path None streams the file through the hash only (upload verification)
+        started = time.monotonic()
+        size = self._remote_size(datacenter, datastore, remote_path) if local_path else None
+        if local_path and size and size > self.part_size and self.max_parallel > 1:
+            self._download_ranges(local_path, datacenter, datastore, remote_path, size)
+            checksum = file_sha256(local_path, self.chunk_size)
+        else:
+            digest = hashlib.sha256()
+            with open(local_path, 'wb') if local_path else _NullSink() as target:
+                size = self._request('GET', datacenter, datastore, remote_path, sink=target, digest=digest)
+            checksum = digest.hexdigest()
+        if expected_sha256 and checksum != expected_sha256:
+            raise TransferError(f"Checksum mismatch downloading {remote_path} from {datastore}: "
+                                f"{checksum} != {expected_sha256}")
+        return {"bytes": size, "sha256": checksum, "elapsed": time.monotonic() - started,
+                "verified": bool(expected_sha256)}
+
+    def _download_ranges(self, local_path, datacenter, datastore, remote_path, size):
+        # parts land at their offsets in a preallocated file, each from its own worker connection
+        with open(local_path, 'wb') as target:
+            target.truncate(size)
+        ranges = [(offset, min(size, offset + self.part_size) - 1) for offset in range(0, size, self.part_size)]
+
+        def fetch(byte_range):
+            with open(local_path, 'r+b') as target:
+                target.seek(byte_range[0])
+                self._request('GET', datacenter, datastore, remote_path, sink=target, byte_range=byte_range)
+
+        list(self._executor('datastore-range').map(fetch, ranges))
+
+    def _remote_size(self, datacenter, datastore, remote_path):
+        return self._request('HEAD', datacenter, datastore, remote_path)
+
+    def _request(self, method, datacenter, datastore, remote_path, body=None, sink=None, digest=None,
+                 byte_range=None, retry=True):
+        # returns the number of body bytes sent (PUT) or received (GET), or Content-Length (HEAD)
+        conn = self._connection()
+        try:
+            conn.putrequest(method, self._url(datacenter, datastore, remote_path), skip_accept_encoding=True)
+            conn.putheader('Cookie', self.cookie)
+            if body is not None:
+                conn.putheader('Content-Type', 'application/octet-stream')
+                conn.putheader('Content-Length', str(len(body)))
+            if byte_range:
+                conn.putheader('Range', f"bytes={byte_range[0]}-{byte_range[1]}")
+            conn.endheaders()
+            if body is not None:
+                for offset in range(0, len(body), self.chunk_size):
+                    chunk = body[offset:offset + self.chunk_size]
+                    conn.send(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+            response = conn.getresponse()
+        except (ConnectionError, http.client.HTTPException) as e:
+            # a pooled keep-alive connection the server already closed; one fresh attempt
+            self._drop_connection()
+            if retry and body is None:
+                logger.debug("Retrying %s %s on a new connection: %s", method, remote_path, e)
+                return self._request(method, datacenter, datastore, remote_path, body, sink, digest, byte_range,
+                                     retry=False)
+            raise
+        if response.status >= 300:
+            response.read()
+            raise TransferError(f"{method} {remote_path} on {datastore} failed: {response.status} {response.reason}")
+        if byte_range and response.status != 206:
+            # a 200 is the whole file, which would land at this part's offset; drop it rather than read it
+            self._drop_connection()
+            raise TransferError(f"GET {remote_path} on {datastore} ignored the byte range: {response.status}")
+        if method == 'HEAD':
+            response.read()
+            return int(response.getheader('Content-Length') or 0)
+        if body is not None:
+            response.read()
+            return len(body)
+        received = 0
+        while True:
+            chunk = response.read(self.chunk_size)
+            if not chunk:
+                break
+            received += len(chunk)
+            sink.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+        if byte_range and received != byte_range[1] - byte_range[0] + 1:
+            raise TransferError(f"GET {remote_path} on {datastore} returned {received} bytes for range "
+                                f"{byte_range[0]}-{byte_range[1]}")
+        return received
+
+    def _url(self, datacenter, datastore, remote_path):
+        query = urllib.parse.urlencode({'dcPath': datacenter, 'dsName': datastore})
+        return f"/folder/{urllib.parse.quote(remote_path.lstrip('/'))}?{query}"
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.secure:
+                conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                                   context=self.ssl_context)
+            else:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _executor(self, name):
+        with self._connections_lock:
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = self._executors[name] = ThreadPoolExecutor(self.max_parallel, thread_name_prefix=name)
+            return executor
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def session_cookie(client):
+    # the Set-Cookie value of the client's current SOAP session
+    stub = getattr(client.si._stub, 'soapStub', client.si._stub)
+    return stub.cookie
+
+
+class _NullSink:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def write(self, data):
+        pass
@@ -0,0 +1,82 @@
+# core/host_fanout.py
+# Runs one controller operation against many configured ESXi hosts at once. Every host gets its own
+# VMwareClient (and therefore its own pooled session) and its own controller, kept for reuse across calls.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.vmware_client import VMwareClient
+from core.logger import logger
+
+DEFAULT_MAX_PARALLEL_HOSTS = 32
+
+
+def select_hosts(config, selector=None):
+    # selector: None/'all', a host name, a list of host names, or {'cluster': name} matched against
+    # the optional 'cluster' key of the esxi_hosts entries
+    hosts = config.get('esxi_hosts') or []
+    if selector is None or selector == 'all':
+        return list(hosts)
+    if isinstance(selector, dict):
+        return [host for host in hosts if host.get('cluster') == selector.get('cluster')]
+    names = {selector} if isinstance(selector, str) else set(selector)
+    return [host for host in hosts if host['name'] in names]
+
+
+class HostFanOut:
+    def __init__(self, config, controller_factory, max_workers=None):
+        self.config = config
+        self.controller_factory = controller_factory
+        self.max_workers = max_workers or config.get('esxi_fanout.max_parallel_hosts') or DEFAULT_MAX_PARALLEL_HOSTS
+        self._controllers = {}
+        self._lock = threading.Lock()
+
+    def run(self, description, selector, operation, max_workers=None):
+        host_names = [host['name'] for host in select_hosts(self.config, selector)]
+        if not host_names:
+            message = f"No configured ESXi hosts match {selector!r}"
+            logger.error(message)
+            return {"status": False, "message": message, "data": {}}
+
+        start = time.monotonic()
+        workers = min(max_workers or self.max_workers, len(host_names))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='host-fanout') as executor:
+            futures = {name: executor.submit(self._run_on_host, name, operation) for name in host_names}
+            results = {name: future.result() for name, future in futures.items()}
+        elapsed = time.monotonic() - start
+
+        succeeded = sum(1 for result in results.values() if result.get("status"))
+        message = f"{description} succeeded on {succeeded}/{len(results)} hosts in {elapsed:.1f}s"
+        logger.info(message)
+        return {"status": succeeded == len(results), "message": message, "data": results, "elapsed": elapsed}
+
+    def close(self):
+        with self._lock:
+            controllers = list(self._controllers.values())
+            self._controllers.clear()
+        for controller in controllers:
+            controller.close()
+
+    def _run_on_host(self, host_name, operation):
+        start = time.monotonic()
+        try:
+            result = dict(operation(self._controller(host_name)))
+        except Exception as e:
+            logger.error("Operation failed on host %s: %s", host_name, e)
+            result = {"status": False, "message": str(e)}
+        result["elapsed"] = time.monotonic() - start
+        return result
+
+    def _controller(self, host_name):
+        with self._lock:
+            controller = self._controllers.get(host_name)
+        if controller is None:
+            # built outside the lock; the login itself happens on the first operation, in the worker thread
+            controller = self.controller_factory(VMwareClient('esxi', host_name=host_name))
+            with self._lock:
+                existing = self._controllers.setdefault(host_name, controller)
+            if existing is not controller:
+                controller.close()
+                controller = existing
+        return controller
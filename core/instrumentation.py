@@ -0,0 +1,281 @@
+# core/instrumentation.py
+# Counts SOAP round trips, bytes on the wire and time spent in them, and attributes them to the
+# controller operation that caused them. Hooks sit on the SoapStubAdapter behind VMwareClient.si;
+# operations are marked with @traced and tracked through a context-local span. While disabled, each
+# hook costs one global flag check.
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+
+UNATTRIBUTED = "(no operation)"
+WALL_TIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float('inf'))
+SOAP_CALL_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf'))
+
+_enabled = False
+_configured = False
+_current_span = contextvars.ContextVar('vmware_operation_span', default=None)
+_stats = {}
+_stats_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_listeners = []
+_logger = logging.getLogger('vmware_logger')
+
+
+class Span:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.id = f"{next(_span_ids):x}"
+        self.parent = parent
+        self.soap_calls = 0
+        self.soap_time = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.tags = {}
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+
+
+class OperationStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.soap_calls = 0
+        self.soap_time = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.wall_time = 0.0
+        self.wall_time_histogram = [0] * len(WALL_TIME_BUCKETS)
+        self.soap_call_histogram = [0] * len(SOAP_CALL_BUCKETS)
+
+    def add(self, span, wall_time, ok):
+        self.count += 1
+        self.errors += 0 if ok else 1
+        self.soap_calls += span.soap_calls
+        self.soap_time += span.soap_time
+        self.bytes_sent += span.bytes_sent
+        self.bytes_received += span.bytes_received
+        self.wall_time += wall_time
+        self.wall_time_histogram[_bucket(WALL_TIME_BUCKETS, wall_time)] += 1
+        self.soap_call_histogram[_bucket(SOAP_CALL_BUCKETS, span.soap_calls)] += 1
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "soap_calls": self.soap_calls,
+            "soap_calls_per_op": self.soap_calls / count,
+            "soap_time": self.soap_time,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "wall_time": self.wall_time,
+            "wall_time_per_op": self.wall_time / count,
+            "wall_time_histogram": _histogram(WALL_TIME_BUCKETS, self.wall_time_histogram),
+            "soap_call_histogram": _histogram(SOAP_CALL_BUCKETS, self.soap_call_histogram),
+        }
+
+
+def _bucket(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds) - 1
+
+
+def _histogram(bounds, counts):
+    return [{"le": "inf" if bound == float('inf') else bound, "count": count} for bound, count in zip(bounds, counts)]
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def current_span():
+    return _current_span.get()
+
+
+def add_listener(callback):
+    # callback(span, wall_time, outcome) runs in the finishing thread after every operation; outcome has
+    # "ok" and, for failures, "error"
+    _listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def annotate(**tags):
+    span = _current_span.get()
+    if span is not None:
+        span.tags.update(tags)
+
+
+@contextlib.contextmanager
+def operation(name):
+    parent = _current_span.get()
+    span = Span(name, parent)
+    token = _current_span.set(span)
+    outcome = {"ok": True}
+    try:
+        yield outcome
+    except BaseException as e:
+        outcome["ok"] = False
+        outcome["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        wall_time = time.perf_counter() - span.started
+        if parent is not None:
+            # the enclosing operation also paid for everything its children did
+            parent.soap_calls += span.soap_calls
+            parent.soap_time += span.soap_time
+            parent.bytes_sent += span.bytes_sent
+            parent.bytes_received += span.bytes_received
+        _record(span, wall_time, outcome["ok"])
+        for listener in list(_listeners):
+            try:
+                listener(span, wall_time, outcome)
+            except Exception as e:
+                _logger.error("Operation listener failed for %s: %s", name, e)
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Operation %s finished in %.3fs with %d SOAP calls", name, wall_time, span.soap_calls,
+                          extra={"duration": wall_time})
+
+
+def traced(name=None):
+    def decorator(func):
+        operation_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with operation(operation_name) as outcome:
+                result = func(*args, **kwargs)
+                # controllers report failures as {"status": False, ...} rather than raising
+                if isinstance(result, dict) and result.get("status") is False:
+                    outcome["ok"] = False
+                    outcome["error"] = result.get("message")
+                return result
+        return wrapper
+    return decorator
+
+
+def get_stats():
+    with _stats_lock:
+        return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def dump(path):
+    with open(path, 'w') as output:
+        json.dump(get_stats(), output, indent=2)
+
+
+def _record(span, wall_time, ok):
+    with _stats_lock:
+        stats = _stats.get(span.name)
+        if stats is None:
+            stats = _stats[span.name] = OperationStats(span.name)
+        stats.add(span, wall_time, ok)
+
+
+def instrument_stub(si):
+    # hook the innermost SoapStubAdapter; VimSessionOrientedStub keeps it in .soapStub
+    stub = getattr(si._stub, 'soapStub', si._stub)
+    if getattr(stub, '_vmware_instrumented', False):
+        return
+    stub._vmware_instrumented = True
+    invoke_method = stub.InvokeMethod
+    serialize_request = stub.SerializeRequest
+    get_connection = stub.GetConnection
+
+    def InvokeMethod(mo, info, args, outerStub=None):
+        if not _enabled:
+            return invoke_method(mo, info, args, outerStub)
+        span = _current_span.get()
+        standalone = span is None
+        if standalone:
+            span = Span(UNATTRIBUTED)
+            token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            return invoke_method(mo, info, args, outerStub)
+        finally:
+            elapsed = time.perf_counter() - started
+            span.soap_calls += 1
+            span.soap_time += elapsed
+            if standalone:
+                _current_span.reset(token)
+                _record(span, elapsed, True)
+
+    def SerializeRequest(mo, info, args):
+        request = serialize_request(mo, info, args)
+        if _enabled:
+            span = _current_span.get()
+            if span is not None:
+                span.bytes_sent += len(request)
+        return request
+
+    def GetConnection():
+        conn = get_connection()
+        if not getattr(conn, '_vmware_instrumented', False):
+            conn._vmware_instrumented = True
+            getresponse = conn.getresponse
+
+            def counting_getresponse(*args, **kwargs):
+                response = getresponse(*args, **kwargs)
+                read = response.read
+
+                def counting_read(*read_args):
+                    data = read(*read_args)
+                    if _enabled:
+                        span = _current_span.get()
+                        if span is not None:
+                            span.bytes_received += len(data)
+                    return data
+                response.read = counting_read
+                return response
+            conn.getresponse = counting_getresponse
+        return conn
+
+    stub.InvokeMethod = InvokeMethod
+    stub.SerializeRequest = SerializeRequest
+    stub.GetConnection = GetConnection
+
+
+def configure(config):
+    # instrumentation.enabled turns the hooks on; instrumentation.stats_file receives the per-operation
+    # stats when the process exits
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    if config.get('instrumentation.enabled'):
+        enable()
+    stats_file = config.get('instrumentation.stats_file')
+    if stats_file:
+        atexit.register(dump, stats_file)
@@ -0,0 +1,79 @@
+# core/inventory.py
+# Batched inventory lookups built on PropertyCollector.RetrievePropertiesEx. A ContainerView rooted
+# at the root folder is traversed recursively, so nested folders, vApps and every datacenter are
+# covered, and only the requested properties travel over the wire.
+
+from pyVmomi import vim, vmodl
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+class Inventory:
+    def __init__(self, si, page_size=DEFAULT_PAGE_SIZE):
+        self.si = si
+        self.page_size = page_size
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.si.RetrieveContent()
+        return self._content
+
+    def iter_objects(self, obj_type, properties, root=None, page_size=None):
+        return self.iter_many({obj_type: properties}, root, page_size)
+
+    def iter_many(self, properties, root=None, page_size=None):
+        # properties: {obj_type: [path, ...]}; all types come back from one view and one paged retrieval
+        content = self.content
+        view = content.viewManager.CreateContainerView(root or content.rootFolder, list(properties), True)
+        try:
+            traversal = vmodl.query.PropertyCollector.TraversalSpec(
+                name='traverseView', path='view', skip=False, type=vim.view.ContainerView)
+            obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=view, skip=True, selectSet=[traversal])
+            prop_specs = [vmodl.query.PropertyCollector.PropertySpec(type=obj_type, pathSet=list(paths), all=False)
+                          for obj_type, paths in properties.items()]
+            filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=prop_specs)
+            for obj, props in self._retrieve(filter_spec, page_size):
+                yield obj, props
+        finally:
+            view.Destroy()
+
+    def retrieve(self, obj_type, properties, root=None):
+        return list(self.iter_objects(obj_type, properties, root))
+
+    def get_properties(self, obj, properties):
+        obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=obj, skip=False)
+        prop_spec = vmodl.query.PropertyCollector.PropertySpec(type=type(obj), pathSet=list(properties), all=False)
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=[prop_spec])
+        for _, props in self._retrieve(filter_spec):
+            return props
+        return {}
+
+    def find(self, obj_type, name, properties=(), predicate=None):
+        for obj, props in self.iter_objects(obj_type, ['name'] + list(properties)):
+            if props.get('name') == name and (predicate is None or predicate(props)):
+                return obj, props
+        return None, {}
+
+    def find_by_name(self, obj_type, name, properties=(), predicate=None):
+        return self.find(obj_type, name, properties, predicate)[0]
+
+    def _retrieve(self, filter_spec, page_size=None):
+        collector = self.content.propertyCollector
+        options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=page_size or self.page_size)
+        result = collector.RetrievePropertiesEx([filter_spec], options)
+        token = None
+        try:
+            while result:
+                token = result.token
+                for obj_content in result.objects:
+                    yield obj_content.obj, {prop.name: prop.val for prop in obj_content.propSet}
+                if not token:
+                    break
+                result = collector.ContinueRetrievePropertiesEx(token)
+                token = None
+        finally:
+            # a caller that stops early (e.g. find_by_name) leaves a server-side result set open
+            if token:
+                collector.CancelRetrievePropertiesEx(token)
@@ -0,0 +1,318 @@
+# core/inventory_cache.py
+# Name -> MoRef indexes for VMs, templates, hosts, datastores and networks, shared by all controllers
+# talking to the same endpoint. The indexes are filled by one PropertyCollector filter and kept
+# current by a background thread applying WaitForUpdatesEx deltas, so lookups are plain dict hits.
+# With inventory_snapshot.enabled, the indexes are also kept on disk (core/inventory_snapshot.py). A new
+# process then serves lookups from the snapshot at once while the watcher thread runs the initial sync
+# and drops whatever the snapshot has that vCenter no longer reports. Collector versions belong to one
+# collector in one session, so a stored version cannot be resumed; the snapshot only hides the sync.
+
+import threading
+import time
+
+from pyVmomi import vim, vmodl
+from core import inventory_snapshot
+from core.inventory import Inventory
+from core.logger import logger
+
+CONSISTENCY_CACHED = 'cached'
+CONSISTENCY_REFRESH_ON_MISS = 'refresh_on_miss'
+
+TRACKED_PROPERTIES = {
+    vim.VirtualMachine: ['name', 'config.template'],
+    vim.HostSystem: ['name'],
+    vim.Datastore: ['name'],
+    vim.Network: ['name'],
+}
+_TYPES_BY_NAME = {obj_type.__name__: obj_type for obj_type in TRACKED_PROPERTIES}
+# a snapshot taken with a different property set is not used
+SNAPSHOT_SIGNATURE = ';'.join(f"{obj_type.__name__}:{','.join(props)}"
+                              for obj_type, props in TRACKED_PROPERTIES.items())
+
+
+def _index_names(obj, props):
+    if isinstance(obj, vim.VirtualMachine):
+        return ('vm', 'template') if props.get('config.template') else ('vm',)
+    if isinstance(obj, vim.HostSystem):
+        return ('host',)
+    if isinstance(obj, vim.Datastore):
+        return ('datastore',)
+    if isinstance(obj, vim.Network):
+        return ('network',)
+    return ()
+
+
+class InventoryCache:
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, client, consistency=CONSISTENCY_REFRESH_ON_MISS):
+        key = (client.host, client.port, client.user)
+        with cls._instances_lock:
+            cache = cls._instances.get(key)
+            if cache is None or not cache.running or cache.si is not client.si:
+                cache = cls(client.si, consistency,
+                            snapshot_directory=inventory_snapshot.snapshot_directory(client.config),
+                            snapshot_max_age=client.config.get('inventory_snapshot.max_age'))
+                cache.start()
+                cls._instances[key] = cache
+                client.on_disconnect(cache.stop)
+            return cache
+
+    def __init__(self, si, consistency=CONSISTENCY_REFRESH_ON_MISS, wait_seconds=60, snapshot_directory=None,
+                 snapshot_max_age=None):
+        self.si = si
+        self.consistency = consistency
+        self.wait_seconds = wait_seconds
+        self.inventory = Inventory(si)
+        self._lock = threading.RLock()
+        self._objects = {}
+        self._indexes = {name: {} for name in ('vm', 'template', 'host', 'datastore', 'network')}
+        self._version = ''
+        self._collector = None
+        self._filter = None
+        self._view = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.snapshot_directory = snapshot_directory
+        self.snapshot_max_age = snapshot_max_age or inventory_snapshot.DEFAULT_MAX_AGE
+        self._snapshot_path = None
+        self._instance_uuid = None
+        self._unconfirmed = None
+        self._synced = threading.Event()
+        self._changed = False
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        content = self.inventory.content
+        self._collector = content.propertyCollector.CreatePropertyCollector()
+        self._view = content.viewManager.CreateContainerView(content.rootFolder, list(TRACKED_PROPERTIES), True)
+        traversal = vmodl.query.PropertyCollector.TraversalSpec(
+            name='traverseView', path='view', skip=False, type=vim.view.ContainerView)
+        obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=self._view, skip=True, selectSet=[traversal])
+        prop_specs = [vmodl.query.PropertyCollector.PropertySpec(type=obj_type, pathSet=props, all=False)
+                      for obj_type, props in TRACKED_PROPERTIES.items()]
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=prop_specs)
+        self._filter = self._collector.CreateFilter(filter_spec, True)
+
+        # without a usable snapshot the initial sync happens inline, so the first lookup after start()
+        # is already served from memory; with one, the watcher thread does it while lookups use the snapshot
+        self._synced.clear()
+        if not self._load_snapshot(content.about.instanceUuid):
+            self._initial_sync()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, name='inventory-cache', daemon=True)
+        self._thread.start()
+        logger.info("Inventory cache started with %s objects", len(self._objects))
+
+    def wait_synced(self, timeout=None):
+        # True once the indexes reflect the live inventory rather than only a snapshot
+        return self._synced.wait(timeout)
+
+    def stop(self):
+        self._stop_event.set()
+        try:
+            if self._collector:
+                self._collector.CancelWaitForUpdates()
+        except Exception as e:
+            logger.error("Failed to cancel inventory cache updates: %s", e)
+        if self._thread:
+            self._thread.join(self.wait_seconds)
+        self.save_snapshot()
+        for managed_object in (self._filter, self._view, self._collector):
+            try:
+                if managed_object:
+                    managed_object.Destroy()
+            except Exception as e:
+                logger.error("Failed to destroy inventory cache object: %s", e)
+        self._thread = self._filter = self._view = self._collector = None
+
+    def get_vm(self, name, consistency=None):
+        return self._lookup('vm', name, consistency)
+
+    def get_template(self, name, consistency=None):
+        return self._lookup('template', name, consistency)
+
+    def get_host(self, name, consistency=None):
+        return self._lookup('host', name, consistency)
+
+    def get_datastore(self, name, consistency=None):
+        return self._lookup('datastore', name, consistency)
+
+    def get_network(self, name, consistency=None):
+        return self._lookup('network', name, consistency)
+
+    def get_hosts(self):
+        return list(self._indexes['host'].values())
+
+    def get_vms(self, include_templates=False):
+        templates = self._indexes['template']
+        return [vm for name, vm in list(self._indexes['vm'].items()) if include_templates or name not in templates]
+
+    def save_snapshot(self):
+        # writes the indexes to disk if a snapshot is configured, the live sync has completed and anything
+        # changed since the snapshot was read (or none was)
+        if self._snapshot_path is None or not self._synced.is_set() or not self._changed:
+            return False
+        with self._lock:
+            objects = [(type(obj).__name__, moId, props) for moId, (obj, props) in self._objects.items()]
+            self._changed = False
+        started = time.monotonic()
+        saved = inventory_snapshot.save(self._snapshot_path, self._instance_uuid, SNAPSHOT_SIGNATURE, objects)
+        if saved:
+            logger.info("Saved inventory snapshot with %d objects in %.2fs", len(objects),
+                        time.monotonic() - started)
+        return saved
+
+    def get_name(self, obj):
+        entry = self._objects.get(obj._moId)
+        return entry[1].get('name') if entry else None
+
+    def refresh(self):
+        objects = {}
+        for obj_type, props in TRACKED_PROPERTIES.items():
+            for obj, values in self.inventory.iter_objects(obj_type, props):
+                objects[obj._moId] = (obj, values)
+        with self._lock:
+            self._objects = {}
+            for index in self._indexes.values():
+                index.clear()
+            for obj, values in objects.values():
+                self._store(obj, values)
+            self._changed = True
+
+    def _lookup(self, index, name, consistency):
+        obj = self._indexes[index].get(name)
+        if obj is None and (consistency or self.consistency) == CONSISTENCY_REFRESH_ON_MISS:
+            obj = self._refresh_entry(index, name)
+        return obj
+
+    def _refresh_entry(self, index, name):
+        obj_type = {'vm': vim.VirtualMachine, 'template': vim.VirtualMachine, 'host': vim.HostSystem,
+                    'datastore': vim.Datastore, 'network': vim.Network}[index]
+        predicate = (lambda props: props.get('config.template')) if index == 'template' else None
+        obj, props = self.inventory.find(obj_type, name, TRACKED_PROPERTIES[obj_type][1:], predicate)
+        if obj is not None:
+            with self._lock:
+                self._store(obj, props)
+                self._changed = True
+        return obj
+
+    def _load_snapshot(self, instance_uuid):
+        self._instance_uuid = instance_uuid
+        if not self.snapshot_directory or not instance_uuid:
+            return False
+        self._snapshot_path = inventory_snapshot.snapshot_path(self.snapshot_directory, instance_uuid)
+        started = time.monotonic()
+        records = inventory_snapshot.load(self._snapshot_path, instance_uuid, SNAPSHOT_SIGNATURE,
+                                          self.snapshot_max_age)
+        if records is None:
+            return False
+        stub = self.si._stub
+        with self._lock:
+            for type_name, moId, props in records:
+                obj_type = _TYPES_BY_NAME.get(type_name)
+                if obj_type is not None:
+                    self._store(obj_type(moId, stub), props)
+            # anything the initial sync does not report again is gone from the inventory
+            self._unconfirmed = set(self._objects)
+        logger.info("Loaded inventory snapshot with %d objects in %.3fs", len(self._objects),
+                    time.monotonic() - started)
+        return True
+
+    def _initial_sync(self):
+        while True:
+            update = self._collector.WaitForUpdatesEx(
+                self._version, vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0))
+            if update is None:
+                break
+            self._apply_update(update)
+            if not update.truncated:
+                break
+        with self._lock:
+            if self._unconfirmed:
+                for moId in self._unconfirmed:
+                    entry = self._objects.get(moId)
+                    if entry:
+                        self._discard(entry[0])
+                self._changed = True
+                logger.info("Dropped %d objects from the inventory snapshot", len(self._unconfirmed))
+            self._unconfirmed = None
+        self._synced.set()
+
+    def _watch(self):
+        if not self._synced.is_set():
+            try:
+                self._initial_sync()
+            except Exception as e:
+                logger.error("Inventory cache initial sync failed: %s", e)
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=self.wait_seconds)
+        while not self._stop_event.is_set():
+            try:
+                update = self._collector.WaitForUpdatesEx(self._version, options)
+            except vmodl.fault.RequestCanceled:
+                break
+            except vmodl.query.InvalidCollectorVersion:
+                logger.error("Inventory cache collector version invalidated, resyncing")
+                with self._lock:
+                    self._version = ''
+                    self._objects = {}
+                    for index in self._indexes.values():
+                        index.clear()
+                    self._changed = True
+                continue
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                logger.error("Inventory cache update failed: %s", e)
+                self._stop_event.wait(5)
+                continue
+            if update is not None:
+                self._apply_update(update)
+
+    def _apply_update(self, update):
+        with self._lock:
+            for filter_update in update.filterSet:
+                for object_update in filter_update.objectSet:
+                    obj = object_update.obj
+                    if object_update.kind == 'leave':
+                        self._discard(obj)
+                        self._changed = True
+                        continue
+                    if self._unconfirmed is not None:
+                        self._unconfirmed.discard(obj._moId)
+                    entry = self._objects.get(obj._moId)
+                    # 'enter' carries every property, so it replaces whatever a snapshot said
+                    props = dict(entry[1]) if entry and object_update.kind != 'enter' else {}
+                    for change in object_update.changeSet:
+                        if change.op == 'assign':
+                            props[change.name] = change.val
+                        else:
+                            props.pop(change.name, None)
+                    if entry is None or entry[1] != props:
+                        self._changed = True
+                    self._store(obj, props)
+            self._version = update.version
+
+    def _store(self, obj, props):
+        self._discard(obj)
+        self._objects[obj._moId] = (obj, props)
+        name = props.get('name')
+        if name is not None:
+            for index in _index_names(obj, props):
+                self._indexes[index][name] = obj
+
+    def _discard(self, obj):
+        entry = self._objects.pop(obj._moId, None)
+        if entry is None:
+            return
+        name = entry[1].get('name')
+        for index in _index_names(obj, entry[1]):
+            indexed = self._indexes[index].get(name)
+            if indexed is not None and indexed._moId == obj._moId:
+                del self._indexes[index][name]
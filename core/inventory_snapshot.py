@@ -0,0 +1,75 @@
+# core/inventory_snapshot.py
+# On-disk copy of the InventoryCache indexes, one SQLite file per vCenter/ESXi instance UUID, so a new
+# process can answer name lookups before its own PropertyCollector sync has finished. A snapshot is only
+# used when its instance UUID, schema and tracked property set match and it is younger than max_age.
+
+import json
+import os
+import sqlite3
+import time
+
+from core.logger import logger
+
+SCHEMA_VERSION = 1
+DEFAULT_DIRECTORY = os.path.join('~', '.cache', 'pyvmomi_framework')
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+def snapshot_directory(config):
+    # None unless inventory_snapshot.enabled is set
+    if not config.get('inventory_snapshot.enabled'):
+        return None
+    return os.path.expanduser(config.get('inventory_snapshot.directory') or DEFAULT_DIRECTORY)
+
+
+def snapshot_path(directory, instance_uuid):
+    return os.path.join(directory, f"inventory-{instance_uuid}.sqlite")
+
+
+def load(path, instance_uuid, signature, max_age=DEFAULT_MAX_AGE):
+    # [(type_name, moid, props), ...], or None when there is no usable snapshot
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with sqlite3.connect(path) as db:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            expected = {"schema": str(SCHEMA_VERSION), "instance_uuid": instance_uuid, "signature": signature}
+            mismatch = [key for key, value in expected.items() if meta.get(key) != value]
+            if mismatch:
+                logger.info("Ignoring inventory snapshot %s: %s changed", path, ", ".join(mismatch))
+                return None
+            age = time.time() - float(meta.get("saved_at", 0))
+            if max_age and age > max_age:
+                logger.info("Ignoring inventory snapshot %s: %.0fs old", path, age)
+                return None
+            return [(type_name, moid, json.loads(props))
+                    for type_name, moid, props in db.execute("SELECT type, moid, props FROM objects")]
+    except (sqlite3.Error, ValueError) as e:
+        logger.error("Failed to read inventory snapshot %s: %s", path, e)
+        return None
+
+
+def save(path, instance_uuid, signature, objects):
+    # objects: (type_name, moid, props) triples; written to a temporary file and renamed into place so
+    # concurrent readers see either the old snapshot or the new one
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with sqlite3.connect(temporary) as db:
+            db.execute("PRAGMA journal_mode=OFF")
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute("CREATE TABLE objects (moid TEXT PRIMARY KEY, type TEXT, props TEXT)")
+            db.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("schema", str(SCHEMA_VERSION)), ("instance_uuid", instance_uuid), ("signature", signature),
+                ("saved_at", str(time.time()))])
+            db.executemany("INSERT INTO objects VALUES (?, ?, ?)",
+                           ((moid, type_name, json.dumps(props, separators=(',', ':')))
+                            for type_name, moid, props in objects))
+        db.close()
+        os.replace(temporary, path)
+    except (sqlite3.Error, OSError) as e:
+        logger.error("Failed to write inventory snapshot %s: %s", path, e)
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return False
+    return True
@@ -1,17 +1,127 @@
 # this file will have methods to support and modify Logging
+# Records are handed to a queue and written by a QueueListener thread, so callers never block on file I/O
+# and messages are only %-formatted by the writer. Nothing is opened at import time: configure_logging()
+# (called by VMwareClient with the loaded Config) sets the pipeline up from the 'logging' section.
 
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
+import queue
+import threading
+
+from core import instrumentation
+
+LOGGER_NAME = 'vmware_logger'
+DEFAULT_LOG_FILE = 'vmware.log'
+DEFAULT_LOG_LEVEL = 'INFO'
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+_listener = None
+_queue_handler = None
+_configure_lock = threading.Lock()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # the stock QueueHandler formats in the calling thread; leave msg/args alone so the listener does it
+    def prepare(self, record):
+        if record.exc_info:
+            # tracebacks reference live frames, render them before the record leaves this thread
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class OperationContextFilter(logging.Filter):
+    # tags records with the controller operation (instrumentation span) they were logged from
+    def filter(self, record):
+        span = instrumentation.current_span()
+        if span is not None:
+            record.operation = span.name
+            record.operation_id = span.id
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    EXTRA_FIELDS = ('operation', 'operation_id', 'duration')
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for field in self.EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
 
 def setup_logger(name, log_file, level=logging.INFO):
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    # plain synchronous file logger for scripts that want one; the framework logger uses configure_logging()
+    formatter = logging.Formatter(TEXT_FORMAT)
 
     handler = logging.FileHandler(log_file)
     handler.setFormatter(formatter)
 
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(handler)
+    named_logger = logging.getLogger(name)
+    named_logger.setLevel(level)
+    named_logger.addHandler(handler)
+
+    return named_logger
+
+
+def configure_logging(config=None, log_file=None, level=None, log_format=None, force=False):
+    # explicit arguments win over config's logging.log_file / logging.log_level / logging.format ('text'|'json')
+    global _listener, _queue_handler
+    with _configure_lock:
+        if _listener is not None and not force:
+            return logger
+        shutdown_logging()
+        settings = config.get('logging') if config is not None else None
+        settings = settings or {}
+        log_file = log_file or settings.get('log_file') or DEFAULT_LOG_FILE
+        level = level or settings.get('log_level') or DEFAULT_LOG_LEVEL
+        log_format = log_format or settings.get('format') or 'text'
+
+        file_handler = logging.FileHandler(log_file, delay=True)
+        if log_format == 'json':
+            file_handler.setFormatter(JsonLinesFormatter())
+            # operation ids come from instrumentation spans, which only exist while it is enabled
+            instrumentation.enable()
+        else:
+            file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        records = queue.SimpleQueue()
+        _queue_handler = DeferredQueueHandler(records)
+        _queue_handler.addFilter(OperationContextFilter())
+        _listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+        _listener.start()
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+        logger.addHandler(_queue_handler)
+        return logger
+
+
+def shutdown_logging():
+    # stops the writer thread after it has drained the queue; also runs at interpreter exit
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logger.removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
 
-    return logger
 
-logger = setup_logger('vmware_logger', 'vmware.log')
+atexit.register(shutdown_logging)
@@ -0,0 +1,175 @@
+# core/metrics_collector.py
+# Periodic performance sampling through PerformanceManager.QueryPerf. Counter IDs are resolved once with
+# QueryPerfCounterByLevel, every query carries many entities and counters at once, and samples are
+# appended to a JSON-lines file so they can be lined up with test runs afterwards. Only the entities under
+# test are sampled: an explicit list or a name pattern, never the whole inventory of a shared vCenter.
+
+import fnmatch
+import json
+import threading
+import time
+
+from pyVmomi import vim
+from core.inventory_cache import InventoryCache
+from core.logger import logger
+
+REALTIME_INTERVAL = 20
+DEFAULT_COLLECT_INTERVAL = 300
+DEFAULT_MAX_QUERY_METRICS = 64
+DEFAULT_OUTPUT_FILE = "perf_metrics.jsonl"
+DEFAULT_COUNTERS = [
+    'cpu.ready.summation',
+    'mem.active.average',
+    'datastore.totalReadLatency.average',
+    'datastore.totalWriteLatency.average',
+    'net.usage.average',
+]
+# counters sampled per instance ('*': one series per datastore, vCPU, NIC...); the rest only as the
+# entity-wide aggregate (''). The datastore latencies have no aggregate.
+DEFAULT_INSTANCES = {
+    'datastore.totalReadLatency.average': '*',
+    'datastore.totalWriteLatency.average': '*',
+}
+# series a '*' counter is assumed to expand to per entity until a query shows the real number
+DEFAULT_INSTANCES_PER_COUNTER = 4
+
+
+class PerfMetricsCollector:
+    def __init__(self, client, entities=None, counters=None, interval=None, output_file=None,
+                 max_query_metrics=None, name_pattern=None, instances=None, instances_per_counter=None):
+        # entities: managed objects (or a callable returning them) to sample; otherwise name_pattern (or
+        # metadata.entity_pattern), an fnmatch pattern over host and VM names such as 'test-vm-*', selects them.
+        # instances maps counter names to '' or '*' on top of DEFAULT_INSTANCES.
+        config = client.config
+        self.name_pattern = name_pattern or config.get('metadata.entity_pattern')
+        if entities is None and not self.name_pattern:
+            raise ValueError("PerfMetricsCollector needs entities or a name_pattern (metadata.entity_pattern)")
+        self.client = client
+        self.perf_manager = client.si.RetrieveContent().perfManager
+        self.inventory_cache = InventoryCache.for_client(client)
+        self.entities = entities
+        self.counters = counters or DEFAULT_COUNTERS
+        self.instances = dict(DEFAULT_INSTANCES, **(instances or {}))
+        self.interval = interval or config.get('metadata.collect_interval') or DEFAULT_COLLECT_INTERVAL
+        self.output_file = output_file or config.get('metadata.output_file') or DEFAULT_OUTPUT_FILE
+        # vCenter caps the series per QueryPerf call (config.vpxd.stats.maxQueryMetrics); a '*' metric counts
+        # as many series as it has instances
+        self.max_query_metrics = (max_query_metrics or config.get('metadata.max_query_metrics')
+                                  or DEFAULT_MAX_QUERY_METRICS)
+        self.instances_per_counter = (instances_per_counter or config.get('metadata.instances_per_counter')
+                                      or DEFAULT_INSTANCES_PER_COUNTER)
+        # counter id -> most series one entity returned for it, learned from the queries
+        self._series_per_counter = {}
+        self._counter_info = None
+        self._last_sample = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='perf-metrics', daemon=True)
+        self._thread.start()
+        logger.info("Collecting performance metrics every %ss into %s", self.interval, self.output_file)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def collect_once(self):
+        counter_info = self._get_counter_info()
+        if not counter_info:
+            return 0
+        metric_ids = [vim.PerformanceManager.MetricId(counterId=counter_id, instance=self.instances.get(name, ''))
+                      for counter_id, (name, _) in counter_info.items()]
+        entities = self._get_entities()
+        max_samples = max(1, int(self.interval) // REALTIME_INTERVAL)
+        written = 0
+        with open(self.output_file, 'a') as output:
+            start = 0
+            while start < len(entities):
+                # re-sized every batch, as each answer refines the instance counts
+                per_query = max(1, self.max_query_metrics // self._series_per_entity(metric_ids))
+                specs = [vim.PerformanceManager.QuerySpec(entity=entity, metricId=metric_ids,
+                                                          intervalId=REALTIME_INTERVAL, maxSample=max_samples)
+                         for entity in entities[start:start + per_query]]
+                start += per_query
+                try:
+                    entity_metrics = self.perf_manager.QueryPerf(querySpec=specs)
+                except Exception as e:
+                    logger.error("Failed to query performance metrics: %s", e)
+                    continue
+                for entity_metric in entity_metrics or []:
+                    self._count_series(entity_metric)
+                    written += self._write_samples(output, entity_metric, counter_info)
+            output.flush()
+        return written
+
+    def _series_per_entity(self, metric_ids):
+        # an aggregate metric is one series; a '*' one as many as seen so far, or the configured guess
+        return sum(self._series_per_counter.get(metric_id.counterId, self.instances_per_counter)
+                   if metric_id.instance == '*' else 1 for metric_id in metric_ids) or 1
+
+    def _count_series(self, entity_metric):
+        counts = {}
+        for series in entity_metric.value:
+            counts[series.id.counterId] = counts.get(series.id.counterId, 0) + 1
+        for counter_id, count in counts.items():
+            self._series_per_counter[counter_id] = max(count, self._series_per_counter.get(counter_id, 0))
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.collect_once()
+            except Exception as e:
+                logger.error("Performance metrics collection failed: %s", e)
+            self._stop_event.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def _get_counter_info(self):
+        if self._counter_info is None:
+            wanted = set(self.counters)
+            self._counter_info = {}
+            for counter in self.perf_manager.QueryPerfCounterByLevel(level=4):
+                name = f"{counter.groupInfo.key}.{counter.nameInfo.key}.{counter.rollupType}"
+                if name in wanted:
+                    self._counter_info[counter.key] = (name, counter.unitInfo.key)
+            missing = wanted - {name for name, _ in self._counter_info.values()}
+            if missing:
+                logger.error("Performance counters not available: %s", ', '.join(sorted(missing)))
+        return self._counter_info
+
+    def _get_entities(self):
+        if self.entities is not None:
+            return list(self.entities() if callable(self.entities) else self.entities)
+        return [entity for entity in self.inventory_cache.get_hosts() + self.inventory_cache.get_vms()
+                if fnmatch.fnmatchcase(self.inventory_cache.get_name(entity) or '', self.name_pattern)]
+
+    def _write_samples(self, output, entity_metric, counter_info):
+        entity = entity_metric.entity
+        last = self._last_sample.get(entity._moId)
+        timestamps = [sample.timestamp for sample in entity_metric.sampleInfo]
+        fresh = [index for index, timestamp in enumerate(timestamps) if last is None or timestamp > last]
+        if not fresh:
+            return 0
+        self._last_sample[entity._moId] = timestamps[fresh[-1]]
+        entity_name = self.inventory_cache.get_name(entity)
+        written = 0
+        for series in entity_metric.value:
+            counter_name, unit = counter_info.get(series.id.counterId, (str(series.id.counterId), None))
+            for index in fresh:
+                if index >= len(series.value):
+                    break
+                output.write(json.dumps({
+                    "timestamp": timestamps[index].isoformat(),
+                    "entity": entity._moId,
+                    "entity_name": entity_name,
+                    "entity_type": type(entity).__name__.split('.')[-1],
+                    "counter": counter_name,
+                    "instance": series.id.instance,
+                    "value": series.value[index],
+                    "unit": unit,
+                }) + "\n")
+                written += 1
+        return written
@@ -0,0 +1,170 @@
+# core/migration_planner.py
+# Placement for bulk vMotion: draining a host, or levelling a cluster, from one snapshot of host capacity
+# and usage and of VM sizes (see MigrationController for the read). Pure bookkeeping, no vSphere calls:
+# every placement updates the in-memory host loads, so later decisions see the earlier ones. A host's load
+# is the larger of its CPU and memory utilization; powered-off VMs carry no demand and move as cold
+# relocations. Durations are estimated from the memory each running VM has to copy.
+
+import heapq
+
+DEFAULT_MAX_UTILIZATION = 0.85
+# what one vMotion stream gets on a 10GbE vMotion network, give or take
+DEFAULT_VMOTION_MB_PER_SECOND = 1000
+DEFAULT_VMOTION_OVERHEAD_SECONDS = 5
+DEFAULT_REBALANCE_TOLERANCE = 0.1
+DEFAULT_MAX_MOVES = 50
+
+
+class HostLoad:
+    def __init__(self, name, cluster, cpu_capacity, memory_capacity, cpu_used=0, memory_used=0, available=True):
+        # cpu in MHz, memory in MB; available is False for disconnected hosts and hosts in maintenance
+        self.name = name
+        self.cluster = cluster
+        self.cpu_capacity = cpu_capacity
+        self.memory_capacity = memory_capacity
+        self.cpu_used = cpu_used
+        self.memory_used = memory_used
+        self.available = available
+
+    @property
+    def utilization(self):
+        return max(self._share(self.cpu_used, self.cpu_capacity), self._share(self.memory_used, self.memory_capacity))
+
+    def utilization_with(self, vm):
+        return max(self._share(self.cpu_used + vm["cpu_mhz"], self.cpu_capacity),
+                   self._share(self.memory_used + vm["memory_demand_mb"], self.memory_capacity))
+
+    def fits(self, vm, max_utilization):
+        return self.utilization_with(vm) <= max_utilization
+
+    def add(self, vm):
+        self.cpu_used += vm["cpu_mhz"]
+        self.memory_used += vm["memory_demand_mb"]
+
+    def remove(self, vm):
+        # usage comes from quickStats and demand from the VM's configuration; never let the two go negative
+        self.cpu_used = max(0, self.cpu_used - vm["cpu_mhz"])
+        self.memory_used = max(0, self.memory_used - vm["memory_demand_mb"])
+
+    def as_dict(self):
+        return {"host": self.name, "cluster": self.cluster, "utilization": round(self.utilization, 4),
+                "cpu_used_mhz": self.cpu_used, "cpu_capacity_mhz": self.cpu_capacity,
+                "memory_used_mb": self.memory_used, "memory_capacity_mb": self.memory_capacity,
+                "available": self.available}
+
+    def _share(self, used, capacity):
+        return used / capacity if capacity else 1.0
+
+
+def vm_demand(name, host, cpu_mhz, memory_mb, powered_on):
+    # the VM record the planner works on; memory_mb is what vMotion copies, memory_demand_mb what it takes
+    return {"name": name, "host": host, "powered_on": powered_on, "memory_mb": memory_mb,
+            "cpu_mhz": cpu_mhz if powered_on else 0, "memory_demand_mb": memory_mb if powered_on else 0}
+
+
+def estimate_seconds(vm, mb_per_second=DEFAULT_VMOTION_MB_PER_SECOND,
+                     overhead_seconds=DEFAULT_VMOTION_OVERHEAD_SECONDS):
+    if not vm["powered_on"]:
+        return overhead_seconds
+    return overhead_seconds + vm["memory_mb"] / mb_per_second
+
+
+def plan_evacuation(hosts, vms, source, max_utilization=DEFAULT_MAX_UTILIZATION, **estimate):
+    # (moves, unplaced): every VM on source placed on the least loaded available host of its cluster that
+    # stays under max_utilization, largest memory first so the big VMs still find room
+    source_load = hosts[source]
+    targets = [load for load in hosts.values()
+               if load.name != source and load.cluster == source_load.cluster and load.available]
+    moves, unplaced, incoming = [], [], {}
+    for vm in sorted((vm for vm in vms if vm["host"] == source),
+                     key=lambda vm: (vm["memory_demand_mb"], vm["cpu_mhz"], vm["memory_mb"]), reverse=True):
+        candidates = [load for load in targets if load.fits(vm, max_utilization)]
+        if not candidates:
+            unplaced.append(vm["name"])
+            continue
+        # on equal load (powered-off VMs add none) the host receiving fewer migrations, to spread the vMotions
+        target = min(candidates, key=lambda load: (load.utilization_with(vm), incoming.get(load.name, 0)))
+        incoming[target.name] = incoming.get(target.name, 0) + 1
+        source_load.remove(vm)
+        target.add(vm)
+        moves.append(_move(vm, source_load, target, **estimate))
+    return moves, unplaced
+
+
+def plan_rebalance(hosts, vms, cluster, tolerance=DEFAULT_REBALANCE_TOLERANCE, max_moves=DEFAULT_MAX_MOVES,
+                   max_utilization=DEFAULT_MAX_UTILIZATION, **estimate):
+    # moves running VMs from the most to the least loaded host of cluster, each time picking the VM that
+    # narrows the gap between the two the most, until the spread is within tolerance or nothing helps
+    members = [load for load in hosts.values() if load.cluster == cluster and load.available]
+    by_host = {}
+    for vm in vms:
+        if vm["powered_on"]:
+            by_host.setdefault(vm["host"], []).append(vm)
+    moves = []
+    while len(members) > 1 and len(moves) < max_moves:
+        busiest = max(members, key=lambda load: load.utilization)
+        idlest = min(members, key=lambda load: load.utilization)
+        spread = busiest.utilization - idlest.utilization
+        if spread <= tolerance:
+            break
+        best, best_peak = None, busiest.utilization
+        for vm in by_host.get(busiest.name, ()):
+            if not idlest.fits(vm, max_utilization):
+                continue
+            busiest.remove(vm)
+            peak = max(busiest.utilization, idlest.utilization_with(vm))
+            busiest.add(vm)
+            if peak < best_peak:
+                best, best_peak = vm, peak
+        if best is None:
+            break
+        busiest.remove(best)
+        idlest.add(best)
+        by_host[busiest.name].remove(best)
+        # a VM moves at most once per plan
+        moves.append(_move(best, busiest, idlest, **estimate))
+    return moves
+
+
+def migration_limits(move, per_host_limit=None, per_cluster_limit=None):
+    # (key, limit) pairs for VMController._run_batch: the target and source host and the cluster a move
+    # occupies while it runs; a limit left unset does not constrain its keys
+    pairs = []
+    if per_host_limit:
+        pairs.append((('host', move["host_name"]), per_host_limit))
+        if move.get("source_host"):
+            pairs.append((('host', move["source_host"]), per_host_limit))
+    if per_cluster_limit and move.get("cluster"):
+        pairs.append((('cluster', move["cluster"]), per_cluster_limit))
+    return pairs
+
+
+def schedule(moves, per_host_limit=None, per_cluster_limit=None, max_in_flight=None):
+    # simulated makespan of running moves in order the way VMController.migrate_vms does: a move that would
+    # exceed a limit waits and later ones may overtake it
+    now, running, in_use = 0.0, [], {}
+    waiting = list(moves)
+    while waiting or running:
+        index = 0
+        while index < len(waiting) and (max_in_flight is None or len(running) < max_in_flight):
+            limits = migration_limits(waiting[index], per_host_limit, per_cluster_limit)
+            if all(in_use.get(key, 0) < max(1, limit) for key, limit in limits):
+                move = waiting.pop(index)
+                keys = [key for key, _ in limits]
+                for key in keys:
+                    in_use[key] = in_use.get(key, 0) + 1
+                heapq.heappush(running, (now + move["estimated_seconds"], id(move), keys))
+            else:
+                index += 1
+        now, _, keys = heapq.heappop(running)
+        for key in keys:
+            in_use[key] -= 1
+    return now
+
+
+def _move(vm, source, target, mb_per_second=DEFAULT_VMOTION_MB_PER_SECOND,
+          overhead_seconds=DEFAULT_VMOTION_OVERHEAD_SECONDS):
+    # shaped as a VMController.migrate_vms entry
+    return {"vm_name": vm["name"], "host_name": target.name, "source_host": source.name, "cluster": target.cluster,
+            "powered_on": vm["powered_on"], "memory_mb": vm["memory_mb"],
+            "estimated_seconds": estimate_seconds(vm, mb_per_second, overhead_seconds)}
@@ -0,0 +1,208 @@
+# core/report.py
+# Run report: one compact JSON line per controller operation (timing, SOAP calls, task, outcome), written
+# to report.report_file as the run goes; each run starts the file afresh, as it does the summary. Records
+# are buffered and written by a flusher thread every flush_interval seconds (or once buffer_records pile
+# up), and the per-operation summary is kept in constant-memory histograms, so a 100k-operation run never
+# holds its results in memory. Records come from instrumentation spans, so enabling the report enables
+# instrumentation.
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from core import instrumentation
+from core.stats import LatencyHistogram
+from core.logger import logger
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_BUFFER_RECORDS = 1000
+
+_writer = None
+_writer_lock = threading.Lock()
+# set in worker processes (see forward_to), which never open report_file themselves
+_forwarding = False
+_forward_sink = None
+
+
+class OperationSummary:
+    def __init__(self):
+        self.errors = 0
+        self.soap_calls = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, record):
+        self.errors += 0 if record["ok"] else 1
+        self.soap_calls += record.get("soap", 0)
+        self.latency.add(record["wall"])
+
+    def as_dict(self):
+        count = self.latency.count
+        return {"count": count, "errors": self.errors, "soap_calls_per_op": self.soap_calls / count if count else 0.0,
+                "latency": self.latency.summary()}
+
+
+def operation_record(span, wall_time, outcome):
+    record = {
+        "ts": round(span.started_at, 3),
+        "op": span.name,
+        "id": span.id,
+        "ok": outcome["ok"],
+        "wall": round(wall_time, 6),
+        "soap": span.soap_calls,
+        "soap_time": round(span.soap_time, 6),
+        "bytes": span.bytes_sent + span.bytes_received,
+    }
+    if span.parent is not None:
+        record["parent"] = span.parent.id
+    if "task" in span.tags:
+        record["task"] = span.tags["task"]
+    if not outcome["ok"] and outcome.get("error"):
+        record["error"] = outcome["error"]
+    return record
+
+
+class ReportWriter:
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL, buffer_records=DEFAULT_BUFFER_RECORDS,
+                 summary_path=None):
+        self.path = path
+        self.summary_path = summary_path or os.path.splitext(path)[0] + '.summary.json'
+        self.flush_interval = flush_interval
+        self.buffer_records = buffer_records
+        self.started_at = time.time()
+        # truncated so the records match the summary, which only ever covers this run
+        self._file = open(path, 'w')
+        self._buffer = []
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name='report-flusher', daemon=True)
+        self._flusher.start()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':'), default=str)
+        with self._lock:
+            self._buffer.append(line)
+            summary = self._summaries.get(record["op"])
+            if summary is None:
+                summary = self._summaries[record["op"]] = OperationSummary()
+            summary.add(record)
+            full = len(self._buffer) >= self.buffer_records
+        if full:
+            self.flush()
+
+    def record_operation(self, span, wall_time, outcome):
+        # instrumentation listener
+        self.write(operation_record(span, wall_time, outcome))
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        with self._write_lock:
+            if not self._file.closed:
+                self._file.write('\n'.join(lines) + '\n')
+                self._file.flush()
+
+    def summary(self):
+        with self._lock:
+            operations = {name: summary.as_dict() for name, summary in sorted(self._summaries.items())}
+        return {"report_file": self.path, "started_at": self.started_at, "finished_at": time.time(),
+                "operations": operations}
+
+    def close(self):
+        # flushes what is left, writes the summary next to the report and returns it
+        if self._closed.is_set():
+            return None
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        with self._write_lock:
+            self._file.close()
+        summary = self.summary()
+        with open(self.summary_path, 'w') as output:
+            json.dump(summary, output, indent=2)
+        return summary
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Failed to flush report %s: %s", self.path, e)
+
+
+def start(path, flush_interval=DEFAULT_FLUSH_INTERVAL, buffer_records=DEFAULT_BUFFER_RECORDS):
+    # makes a ReportWriter the process-wide sink for controller operations
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ReportWriter(path, flush_interval, buffer_records)
+            instrumentation.add_listener(_writer.record_operation)
+            instrumentation.enable()
+            atexit.register(stop)
+        return _writer
+
+
+def stop():
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is None:
+        return None
+    instrumentation.remove_listener(writer.record_operation)
+    return writer.close()
+
+
+def get_writer():
+    return _writer
+
+
+def forward_to(sink):
+    # for worker processes: sink(record) gets every operation record instead of a writer opening
+    # report_file, which would truncate the parent's and the siblings' records; the parent writes what
+    # it receives. With sink None the worker records nothing. Call before the first VMwareClient.
+    global _forwarding, _forward_sink
+    with _writer_lock:
+        _forwarding, _forward_sink = True, sink
+    if sink is not None:
+        instrumentation.add_listener(_forward_operation)
+        instrumentation.enable()
+
+
+def _forward_operation(span, wall_time, outcome):
+    sink = _forward_sink
+    if sink is not None:
+        sink(operation_record(span, wall_time, outcome))
+
+
+def configure(config):
+    # report.enabled starts the writer on report.report_file; report.flush_interval and
+    # report.buffer_records tune how often it reaches the disk
+    if _writer is not None or _forwarding or not config.get('report.enabled'):
+        return
+    path = config.get('report.report_file')
+    if path:
+        start(path, config.get('report.flush_interval') or DEFAULT_FLUSH_INTERVAL,
+              config.get('report.buffer_records') or DEFAULT_BUFFER_RECORDS)
+
+
+def iter_records(path):
+    with open(path) as report_file:
+        for line in report_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def summarize(records):
+    # the end-of-run summary for any record stream, e.g. iter_records() of an earlier run
+    summaries = {}
+    for record in records:
+        summary = summaries.get(record["op"])
+        if summary is None:
+            summary = summaries[record["op"]] = OperationSummary()
+        summary.add(record)
+    return {"operations": {name: summary.as_dict() for name, summary in sorted(summaries.items())}}
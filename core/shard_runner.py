@@ -0,0 +1,248 @@
+# core/shard_runner.py
+# Runs a workload of model operations in a pool of worker processes, sharded by the endpoint each
+# operation targets, so SOAP (de)serialization for many hosts spreads over all cores instead of one GIL.
+# Every shard opens its own session in its worker -- by logging in, or from a clone ticket acquired by the
+# parent -- and streams one result per operation back through a queue while the parent aggregates them.
+
+import importlib
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from core import report
+from core.config import get_config
+from core.host_fanout import select_hosts
+from core.stats import summarize_latencies
+from core.logger import logger
+
+DEFAULT_START_METHOD = 'spawn'
+# model name -> (module, class, the endpoint its default client talks to)
+MODELS = {
+    'vm': ('models.vm_model', 'VMModel', 'esxi'),
+    'vswitch': ('models.vswitch_model', 'VSwitchModel', 'vcenter'),
+    'datastore': ('models.vdatastore_model', 'DatastoreModel', 'vcenter'),
+}
+# the vmware section's endpoints; any other target is a name from esxi_hosts
+ENDPOINTS = ('vcenter', 'esxi')
+
+_results = None
+
+
+def operation(model, method, *args, target=None, **kwargs):
+    # one workload entry: method of the model's controller, called with args/kwargs on target
+    # ('vcenter', 'esxi' or an esxi_hosts name; None means the model's default endpoint)
+    if model not in MODELS:
+        raise ValueError(f"Unknown model {model!r}, expected one of {sorted(MODELS)}")
+    return {"model": model, "method": method, "args": list(args), "kwargs": kwargs, "target": target}
+
+
+def on_hosts(model, method, *args, hosts=None, **kwargs):
+    # the same operation once per configured ESXi host matched by hosts (see host_fanout.select_hosts)
+    return [operation(model, method, *args, target=host['name'], **kwargs)
+            for host in select_hosts(get_config(), hosts)]
+
+
+def _target(entry):
+    return entry.get("target") or MODELS[entry["model"]][2]
+
+
+def _make_client(target):
+    from core.vmware_client import VMwareClient
+    if target in ENDPOINTS:
+        return VMwareClient(target)
+    return VMwareClient('esxi', host_name=target)
+
+
+def _init_worker(results, initializer, initargs, forward_report):
+    global _results
+    _results = results
+    # the parent owns report_file; records travel back with the results instead
+    report.forward_to(_forward_record if forward_report else None)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _forward_record(record):
+    _results.put(("record", None, None, dict(record, pid=os.getpid()), None))
+
+
+def _run_shard(shard, target, entries, clone_ticket):
+    # entries: (index, operation) pairs; every result goes to the parent as soon as it is known
+    client, adopted, models = None, None, {}
+    try:
+        try:
+            if isinstance(clone_ticket, Exception):
+                raise clone_ticket
+            client = _make_client(target)
+            if clone_ticket is not None:
+                adopted = client.pool.adopt_clone_ticket(client.host, client.user, client.port, clone_ticket,
+                                                         client.disable_ssl_cert_verify)
+        except Exception as e:
+            for index, _ in entries:
+                _results.put(("result", shard, index, {"status": False, "message": str(e)}, 0.0))
+            return
+        for index, entry in entries:
+            started = time.monotonic()
+            try:
+                model = models.get(entry["model"])
+                if model is None:
+                    module, class_name, _ = MODELS[entry["model"]]
+                    model = models[entry["model"]] = getattr(importlib.import_module(module), class_name)(
+                        client=client)
+                # the controller method rather than the model's, so results stay status dicts, not text
+                result = getattr(model.controller, entry["method"])(*entry["args"], **entry["kwargs"])
+            except Exception as e:
+                result = {"status": False, "message": str(e)}
+            _results.put(("result", shard, index, result, time.monotonic() - started))
+    finally:
+        for model in models.values():
+            model.close()
+        if client is not None:
+            client.disconnect()
+        if adopted is not None:
+            client.pool.release(adopted)
+        _results.put(("done", shard, None, None, None))
+
+
+class ShardRunner:
+    def __init__(self, max_processes=None, shards_per_target=None, use_clone_tickets=None, start_method=None,
+                 initializer=None, initargs=()):
+        # initializer runs once in every worker process before any shard, e.g. to install a session pool
+        config = get_config()
+        self.max_processes = max_processes or config.get('sharding.max_processes') or os.cpu_count() or 1
+        self.shards_per_target = shards_per_target or config.get('sharding.shards_per_target') or 1
+        self.use_clone_tickets = (use_clone_tickets if use_clone_tickets is not None
+                                  else bool(config.get('sharding.use_clone_tickets')))
+        self.start_method = start_method or config.get('sharding.start_method') or DEFAULT_START_METHOD
+        self.initializer = initializer
+        self.initargs = initargs
+
+    def plan(self, workload):
+        # [(target, [(index, operation), ...]), ...]: operations grouped by endpoint, each group dealt
+        # round-robin into shards_per_target shards so one busy endpoint can still use several cores
+        by_target = {}
+        for index, entry in enumerate(workload):
+            by_target.setdefault(_target(entry), []).append((index, entry))
+        shards = []
+        for target, entries in by_target.items():
+            count = min(self.shards_per_target, len(entries))
+            shards.extend((target, entries[offset::count]) for offset in range(count))
+        return shards
+
+    def run(self, workload, on_result=None):
+        # on_result(index, operation, result, elapsed) is called in the parent as results stream in
+        workload = list(workload)
+        shards = self.plan(workload)
+        if not shards:
+            return {"status": True, "message": "Empty workload", "data": {"results": [], "stats": {}}}
+        # the parent's sessions stay logged in until the workers are done: a ticket dies with its session
+        ticket_clients = {}
+        # start the report writer here if it is enabled, so the workers have somewhere to send records
+        report.configure(get_config())
+        try:
+            tickets = (self._clone_tickets(shards, ticket_clients) if self.use_clone_tickets
+                       else [None] * len(shards))
+            results, elapsed = self._run_shards(workload, shards, tickets, on_result)
+        finally:
+            for client in ticket_clients.values():
+                client.disconnect()
+
+        results = [result for result in results if result is not None]
+        succeeded = sum(1 for result in results if result["status"])
+        targets = {}
+        for result in results:
+            counts = targets.setdefault(result["target"], {"total": 0, "succeeded": 0})
+            counts["total"] += 1
+            counts["succeeded"] += 1 if result["status"] else 0
+        stats = {
+            "total": len(workload),
+            "succeeded": succeeded,
+            "failed": len(workload) - succeeded,
+            "shards": len(shards),
+            "processes": min(self.max_processes, len(shards)),
+            "elapsed": elapsed,
+            "throughput": len(results) / elapsed if elapsed > 0 else 0.0,
+            "latency": summarize_latencies([result["elapsed"] for result in results]),
+            "targets": targets,
+        }
+        message = (f"{succeeded}/{len(workload)} operations succeeded on {len(targets)} endpoints in "
+                   f"{elapsed:.1f}s ({stats['throughput']:.1f} ops/s, {stats['processes']} processes)")
+        logger.info(message)
+        return {"status": succeeded == len(workload), "message": message,
+                "data": {"results": results, "stats": stats}}
+
+    def _run_shards(self, workload, shards, tickets, on_result):
+        context = multiprocessing.get_context(self.start_method)
+        results_queue = context.Queue()
+        results = [None] * len(workload)
+        started = time.monotonic()
+        with ProcessPoolExecutor(min(self.max_processes, len(shards)), mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(results_queue, self.initializer, self.initargs,
+                                           report.get_writer() is not None)) as executor:
+            futures = {executor.submit(_run_shard, shard, target, entries, ticket): shard
+                       for shard, ((target, entries), ticket) in enumerate(zip(shards, tickets))}
+            pending = set(futures.values())
+            while pending:
+                try:
+                    kind, shard, index, result, elapsed = results_queue.get(timeout=0.5)
+                except queue.Empty:
+                    # a worker that died never reports done; fail whatever its shard left unanswered
+                    for future, shard in futures.items():
+                        if shard in pending and future.done() and future.exception() is not None:
+                            self._fail_shard(shards[shard], results, future.exception())
+                            pending.discard(shard)
+                    continue
+                if kind == "done":
+                    pending.discard(shard)
+                    continue
+                if kind == "record":
+                    self._write_record(result)
+                    continue
+                target = shards[shard][0]
+                results[index] = {"index": index, "target": target, "model": workload[index]["model"],
+                                  "method": workload[index]["method"], "status": bool(result.get("status")),
+                                  "message": result.get("message"), "elapsed": elapsed, "result": result}
+                if not result.get("status"):
+                    logger.error("%s.%s on %s failed: %s", workload[index]["model"], workload[index]["method"],
+                                 target, result.get("message"))
+                if on_result is not None:
+                    on_result(index, workload[index], result, elapsed)
+        return results, time.monotonic() - started
+
+    def _write_record(self, record):
+        writer = report.get_writer()
+        if writer is None:
+            return
+        # span ids count up per process; qualify them so records of different workers stay apart
+        pid = record.pop("pid")
+        record["id"] = f"{pid}.{record['id']}"
+        if "parent" in record:
+            record["parent"] = f"{pid}.{record['parent']}"
+        writer.write(record)
+
+    def _clone_tickets(self, shards, clients):
+        # one single-use ticket per shard, from this process's pooled session to the shard's endpoint; a
+        # target that cannot be reached is handed to its shard as the error, failing only that shard
+        tickets = []
+        for target, _ in shards:
+            try:
+                client = clients.get(target)
+                if client is None:
+                    client = clients[target] = _make_client(target)
+                tickets.append(client.acquire_clone_ticket())
+            except Exception as e:
+                logger.error("Failed to get a clone ticket for %s: %s", target, e)
+                tickets.append(e)
+        return tickets
+
+    def _fail_shard(self, shard, results, error):
+        target, entries = shard
+        logger.error("Worker for %s died: %s", target, error)
+        for index, entry in entries:
+            if results[index] is None:
+                results[index] = {"index": index, "target": target, "model": entry["model"],
+                                  "method": entry["method"], "status": False, "message": str(error),
+                                  "elapsed": 0.0, "result": None}
@@ -0,0 +1,234 @@
+# core/task_analytics.py
+# Where the time of every vSphere task goes. A hook on the SOAP stub notes when each *_Task call was made
+# and returned; TaskWaiter reports when the framework saw the task finish; TaskInfo adds vCenter's own
+# queueTime/startTime/completeTime. Per operation (the *_Task method) the latency then splits into
+# client overhead (submission round trip, throttling, noticing completion), server queueing and execution.
+# Related events are read in bulk afterwards through one EventHistoryCollector, limited to the span of the
+# recorded tasks, and matched by chainId. Task and chain ids are only unique per server, so records are
+# keyed by the server too.
+
+import datetime
+import threading
+import time
+
+from core.stats import LatencyHistogram
+from core.logger import logger
+
+DEFAULT_MAX_RECORDS = 10000
+DEFAULT_EVENT_PAGE_SIZE = 1000
+# how long after a task's completeTime its last events may still be logged
+EVENT_MARGIN_SECONDS = 60
+# submissions whose task was never waited for are dropped beyond this many
+MAX_PENDING_SUBMISSIONS = 10000
+COMPONENTS = ('client', 'queue', 'run')
+VERDICTS = {'client': "client overhead (harness)", 'queue': "server queueing (vCenter)",
+            'run': "execution (hosts/storage)"}
+
+_enabled = False
+_configured = False
+_max_records = DEFAULT_MAX_RECORDS
+_submissions = {}
+_operations = {}
+_records = []
+_lock = threading.Lock()
+
+
+class OperationTimings:
+    def __init__(self):
+        self.failed = 0
+        self.client_total = LatencyHistogram()
+        self.submit = LatencyHistogram()
+        self.client = LatencyHistogram()
+        self.queue = LatencyHistogram()
+        self.run = LatencyHistogram()
+
+    def add(self, record):
+        self.failed += 0 if record["ok"] else 1
+        for name in ('client_total', 'submit', 'client', 'queue', 'run'):
+            if record[name] is not None:
+                getattr(self, name).add(record[name])
+
+    def as_dict(self):
+        means = {name: getattr(self, name).summary()["mean"] or 0.0 for name in COMPONENTS}
+        total = sum(means.values())
+        shares = {name: mean / total if total else 0.0 for name, mean in means.items()}
+        return {
+            "count": self.client_total.count,
+            "failed": self.failed,
+            "client_total": self.client_total.summary(),
+            "submit": self.submit.summary(),
+            "client": self.client.summary(),
+            "queue": self.queue.summary(),
+            "run": self.run.summary(),
+            "shares": shares,
+            "bottleneck": VERDICTS[max(shares, key=shares.get)] if total else None,
+        }
+
+
+def configure(config):
+    # task_analytics.enabled turns recording on; task_analytics.max_records bounds the per-task records
+    # kept for event correlation (the per-operation timings are constant-memory histograms)
+    global _configured, _max_records
+    if _configured:
+        return
+    _configured = True
+    _max_records = config.get('task_analytics.max_records') or DEFAULT_MAX_RECORDS
+    if config.get('task_analytics.enabled'):
+        enable()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _submissions.clear()
+        _operations.clear()
+        del _records[:]
+
+
+def install(si):
+    # outermost hook on the stub, so the submission time includes client-side throttling; idempotent
+    stub = getattr(si._stub, 'soapStub', si._stub)
+    if getattr(stub, '_vmware_task_analytics', False):
+        return
+    stub._vmware_task_analytics = True
+    invoke_method = stub.InvokeMethod
+
+    def InvokeMethod(mo, info, args, outerStub=None):
+        if not _enabled or not info.wsdlName.endswith('_Task'):
+            return invoke_method(mo, info, args, outerStub)
+        started = time.monotonic()
+        result = invoke_method(mo, info, args, outerStub)
+        task = result
+        if outerStub is not None and outerStub is not stub:
+            # a session stub gets (status, obj) back; a fault is no submission
+            status, obj = result
+            task = obj if status == 200 else None
+        if getattr(task, '_moId', None) is not None:
+            with _lock:
+                if len(_submissions) >= MAX_PENDING_SUBMISSIONS:
+                    del _submissions[next(iter(_submissions))]
+                _submissions[(server, task._moId)] = (info.wsdlName, started, time.monotonic())
+        return result
+
+    server = server_key(stub)
+    stub.InvokeMethod = InvokeMethod
+
+
+def server_key(stub):
+    # the endpoint a stub talks to (host:port of the SoapStubAdapter); stubs without one stand for themselves
+    stub = getattr(stub, 'soapStub', stub)
+    return getattr(stub, 'host', None) or stub
+
+
+def task_completed(result):
+    # called by TaskWaiter with the TaskResult of every task it saw finish
+    if not _enabled:
+        return
+    server = server_key(result.task._stub)
+    with _lock:
+        submission = _submissions.pop((server, result.key), None)
+    if submission is None:
+        # submitted before analytics was enabled, or through a stub without the hook
+        return
+    method, started, returned = submission
+    queue, run = result.queued_seconds, result.run_seconds
+    client_total = result.completed_at - started
+    server_total = queue + run if queue is not None and run is not None else None
+    record = {
+        "task": result.key,
+        "server": server,
+        "operation": method,
+        "ok": result.succeeded,
+        "chain_id": result.event_chain_id,
+        "queue_time": result.queue_time,
+        "complete_time": result.complete_time,
+        "client_total": client_total,
+        "submit": returned - started,
+        # the two clocks differ, but durations on each are comparable; clamp the odd rounding below zero
+        "client": max(0.0, client_total - server_total) if server_total is not None else None,
+        "queue": queue,
+        "run": run,
+    }
+    with _lock:
+        timings = _operations.get(method)
+        if timings is None:
+            timings = _operations[method] = OperationTimings()
+        timings.add(record)
+        _records.append(record)
+        if len(_records) > _max_records:
+            del _records[:len(_records) - _max_records]
+
+
+def get_records():
+    with _lock:
+        return list(_records)
+
+
+def collect_events(si, records, page_size=DEFAULT_EVENT_PAGE_SIZE):
+    # {chain_id: [event, ...]} for the tasks si's server ran in records, read page by page through one
+    # EventHistoryCollector from the first task's queueTime to the last completeTime plus a margin
+    from pyVmomi import vim
+
+    server = server_key(si._stub)
+    records = [record for record in records if record.get("server") == server]
+    queued = [record["queue_time"] for record in records if record["queue_time"] is not None]
+    completed = [record["complete_time"] for record in records if record.get("complete_time") is not None]
+    chains = {record["chain_id"] for record in records if record["chain_id"] is not None}
+    if not queued or not chains:
+        return {}
+    # completion events are logged a little after the task's completeTime
+    time_filter = vim.event.EventFilterSpec.ByTime(
+        beginTime=min(queued),
+        endTime=max(completed) + datetime.timedelta(seconds=EVENT_MARGIN_SECONDS) if completed else None)
+    collector = si.content.eventManager.CreateCollectorForEvents(vim.event.EventFilterSpec(time=time_filter))
+    events = {}
+    try:
+        # a new collector sits on its latest page; read forward from the oldest event instead
+        collector.RewindCollector()
+        while True:
+            page = collector.ReadNextEvents(page_size)
+            if not page:
+                break
+            for event in page:
+                if event.chainId in chains:
+                    events.setdefault(event.chainId, []).append(event)
+    finally:
+        try:
+            collector.DestroyCollector()
+        except Exception as e:
+            logger.error("Failed to destroy event collector: %s", e)
+    return events
+
+
+def summarize(si=None, page_size=DEFAULT_EVENT_PAGE_SIZE):
+    # per-operation timing split; with si, also the related event types per operation and the last
+    # event message of each failed task
+    with _lock:
+        operations = {method: timings.as_dict() for method, timings in sorted(_operations.items())}
+        records = list(_records)
+    if si is not None and records:
+        events = collect_events(si, records, page_size)
+        for record in records:
+            related = events.get(record["chain_id"], [])
+            summary = operations[record["operation"]]
+            types = summary.setdefault("events", {})
+            for event in related:
+                name = type(event).__name__.rsplit('.', 1)[-1]
+                types[name] = types.get(name, 0) + 1
+            if not record["ok"] and related:
+                summary.setdefault("failures", []).append(
+                    {"task": record["task"], "message": related[-1].fullFormattedMessage})
+    return {"operations": operations}
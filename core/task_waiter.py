@@ -0,0 +1,263 @@
+# core/task_waiter.py
+# Event-driven task completion. All tasks registered with a waiter share one private PropertyCollector;
+# each watch() call adds one filter on info.state/info.progress/info.error/info.result for its tasks and
+# whichever caller is waiting blocks in WaitForUpdatesEx on behalf of everybody else.
+
+import math
+import threading
+import time
+
+from pyVmomi import vim, vmodl
+from core import task_analytics
+from core.logger import logger
+
+DEFAULT_TASK_TIMEOUT = 3600
+TASK_PROPERTIES = {
+    'info.state': 'state',
+    'info.progress': 'progress',
+    'info.error': 'error',
+    'info.result': 'result',
+    'info.queueTime': 'queue_time',
+    'info.startTime': 'start_time',
+    'info.completeTime': 'complete_time',
+    'info.eventChainId': 'event_chain_id',
+}
+
+
+class TaskError(Exception):
+    def __init__(self, result):
+        self.result = result
+        message = getattr(result.error, 'msg', None) or str(result.error)
+        super().__init__(f"Task {result.key} failed: {message}")
+
+
+class TaskTimeout(Exception):
+    def __init__(self, results):
+        self.results = results
+        pending = [result.key for result in results if not result.done]
+        super().__init__(f"Timed out waiting for tasks: {', '.join(pending)}")
+
+
+class TaskResult:
+    def __init__(self, task):
+        self.task = task
+        self.key = task._moId
+        self.state = None
+        self.progress = None
+        self.error = None
+        self.result = None
+        self.queue_time = None
+        self.start_time = None
+        self.complete_time = None
+        self.event_chain_id = None
+        self.submitted_at = time.monotonic()
+        self.completed_at = None
+
+    @property
+    def done(self):
+        return self.state in (vim.TaskInfo.State.success, vim.TaskInfo.State.error)
+
+    @property
+    def succeeded(self):
+        return self.state == vim.TaskInfo.State.success
+
+    @property
+    def elapsed(self):
+        return (self.completed_at or time.monotonic()) - self.submitted_at
+
+    @property
+    def queued_seconds(self):
+        # time vCenter held the task before running it, from its own clock; None until it started
+        if self.queue_time is None or self.start_time is None:
+            return None
+        return (self.start_time - self.queue_time).total_seconds()
+
+    @property
+    def run_seconds(self):
+        if self.start_time is None or self.complete_time is None:
+            return None
+        return (self.complete_time - self.start_time).total_seconds()
+
+
+class TaskWaiter:
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, client):
+        key = (client.host, client.port, client.user)
+        with cls._instances_lock:
+            waiter = cls._instances.get(key)
+            if waiter is None or waiter.si is not client.si:
+                waiter = cls(client.si)
+                cls._instances[key] = waiter
+                client.on_disconnect(waiter.close)
+            return waiter
+
+    def __init__(self, si, max_wait_seconds=30):
+        self.si = si
+        self.max_wait_seconds = max_wait_seconds
+        self._collector = None
+        self._version = ''
+        self._entries = {}
+        self._callbacks = {}
+        self._filters = {}
+        self._polling = False
+        self._cond = threading.Condition()
+
+    def watch(self, tasks, on_progress=None):
+        entries, new_entries = [], []
+        with self._cond:
+            for task in tasks:
+                entry = self._entries.get(task._moId)
+                if entry is None:
+                    entry = self._entries[task._moId] = TaskResult(task)
+                    new_entries.append(entry)
+                if on_progress:
+                    self._callbacks.setdefault(entry.key, []).append(on_progress)
+                entries.append(entry)
+        if new_entries:
+            object_specs = [vmodl.query.PropertyCollector.ObjectSpec(obj=entry.task, skip=False)
+                            for entry in new_entries]
+            prop_spec = vmodl.query.PropertyCollector.PropertySpec(
+                type=vim.Task, pathSet=list(TASK_PROPERTIES), all=False)
+            filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=object_specs, propSet=[prop_spec])
+            task_filter = self._get_collector().CreateFilter(filter_spec, True)
+            with self._cond:
+                self._filters[task_filter._moId] = (task_filter, {entry.key for entry in new_entries})
+        return entries
+
+    def wait(self, tasks, timeout=DEFAULT_TASK_TIMEOUT, on_progress=None, raise_on_error=False):
+        entries = self.watch(tasks, on_progress)
+        finished = self._wait_until(lambda: all(entry.done for entry in entries), timeout)
+        self.forget(entries)
+        if not finished:
+            raise TaskTimeout(entries)
+        if raise_on_error:
+            for entry in entries:
+                if not entry.succeeded:
+                    raise TaskError(entry)
+        return entries
+
+    def wait_one(self, task, timeout=DEFAULT_TASK_TIMEOUT, on_progress=None):
+        return self.wait([task], timeout, on_progress, raise_on_error=True)[0]
+
+    def wait_any(self, tasks, timeout=DEFAULT_TASK_TIMEOUT, on_progress=None):
+        # returns the finished subset of tasks, or an empty list if none finished before the timeout
+        entries = self.watch(tasks, on_progress)
+        self._wait_until(lambda: any(entry.done for entry in entries), timeout)
+        done = [entry for entry in entries if entry.done]
+        self.forget(done)
+        return done
+
+    def forget(self, entries):
+        released = []
+        with self._cond:
+            for entry in entries:
+                if self._entries.get(entry.key) is entry:
+                    del self._entries[entry.key]
+                    self._callbacks.pop(entry.key, None)
+                    if not entry.done:
+                        released.extend(self._release_filter(entry.key))
+        self._destroy_filters(released)
+
+    def unwatch(self, tasks):
+        with self._cond:
+            entries = [self._entries[task._moId] for task in tasks if task._moId in self._entries]
+        self.forget(entries)
+
+    def close(self):
+        with self._cond:
+            filters = [task_filter for task_filter, _ in self._filters.values()]
+            self._filters.clear()
+            self._entries.clear()
+            self._callbacks.clear()
+        for managed_object in filters + [self._collector]:
+            try:
+                if managed_object:
+                    managed_object.Destroy()
+            except Exception as e:
+                logger.error("Failed to destroy task waiter object: %s", e)
+        self._collector = None
+        self._version = ''
+
+    def _get_collector(self):
+        with self._cond:
+            if self._collector is None:
+                self._collector = self.si.RetrieveContent().propertyCollector.CreatePropertyCollector()
+            return self._collector
+
+    def _wait_until(self, ready, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if ready():
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if self._polling:
+                    # another caller is inside WaitForUpdatesEx and will notify us when it returns
+                    self._cond.wait(remaining)
+                    continue
+                self._polling = True
+            try:
+                wait_seconds = self.max_wait_seconds
+                if remaining is not None:
+                    wait_seconds = min(wait_seconds, int(math.ceil(remaining)))
+                self._poll(wait_seconds)
+            finally:
+                with self._cond:
+                    self._polling = False
+                    self._cond.notify_all()
+
+    def _poll(self, wait_seconds):
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=wait_seconds)
+        update = self._get_collector().WaitForUpdatesEx(self._version, options)
+        if update is None:
+            return
+        progress_events, finished_filters, completed = [], [], []
+        with self._cond:
+            self._version = update.version
+            for filter_update in update.filterSet:
+                for object_update in filter_update.objectSet:
+                    entry = self._entries.get(object_update.obj._moId)
+                    if entry is None:
+                        continue
+                    previous_progress = entry.progress
+                    for change in object_update.changeSet:
+                        value = change.val if change.op == 'assign' else None
+                        setattr(entry, TASK_PROPERTIES[change.name], value)
+                    if entry.done and entry.completed_at is None:
+                        entry.completed_at = time.monotonic()
+                        finished_filters.extend(self._release_filter(entry.key))
+                        completed.append(entry)
+                    elif entry.progress == previous_progress:
+                        continue
+                    progress_events.append((entry, list(self._callbacks.get(entry.key, ()))))
+        for entry in completed:
+            task_analytics.task_completed(entry)
+        for entry, callbacks in progress_events:
+            for callback in callbacks:
+                try:
+                    callback(entry)
+                except Exception as e:
+                    logger.error("Task progress callback failed for %s: %s", entry.key, e)
+        self._destroy_filters(finished_filters)
+
+    def _destroy_filters(self, task_filters):
+        for task_filter in task_filters:
+            try:
+                task_filter.Destroy()
+            except Exception as e:
+                logger.error("Failed to destroy task filter: %s", e)
+
+    def _release_filter(self, key):
+        for filter_key, (task_filter, pending) in list(self._filters.items()):
+            if key in pending:
+                pending.discard(key)
+                if not pending:
+                    del self._filters[filter_key]
+                    return [task_filter]
+                return []
+        return []
@@ -0,0 +1,194 @@
+# core/throttle.py
+# Client-side pacing and retries for every SOAP call, shared by all sessions to the same endpoint.
+# A token bucket caps API calls per second and a second one caps task submissions (*_Task methods), so
+# a wide bulk window queues on our side instead of drawing TooManyTasks / 503 from vCenter. Only faults
+# that guarantee the call was never processed (TooManyTasks, HTTP 503/429) are retried for any method, with
+# jittered exponential backoff; other transient faults, dropped connections and timeouts may come after
+# the server acted on the call, so they are only retried for read-only methods, where repeating is harmless.
+
+import http.client
+import random
+import socket
+import threading
+import time
+
+from core.logger import logger
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_CALL_BURST = 20
+DEFAULT_TASK_BURST = 10
+
+# matched by name so faults this pyVmomi release has no class for (TooManyTasks) are still recognised
+TRANSIENT_FAULTS = frozenset(['RequestCanceled', 'TooManyTasks', 'TaskInProgress', 'HostCommunication',
+                              'ServiceUnavailable'])
+TRANSIENT_HTTP_STATUSES = ('503', '502', '504', '429')
+# the subset rejected before vCenter did anything, safe to repeat even for a mutating *_Task call
+NOT_PROCESSED_FAULTS = frozenset(['TooManyTasks'])
+NOT_PROCESSED_HTTP_STATUSES = ('503', '429')
+READ_ONLY_METHODS = frozenset(['Fetch', 'RetrieveServiceContent', 'RetrieveProperties', 'RetrievePropertiesEx',
+                               'ContinueRetrievePropertiesEx', 'WaitForUpdatesEx', 'CurrentTime',
+                               'QueryPerf', 'QueryAvailablePerfMetric', 'QueryPerfProviderSummary',
+                               'QueryPerfCounter', 'ReadNextTasks', 'ReadNextEvents', 'ReadPreviousTasks',
+                               'ReadPreviousEvents'])
+# RequestCanceled is how these report CancelWaitForUpdates, the normal way to stop a watcher
+CANCELLABLE_METHODS = frozenset(['WaitForUpdatesEx', 'WaitForUpdates'])
+CONNECTION_ERRORS = (ConnectionError, socket.timeout, http.client.RemoteDisconnected,
+                     http.client.BadStatusLine)
+
+_settings = {}
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+class TokenBucket:
+    # rate tokens per second, up to burst saved up; a rate of 0/None never blocks
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # reserves a token and sleeps until it is due; returns the seconds waited
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class CallScheduler:
+    def __init__(self, endpoint, calls_per_second=None, call_burst=DEFAULT_CALL_BURST, tasks_per_second=None,
+                 task_burst=DEFAULT_TASK_BURST, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY):
+        self.endpoint = endpoint
+        self.calls = TokenBucket(calls_per_second, call_burst)
+        self.tasks = TokenBucket(tasks_per_second, task_burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats = {"calls": 0, "throttled": 0, "throttled_seconds": 0.0, "retries": 0, "give_ups": 0,
+                       "faults": {}}
+        self._lock = threading.Lock()
+
+    def call(self, method, invoke, returned_fault=None):
+        # method: the wsdl name, for choosing the buckets and whether a dropped connection may be retried;
+        # returned_fault(result) picks out a fault handed back rather than raised, which is retried alike
+        attempt = 0
+        while True:
+            waited = self.calls.acquire()
+            if method.endswith('_Task'):
+                waited += self.tasks.acquire()
+            self._count(waited)
+            try:
+                result = invoke()
+            except Exception as e:
+                error, raised = e, True
+            else:
+                error, raised = returned_fault(result) if returned_fault else None, False
+                if error is None:
+                    return result
+            reason = self._transient_reason(method, error)
+            if reason is None or attempt >= self.max_retries:
+                if reason is not None:
+                    self._count_fault(reason, give_up=True)
+                    logger.warning("Giving up on %s to %s after %d retries: %s", method, self.endpoint, attempt,
+                                   error)
+                if raised:
+                    raise error
+                return result
+            self._count_fault(reason)
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            attempt += 1
+            logger.debug("Retrying %s to %s in %.2fs (attempt %d, %s)", method, self.endpoint, delay,
+                         attempt, reason)
+            time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, faults=dict(self._stats["faults"]))
+
+    def _count(self, waited):
+        with self._lock:
+            self._stats["calls"] += 1
+            if waited:
+                self._stats["throttled"] += 1
+                self._stats["throttled_seconds"] += waited
+
+    def _count_fault(self, reason, give_up=False):
+        with self._lock:
+            self._stats["give_ups" if give_up else "retries"] += 1
+            self._stats["faults"][reason] = self._stats["faults"].get(reason, 0) + 1
+
+    def _transient_reason(self, method, error):
+        # pyVmomi names fault classes by their full vmodl path, e.g. 'vmodl.fault.RequestCanceled'
+        name = type(error).__name__.rsplit('.', 1)[-1]
+        read_only = method in READ_ONLY_METHODS
+        if name in TRANSIENT_FAULTS:
+            if name == 'RequestCanceled' and method in CANCELLABLE_METHODS:
+                return None
+            return name if read_only or name in NOT_PROCESSED_FAULTS else None
+        # before HTTPException: RemoteDisconnected and BadStatusLine are both
+        if isinstance(error, CONNECTION_ERRORS):
+            return name if read_only else None
+        if isinstance(error, http.client.HTTPException):
+            status = str(error)[:3]
+            if status in NOT_PROCESSED_HTTP_STATUSES or (read_only and status in TRANSIENT_HTTP_STATUSES):
+                return f"HTTP {status}"
+        return None
+
+
+def configure(config):
+    # the 'throttle' section: calls_per_second, call_burst, tasks_per_second, task_burst (rates of 0 or
+    # unset mean unlimited), max_retries, base_delay, max_delay; applies to schedulers created afterwards
+    settings = config.get('throttle') or {}
+    _settings.update({key: value for key, value in settings.items() if value is not None})
+
+
+def for_endpoint(host, port):
+    key = (host, port)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = _schedulers[key] = CallScheduler(f"{host}:{port}", **_settings)
+        return scheduler
+
+
+def install(si, host, port):
+    # routes every call on si through the endpoint's scheduler; idempotent per stub, and layered over
+    # instrumentation so each retry still counts as its own round trip there
+    stub = getattr(si._stub, 'soapStub', si._stub)
+    if getattr(stub, '_vmware_scheduler', None) is not None:
+        return stub._vmware_scheduler
+    scheduler = for_endpoint(host, port)
+    invoke_method = stub.InvokeMethod
+
+    def InvokeMethod(mo, info, args, outerStub=None):
+        # under a session stub (outerStub) the fault comes back in a (status, fault) pair, not raised
+        return scheduler.call(info.wsdlName, lambda: invoke_method(mo, info, args, outerStub),
+                              returned_fault if outerStub is not None and outerStub is not stub else None)
+
+    stub.InvokeMethod = InvokeMethod
+    stub._vmware_scheduler = scheduler
+    return scheduler
+
+
+def returned_fault(result):
+    # the fault of a (status, obj) pair SoapStubAdapter returns to its outer stub; None for a success
+    status, obj = result
+    return obj if status != 200 and isinstance(obj, Exception) else None
+
+
+def get_stats():
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {scheduler.endpoint: scheduler.stats() for scheduler in schedulers}
@@ -1,14 +1,207 @@
 # vmware_client.py
 
-from pyvim.connect import SmartConnect, Disconnect
-from pyVmomi import vim, vmodl
-from core.config import Config
-from core.logger import logger
+import atexit
+import threading
+
+from pyVim.connect import SmartStubAdapter, VimSessionOrientedStub, Disconnect
+from pyVmomi import vim
+from pyVmomi.SoapAdapter import StubAdapterBase
+from core import instrumentation, report, task_analytics, throttle
+from core.config import get_config
+from core.logger import logger, configure_logging
+
+DEFAULT_KEEPALIVE_INTERVAL = 300
+
+
+class SessionStub(VimSessionOrientedStub):
+    # VimSessionOrientedStub, minus its own resending: it repeats any call that hit a socket or HTTP error,
+    # mutating *_Task calls included, and on top of the throttle's retries. CallScheduler decides per method
+    # what may be repeated; all that is left here is logging back in once when the session expired.
+    def InvokeMethod(self, mo, info, args):
+        relogged = False
+        while True:
+            if self.state == self.STATE_UNAUTHENTICATED:
+                self._CallLoginMethod()
+            status, obj = self.soapStub.InvokeMethod(mo, info, args, self)
+            if status == 200:
+                return obj
+            if isinstance(obj, self.SESSION_EXCEPTIONS) and not relogged:
+                relogged = True
+                self._SetStateUnauthenticated()
+                continue
+            raise obj
+
+    def InvokeAccessor(self, mo, info):
+        # a property read goes through InvokeMethod (RetrieveContents), which handles the re-login
+        if self.state == self.STATE_UNAUTHENTICATED:
+            self._CallLoginMethod()
+        return StubAdapterBase.InvokeAccessor(self, mo, info)
+
+
+class Session:
+    def __init__(self, key, si, disable_ssl_cert_verify=False):
+        self.key = key
+        self.si = si
+        self.disable_ssl_cert_verify = disable_ssl_cert_verify
+        self.refcount = 0
+        self.close_callbacks = []
+
+
+class SessionPool:
+    # One logged-in ServiceInstance per (host, user, port), shared by every VMwareClient that asks for it.
+    # Sessions log out when the last borrower releases them, are pinged with CurrentTime() so vCenter does
+    # not expire them, and log back in transparently on NotAuthenticated through SessionStub.
+    _default = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def default(cls, keepalive_interval=None):
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(keepalive_interval or DEFAULT_KEEPALIVE_INTERVAL)
+                atexit.register(cls._default.close_all)
+            return cls._default
+
+    def __init__(self, keepalive_interval=DEFAULT_KEEPALIVE_INTERVAL):
+        self.keepalive_interval = keepalive_interval
+        self._sessions = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._keepalive_thread = None
+        self._stop_event = threading.Event()
+
+    def acquire(self, host, user, pwd, port, disable_ssl_cert_verify=False):
+        key = (host, user, port)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # logins to different endpoints proceed in parallel; only callers of the same endpoint serialize
+        with key_lock:
+            with self._lock:
+                session = self._sessions.get(key)
+            if session is None:
+                session = Session(key, self._login(host, user, pwd, port, disable_ssl_cert_verify),
+                                  disable_ssl_cert_verify)
+                instrumentation.instrument_stub(session.si)
+                throttle.install(session.si, host, port)
+                task_analytics.install(session.si)
+                logger.info("Opened pooled session to %s as %s", host, user)
+            with self._lock:
+                self._sessions[key] = session
+                session.refcount += 1
+                self._ensure_keepalive()
+        return session
+
+    def adopt_clone_ticket(self, host, user, port, ticket, disable_ssl_cert_verify=False):
+        # pools a session cloned from another process's login under (host, user, port), so clients for
+        # that endpoint in this process reuse it instead of logging in with the password
+        key = (host, user, port)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                session = self._sessions.get(key)
+            if session is None:
+                session = Session(key, self._clone_login(host, port, ticket, disable_ssl_cert_verify),
+                                  disable_ssl_cert_verify)
+                instrumentation.instrument_stub(session.si)
+                throttle.install(session.si, host, port)
+                task_analytics.install(session.si)
+                logger.info("Opened cloned session to %s as %s", host, user)
+            with self._lock:
+                self._sessions[key] = session
+                session.refcount += 1
+                self._ensure_keepalive()
+        return session
+
+    def release(self, session):
+        with self._lock:
+            session.refcount -= 1
+            if session.refcount > 0:
+                return
+            if self._sessions.get(session.key) is session:
+                del self._sessions[session.key]
+        self._close(session)
+
+    def close_all(self):
+        self._stop_event.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self._close(session)
+
+    def clone_session(self, session):
+        # a new, independent session for another thread or process without sending credentials again
+        ticket = session.si.content.sessionManager.AcquireCloneTicket()
+        host, _, port = session.key
+        return connect_with_clone_ticket(host, port, ticket, session.disable_ssl_cert_verify)
+
+    def _clone_login(self, host, port, ticket, disable_ssl_cert_verify):
+        return connect_with_clone_ticket(host, port, ticket, disable_ssl_cert_verify)
+
+    def _login(self, host, user, pwd, port, disable_ssl_cert_verify):
+        soap_stub = SmartStubAdapter(host=host, port=port, disableSslCertValidation=disable_ssl_cert_verify)
+        session_stub = SessionStub(soap_stub, SessionStub.makeUserLoginMethod(user, pwd))
+        si = vim.ServiceInstance('ServiceInstance', session_stub)
+        # the session stub logs in lazily; do it now so bad credentials fail in connect()
+        si.RetrieveContent()
+        return si
+
+    def _close(self, session):
+        for callback in session.close_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("Session close callback failed for %s: %s", session.key[0], e)
+        try:
+            Disconnect(session.si)
+            logger.info("Closed pooled session to %s", session.key[0])
+        except Exception as e:
+            logger.error("Failed to close session to %s: %s", session.key[0], e)
+
+    def _ensure_keepalive(self):
+        if self._keepalive_thread is None or not self._keepalive_thread.is_alive():
+            self._stop_event.clear()
+            self._keepalive_thread = threading.Thread(target=self._keepalive, name='session-keepalive', daemon=True)
+            self._keepalive_thread.start()
+
+    def _keepalive(self):
+        while not self._stop_event.wait(self.keepalive_interval):
+            with self._lock:
+                sessions = list(self._sessions.values())
+            for session in sessions:
+                try:
+                    session.si.CurrentTime()
+                except Exception as e:
+                    logger.error("Keepalive failed for %s: %s", session.key[0], e)
+
+
+def connect_with_clone_ticket(host, port, ticket, disable_ssl_cert_verify=False):
+    soap_stub = SmartStubAdapter(host=host, port=port, disableSslCertValidation=disable_ssl_cert_verify)
+    si = vim.ServiceInstance('ServiceInstance', soap_stub)
+    instrumentation.instrument_stub(si)
+    throttle.install(si, host, port)
+    task_analytics.install(si)
+    si.content.sessionManager.CloneSession(ticket)
+    return si
+
 
 class VMwareClient:
-    def __init__(self, connection_type='esxi'):
-        config = Config()
-        if connection_type == 'vcenter':
+    def __init__(self, connection_type='esxi', pool=None, host_name=None):
+        config = get_config()
+        self.config = config
+        configure_logging(config)
+        if connection_type == 'esxi' and host_name is not None:
+            # one of the standalone hosts listed under esxi_hosts
+            host_entry = config.get_esxi_host(host_name)
+            if host_entry is None:
+                raise ValueError(f"ESXi host {host_name} not found in configuration")
+            self.host = host_entry['host']
+            self.user = host_entry['user']
+            self.pwd = host_entry['password']
+            self.port = host_entry.get('port', 443)
+            self.disable_ssl_cert_verify = host_entry.get('disableSslCertValidation', True)
+        elif connection_type == 'vcenter':
             self.host = config.get('vmware.vcenter.host')
             self.user = config.get('vmware.vcenter.user')
             self.pwd = config.get('vmware.vcenter.password')
@@ -22,21 +215,59 @@ class VMwareClient:
             self.disable_ssl_cert_verify = config.get('vmware.esxi.disableSslCertValidation')
         else:
             raise ValueError("Invalid connection type")
-        self.si = None
+        self.pool = pool or SessionPool.default(config.get('vmware.keepalive_interval'))
+        instrumentation.configure(config)
+        report.configure(config)
+        throttle.configure(config)
+        task_analytics.configure(config)
+        self.session = None
+
+    @property
+    def si(self):
+        # logs in on first use, so building a client (and the controllers holding one) costs no round trip
+        if self.session is None:
+            self.connect()
+        return self.session.si
+
+    @property
+    def connected(self):
+        return self.session is not None
 
     def connect(self):
+        if self.session:
+            return
         try:
-            self.si = SmartConnect(host=self.host, user=self.user, pwd=self.pwd, port=self.port,
-                                   disableSslCertValidation=self.disable_ssl_cert_verify)
-            logger.info(f"Connected to VMware environment at {self.host}")
+            self.session = self.pool.acquire(self.host, self.user, self.pwd, self.port,
+                                             self.disable_ssl_cert_verify)
+            logger.info("Connected to VMware environment at %s", self.host)
         except Exception as e:
-            logger.error(f"Failed to connect to VMware environment at {self.host}: {str(e)}")
+            logger.error("Failed to connect to VMware environment at %s: %s", self.host, e)
             raise
 
     def disconnect(self):
-        if self.si:
-            Disconnect(self.si)
-            logger.info(f"Disconnected from VMware environment at {self.host}")
+        if self.session:
+            self.pool.release(self.session)
+            self.session = None
+            logger.info("Disconnected from VMware environment at %s", self.host)
+
+    def on_disconnect(self, callback):
+        # runs callback when the shared session is finally logged out, e.g. to stop a cache bound to it
+        self.connect()
+        self.session.close_callbacks.append(callback)
+
+    def acquire_clone_ticket(self):
+        return self.si.content.sessionManager.AcquireCloneTicket()
+
+    def clone_session(self):
+        self.connect()
+        return self.pool.clone_session(self.session)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disconnect()
 
     def _get_host_system(self):
         content = self.si.RetrieveContent()
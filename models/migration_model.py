@@ -0,0 +1,46 @@
+# models/migration_model.py
+
+from view.vm_view import OutputFormat
+
+
+class MigrationModel:
+    def __init__(self, per_host_limit=None, per_cluster_limit=None, client=None, connection_type='vcenter'):
+        self.connection_type = connection_type
+        self.client = client
+        self.per_host_limit = per_host_limit
+        self.per_cluster_limit = per_cluster_limit
+        self._controller = None
+
+    @property
+    def controller(self):
+        # lazy for the same reason as VMModel.controller
+        if self._controller is None:
+            from controller.migration_controller import MigrationController
+            self._controller = MigrationController(per_host_limit=self.per_host_limit,
+                                                   per_cluster_limit=self.per_cluster_limit, client=self.client,
+                                                   connection_type=self.connection_type)
+        return self._controller
+
+    def close(self):
+        if self._controller is not None:
+            self._controller.close()
+
+    def get_host_load(self, cluster_name=None):
+        result = self.controller.get_host_load(cluster_name)
+        return OutputFormat.format_data(result)
+
+    def plan_evacuation(self, host_name, max_utilization=None):
+        result = self.controller.plan_evacuation(host_name, max_utilization)
+        return OutputFormat.format_migration_plan(result)
+
+    def plan_rebalance(self, cluster_name, tolerance=None, max_moves=None):
+        result = self.controller.plan_rebalance(cluster_name, tolerance, max_moves)
+        return OutputFormat.format_migration_plan(result)
+
+    def evacuate_host(self, host_name, enter_maintenance=False, max_utilization=None, max_in_flight=None):
+        result = self.controller.evacuate_host(host_name, enter_maintenance, max_utilization, max_in_flight)
+        return OutputFormat.format_migrations(result)
+
+    def rebalance_cluster(self, cluster_name, tolerance=None, max_moves=None, max_in_flight=None):
+        result = self.controller.rebalance_cluster(cluster_name, tolerance, max_moves, max_in_flight)
+        return OutputFormat.format_migrations(result)
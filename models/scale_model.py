@@ -0,0 +1,24 @@
+# models/scale_model.py
+
+
+class ScaleModel:
+    def __init__(self, min_vms=None, max_vms=None, step=None):
+        self.min_vms = min_vms
+        self.max_vms = max_vms
+        self.step = step
+        self._controller = None
+
+    @property
+    def controller(self):
+        # lazy for the same reason as VMModel.controller
+        if self._controller is None:
+            from controller.scale_controller import ScaleController
+            self._controller = ScaleController(min_vms=self.min_vms, max_vms=self.max_vms, step=self.step)
+        return self._controller
+
+    def close(self):
+        if self._controller is not None:
+            self._controller.close()
+
+    def ramp(self, vm_spec, name_prefix='scale-vm', cleanup=True):
+        return self.controller.ramp(vm_spec, name_prefix, cleanup)
@@ -1,10 +1,23 @@
 # datastore.py
 
-from controller.vdatastore_controller import DatastoreController
 
 class DatastoreModel:
-    def __init__(self, connection_type='vcenter'):
-        self.controller = DatastoreController(connection_type)
+    def __init__(self, connection_type='vcenter', client=None):
+        self.connection_type = connection_type
+        self.client = client
+        self._controller = None
+
+    @property
+    def controller(self):
+        # lazy for the same reason as VMModel.controller
+        if self._controller is None:
+            from controller.vdatastore_controller import DatastoreController
+            self._controller = DatastoreController(self.connection_type, client=self.client)
+        return self._controller
+
+    def close(self):
+        if self._controller is not None:
+            self._controller.close()
 
     def create_datastore(self, datastore_name, capacity_gb, disk_path):
         return self.controller.create_datastore(datastore_name, capacity_gb, disk_path)
@@ -14,3 +27,27 @@ class DatastoreModel:
 
     def list_datastores(self):
         return self.controller.list_datastores()
+
+    def get_datastore_snapshot(self, refresh=False):
+        return self.controller.get_datastore_snapshot(refresh)
+
+    def pick_datastore(self, required_gb=0, datastore_type=None):
+        return self.controller.pick_datastore(required_gb, datastore_type)
+
+    def upload_files(self, transfers, verify=None):
+        return self.controller.upload_files(transfers, verify)
+
+    def download_files(self, transfers):
+        return self.controller.download_files(transfers)
+
+    def distribute_files(self, local_paths, datastore_names, remote_dir=''):
+        return self.controller.distribute_files(local_paths, datastore_names, remote_dir)
+
+    def create_datastore_on_hosts(self, datastore_name, capacity_gb, disk_path, hosts=None):
+        return self.controller.create_datastore_on_hosts(datastore_name, capacity_gb, disk_path, hosts)
+
+    def delete_datastore_on_hosts(self, datastore_name, hosts=None):
+        return self.controller.delete_datastore_on_hosts(datastore_name, hosts)
+
+    def list_datastores_on_hosts(self, hosts=None):
+        return self.controller.list_datastores_on_hosts(hosts)
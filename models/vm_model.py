@@ -1,15 +1,29 @@
 # models/vm_model.py
 
-from controller.vm_controller import VMController
 from view.vm_view import OutputFormat
 
 
 class VMModel:
-    def __init__(self):
-        self.controller = VMController()
+    def __init__(self, client=None):
+        # client: a VMwareClient for a specific endpoint, e.g. one shard of core/shard_runner.py
+        self.client = client
+        self._controller = None
 
-    def create_vm(self, name, template_name, datastore_name, cpu, memory, network):
-        result = self.controller.create_vm(name, template_name, datastore_name, cpu, memory, network)
+    @property
+    def controller(self):
+        # the controller module pulls in pyVmomi; import and build it on first use so importing or
+        # constructing the model stays cheap for callers that never reach vSphere
+        if self._controller is None:
+            from controller.vm_controller import VMController
+            self._controller = VMController(client=self.client)
+        return self._controller
+
+    def close(self):
+        if self._controller is not None:
+            self._controller.close()
+
+    def create_vm(self, name, template_name, datastore_name, cpu, memory, network, provisioning=None):
+        result = self.controller.create_vm(name, template_name, datastore_name, cpu, memory, network, provisioning)
         return OutputFormat.format_result(result)
 
     def edit_vm(self, vm_name, cpu=None, memory=None):
@@ -24,10 +38,30 @@ class VMModel:
         result = self.controller.migrate_vm(vm_name, host_name)
         return OutputFormat.format_result(result)
 
-    def get_vm_list(self):
-        result = self.controller.get_vm_list()
+    def create_vms(self, vm_specs, max_in_flight=None):
+        result = self.controller.create_vms(vm_specs, max_in_flight)
+        return OutputFormat.format_batch(result)
+
+    def edit_vms(self, vm_edits, max_in_flight=None):
+        result = self.controller.edit_vms(vm_edits, max_in_flight)
+        return OutputFormat.format_batch(result)
+
+    def delete_vms(self, vm_names, max_in_flight=None):
+        result = self.controller.delete_vms(vm_names, max_in_flight)
+        return OutputFormat.format_batch(result)
+
+    def migrate_vms(self, migrations, max_in_flight=None, per_host_limit=None, per_cluster_limit=None):
+        result = self.controller.migrate_vms(migrations, max_in_flight, per_host_limit, per_cluster_limit)
+        return OutputFormat.format_batch(result)
+
+    def get_vm_list(self, properties=None, predicate=None):
+        result = self.controller.get_vm_list(properties, predicate)
         return OutputFormat.format_data(result)
 
+    def get_task_analytics(self, include_events=True):
+        result = self.controller.get_task_analytics(include_events)
+        return OutputFormat.format_task_analytics(result)
+
     def get_vm_details(self, vm_name):
         result = self.controller.get_vm_details(vm_name)
         return OutputFormat.format_data(result)
@@ -1,11 +1,24 @@
 # models/vswitch.py
 
-from controller.vswitch_controller import VSwitchController
 from view.vswitch_view import OutputFormat
 
 class VSwitchModel:
-    def __init__(self, connection_type='vcenter'):
-        self.controller = VSwitchController(connection_type)
+    def __init__(self, connection_type='vcenter', client=None):
+        self.connection_type = connection_type
+        self.client = client
+        self._controller = None
+
+    @property
+    def controller(self):
+        # lazy for the same reason as VMModel.controller
+        if self._controller is None:
+            from controller.vswitch_controller import VSwitchController
+            self._controller = VSwitchController(self.connection_type, client=self.client)
+        return self._controller
+
+    def close(self):
+        if self._controller is not None:
+            self._controller.close()
 
     def create_vswitch(self, vswitch_name, num_ports=128, uplink_portgroup=None):
         return self.controller.create_vswitch(vswitch_name, num_ports, uplink_portgroup)
@@ -16,6 +29,21 @@ class VSwitchModel:
     def delete_vswitch(self, vswitch_name):
         return self.controller.delete_vswitch(vswitch_name)
 
+    def create_vswitch_on_hosts(self, vswitch_name, num_ports=128, uplink_portgroup=None, hosts=None):
+        return self.controller.create_vswitch_on_hosts(vswitch_name, num_ports, uplink_portgroup, hosts)
+
+    def update_vswitch_on_hosts(self, vswitch_name, num_ports=None, uplink_portgroup=None, hosts=None):
+        return self.controller.update_vswitch_on_hosts(vswitch_name, num_ports, uplink_portgroup, hosts)
+
+    def apply_network_config(self, desired, prune=False, dry_run=False):
+        return self.controller.apply_network_config(desired, prune, dry_run)
+
+    def apply_network_config_on_hosts(self, desired, prune=False, dry_run=False, hosts=None):
+        return self.controller.apply_network_config_on_hosts(desired, prune, dry_run, hosts)
+
+    def delete_vswitch_on_hosts(self, vswitch_name, hosts=None):
+        return self.controller.delete_vswitch_on_hosts(vswitch_name, hosts)
+
     def get_vswitch_list(self):
         result = self.controller.get_vswitch_list()
         return
@@ -1,12 +1,12 @@
 # sample_datastore_script.py
 
 from models.vdatastore_model import DatastoreModel
-from core.config import Config
+from core.config import get_config
 
 
 def main():
     # Load configuration
-    config = Config()
+    config = get_config()
     connection_type = 'esxi'  # or 'esxi'
 
     # Create DatastoreModel object
@@ -27,6 +27,8 @@ def main():
     result_delete = datastore_model.delete_datastore(datastore_name)
     print("Delete Datastore:", result_delete)
 
+    datastore_model.close()
+
 
 if __name__ == "__main__":
     main()
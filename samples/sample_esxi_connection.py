@@ -2,12 +2,12 @@
 import time
 
 from models.vswitch_model import VSwitchModel
-from core.config import Config
+from core.config import get_config
 
 
 def main():
     # Load configuration
-    config = Config()
+    config = get_config()
 
     connection_type = 'esxi'  # or 'esxi'
 
@@ -23,6 +23,7 @@ def main():
         print("failed to create vswitch")
     time.sleep(10)
     vswitch_model.delete_vswitch(vswitch_name)
+    vswitch_model.close()
 
     # Print the result
     print(result)
@@ -0,0 +1,26 @@
+# sample_metrics.py
+
+import time
+
+from core.vmware_client import VMwareClient
+from core.metrics_collector import PerfMetricsCollector, REALTIME_INTERVAL
+
+
+def main():
+    client = VMwareClient('vcenter')
+    client.connect()
+
+    # Sample CPU ready, active memory, datastore latency and network usage for the test VMs only
+    collector = PerfMetricsCollector(client, name_pattern='test-vm-*', interval=REALTIME_INTERVAL)
+    print("Samples written:", collector.collect_once())
+
+    # Or keep sampling in the background while a test runs; three 20s rounds here
+    collector.start()
+    time.sleep(REALTIME_INTERVAL * 3)
+    collector.stop()
+
+    client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,3 +13,4 @@ result = vm_controller.create_vm(
     network="network_name"
 )
 print(OutputFormat.format_result(result))
+vm_controller.close()
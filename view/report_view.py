@@ -0,0 +1,59 @@
+# views/report_view.py
+# Renders a run report from its record stream (core/report.py): one line per record as it is read, and
+# the per-operation summary table at the end. Nothing is accumulated besides the summary histograms.
+#
+#   python -m view.report_view test_report.jsonl [--failures-only]
+
+import argparse
+import sys
+
+
+class ReportFormat:
+    @staticmethod
+    def format_record(record):
+        line = (f"{'OK   ' if record['ok'] else 'ERROR'} {record['op']:<40} {record['wall'] * 1000:>10.1f} ms "
+                f"{record.get('soap', 0):>5} SOAP")
+        if record.get('task'):
+            line += f"  {record['task']}"
+        if record.get('error'):
+            line += f"  {record['error']}"
+        return line
+
+    @staticmethod
+    def render(records, failures_only=False):
+        for record in records:
+            if not failures_only or not record['ok']:
+                yield ReportFormat.format_record(record)
+
+    @staticmethod
+    def format_summary(summary):
+        header = f"{'operation':<40} {'count':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} " \
+                 f"{'soap/op':>8}"
+        lines = [header, '-' * len(header)]
+        for name, operation in summary['operations'].items():
+            latency = operation['latency']
+            lines.append(f"{name:<40} {operation['count']:>7} {operation['errors']:>6} "
+                         f"{(latency['p50'] or 0) * 1000:>9.1f} {(latency['p95'] or 0) * 1000:>9.1f} "
+                         f"{(latency['p99'] or 0) * 1000:>9.1f} {operation['soap_calls_per_op']:>8.1f}")
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    from core.report import iter_records, summarize
+
+    parser = argparse.ArgumentParser(description="Render a JSON-lines run report")
+    parser.add_argument("report_file")
+    parser.add_argument("--failures-only", action='store_true')
+    parser.add_argument("--summary-only", action='store_true')
+    args = parser.parse_args(argv)
+
+    if not args.summary_only:
+        for line in ReportFormat.render(iter_records(args.report_file), args.failures_only):
+            print(line)
+        print()
+    print(ReportFormat.format_summary(summarize(iter_records(args.report_file))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,3 +14,58 @@ class OutputFormat:
             return f"Data: {result['data']}"
         else:
             return f"Error: {result['message']}"
+
+    @staticmethod
+    def format_batch(result):
+        stats = result['data']['stats']
+        latency = stats['latency']
+        lines = [f"{'Success' if result['status'] else 'Error'}: {result['message']}"]
+        if latency['count']:
+            lines.append(f"Throughput: {stats['throughput']:.2f} ops/s, latency p50 {latency['p50']:.2f}s, "
+                         f"p95 {latency['p95']:.2f}s, max {latency['max']:.2f}s")
+        for item in result['data']['results']:
+            if not item['status']:
+                lines.append(f"  {item['name']}: {item['message']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_task_analytics(result):
+        if not result['status']:
+            return f"Error: {result['message']}"
+        lines = []
+        for operation, timings in result['data']['operations'].items():
+            means = {name: (timings[name]['mean'] or 0.0) * 1000
+                     for name in ('client_total', 'client', 'queue', 'run')}
+            lines.append(f"{operation}: {timings['count']} tasks ({timings['failed']} failed), "
+                         f"{means['client_total']:.0f} ms = client {means['client']:.0f} + queue {means['queue']:.0f} "
+                         f"+ run {means['run']:.0f} ms; bottleneck: {timings['bottleneck']}")
+            for failure in timings.get('failures', []):
+                lines.append(f"  {failure['task']}: {failure['message']}")
+        return "\n".join(lines) or "No tasks recorded"
+
+    @staticmethod
+    def format_migration_plan(result):
+        if 'data' not in result:
+            return f"Error: {result['message']}"
+        plan = result['data']
+        lines = [f"{'Plan' if result['status'] else 'Incomplete plan'}: {result['message']} "
+                 f"(serial {plan['estimate']['serial_seconds']:.0f}s)"]
+        for move in plan['moves']:
+            lines.append(f"  {move['vm_name']}: {move['source_host']} -> {move['host_name']} "
+                         f"~{move['estimated_seconds']:.0f}s")
+        for vm_name in plan['unplaced']:
+            lines.append(f"  {vm_name}: no host with room")
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_migrations(result):
+        if 'data' not in result or 'duration' not in result['data']:
+            return f"Error: {result['message']}"
+        duration = result['data']['duration']
+        lines = [f"{'Success' if result['status'] else 'Error'}: {result['message']}"]
+        if duration['actual_to_estimate'] is not None:
+            lines.append(f"Actual/planned duration: {duration['actual_to_estimate']:.2f}")
+        for item in result['data']['results']:
+            if not item['status']:
+                lines.append(f"  {item['vm_name']}: {item['message']}")
+        return "\n".join(lines)